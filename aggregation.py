@@ -0,0 +1,184 @@
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Width assumed for the graphs until the browser reports its own
+DEFAULT_CHART_WIDTH = 1200  # in pixels
+
+# Horizontal pixels per plotted point; finer than this adds payload without visible detail
+PIXELS_PER_POINT = 1
+
+# Bucket widths to choose from, smallest first, so bucket edges land on round times
+BUCKET_WIDTHS = [
+    pd.Timedelta(minutes=1),
+    pd.Timedelta(minutes=2),
+    pd.Timedelta(minutes=5),
+    pd.Timedelta(minutes=10),
+    pd.Timedelta(minutes=15),
+    pd.Timedelta(minutes=30),
+    pd.Timedelta(hours=1),
+    pd.Timedelta(hours=2),
+    pd.Timedelta(hours=3),
+    pd.Timedelta(hours=6),
+    pd.Timedelta(hours=12),
+    pd.Timedelta(days=1),
+]
+
+# How each column is reduced within a bucket. Extremes keep their worst case so
+# short outages and latency spikes survive downsampling.
+BUCKET_AGGREGATIONS = {
+    'success': ['mean', 'min', 'max'],
+    'avg_latency_ms': ['mean'],
+    'max_latency_ms': ['max'],
+    'min_latency_ms': ['min'],
+    'packet_loss': ['max', 'mean'],
+}
+
+# Rollup tables that can stand in for raw rows, coarsest first
+ROLLUP_WIDTHS = [
+    ('daily', pd.Timedelta(days=1)),
+    ('hourly', pd.Timedelta(hours=1)),
+    ('5min', pd.Timedelta(minutes=5)),
+]
+
+# Latency values above this are treated as outliers, matching parse_log
+LATENCY_CAP = 500  # in milliseconds
+
+# Percentiles drawn on the latency percentile graph
+PERCENTILES = [50, 95, 99]
+
+# Function to pick a bucket width for a span of time
+def bucket_width_for_span(span, chart_width=None):
+    """
+    Returns the smallest bucket width that splits the span into no more points than
+    the chart can display.
+    """
+    max_points = max(int((chart_width or DEFAULT_CHART_WIDTH) / PIXELS_PER_POINT), 1)
+    target = span / max_points
+    for width in BUCKET_WIDTHS:
+        if width >= target:
+            return width
+    return BUCKET_WIDTHS[-1]
+
+# Function to pick a bucket width for the visible time span
+def choose_bucket_width(df, chart_width=None, start=None):
+    """
+    Returns the smallest bucket width that keeps the number of points within what
+    the chart can display, or None if the raw rows already fit. The span runs from
+    start (or the first row) to the last row.
+    """
+    if df.empty:
+        return None
+    max_points = max(int((chart_width or DEFAULT_CHART_WIDTH) / PIXELS_PER_POINT), 1)
+    first = df['timestamp'].min()
+    if start is not None and start < first:
+        first = start  # Rollup history reaches further back than the raw rows
+    elif len(df) <= max_points:
+        return None
+    return bucket_width_for_span(df['timestamp'].max() - first, chart_width)
+
+# Function to label a bucket width for legends
+def describe_width(bucket_width):
+    """
+    Returns a short label such as '15 min', '3 h' or '1 day'.
+    """
+    minutes = int(bucket_width.total_seconds() // 60)
+    if minutes % (24 * 60) == 0:
+        days = minutes // (24 * 60)
+        return f"{days} day" if days == 1 else f"{days} days"
+    if minutes % 60 == 0:
+        return f"{minutes // 60} h"
+    return f"{minutes} min"
+
+# Function to aggregate rows into fixed-width time buckets
+def downsample(df, bucket_width):
+    """
+    Buckets the rows by timestamp and reduces each bucket to its min, max, mean and
+    worst-case packet loss. Column names are kept, with extra '_min'/'_max'/'_mean'
+    columns where a bucket keeps more than one value.
+    """
+    if bucket_width is None or df.empty:
+        return df
+    grouped = df.resample(bucket_width, on='timestamp')
+    buckets = grouped.agg(BUCKET_AGGREGATIONS)
+    buckets.columns = [
+        column if i == 0 else f"{column}_{func}"
+        for column, funcs in BUCKET_AGGREGATIONS.items()
+        for i, func in enumerate(funcs)
+    ]
+    buckets['samples'] = grouped.size()
+    # Drop buckets with no samples so gaps are not drawn as zeroes
+    buckets = buckets[buckets['samples'] > 0].reset_index()
+    logger.info(f"Downsampled {len(df)} records into {len(buckets)} buckets of {bucket_width}.")
+    return buckets
+
+# Function to pick the coarsest rollup table that still resolves a bucket width
+def choose_rollup(bucket_width):
+    """
+    Returns 'daily', 'hourly' or '5min' if buckets are wide enough to be built from
+    that rollup table, or None if raw rows are needed.
+    """
+    if bucket_width is None:
+        return None
+    for granularity, width in ROLLUP_WIDTHS:
+        if bucket_width >= width:
+            return granularity
+    return None
+
+# Function to merge rollup buckets into wider buckets
+def downsample_rollups(rollups, bucket_width):
+    """
+    Combines 5-minute, hourly or daily rollup rows into buckets of the given width,
+    producing the same columns as downsample().
+    """
+    if rollups.empty:
+        return rollups
+    grouped = rollups.resample(bucket_width, on='timestamp')
+    buckets = grouped.agg({
+        'samples': 'sum',
+        'success_sum': 'sum',
+        'success_min': 'min',
+        'success_max': 'max',
+        'avg_latency_sum': 'sum',
+        'avg_latency_samples': 'sum',
+        'max_latency_ms': 'max',
+        'min_latency_ms': 'min',
+        'packet_loss_sum': 'sum',
+        'packet_loss_max': 'max',
+    })
+    buckets = buckets[buckets['samples'] > 0]
+    latency_samples = buckets['avg_latency_samples'].where(buckets['avg_latency_samples'] > 0)
+    plot_df = pd.DataFrame({
+        'success': buckets['success_sum'] / buckets['samples'],
+        'success_min': buckets['success_min'],
+        'success_max': buckets['success_max'],
+        'avg_latency_ms': (buckets['avg_latency_sum'] / latency_samples).clip(upper=LATENCY_CAP),
+        'max_latency_ms': buckets['max_latency_ms'].clip(upper=LATENCY_CAP),
+        'min_latency_ms': buckets['min_latency_ms'].clip(upper=LATENCY_CAP),
+        'packet_loss': buckets['packet_loss_max'].clip(upper=100),
+        'packet_loss_mean': buckets['packet_loss_sum'] / buckets['samples'],
+        'samples': buckets['samples'],
+    }).reset_index()
+    logger.info(f"Merged {len(rollups)} rollup rows into {len(plot_df)} buckets of {bucket_width}.")
+    return plot_df
+
+# Function to take percentiles from per-bucket latency histograms
+def histogram_percentiles(histogram, percentiles=PERCENTILES):
+    """
+    Returns one row per bucket with a 'p<N>' column per percentile, read from the
+    cumulative counts of the (timestamp, rtt_ms, count) histogram rows.
+    """
+    if histogram.empty:
+        return pd.DataFrame(columns=['timestamp'] + [f"p{p}" for p in percentiles])
+    rows = []
+    for timestamp, bins in histogram.groupby('timestamp', sort=True):
+        cumulative = bins['count'].cumsum().to_numpy()
+        total = cumulative[-1]
+        values = bins['rtt_ms'].to_numpy()
+        row = {'timestamp': timestamp}
+        for p in percentiles:
+            row[f"p{p}"] = values[min(cumulative.searchsorted(total * p / 100), len(values) - 1)]
+        rows.append(row)
+    return pd.DataFrame(rows)
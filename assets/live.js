@@ -0,0 +1,22 @@
+// Streams new samples and power cycle events from the server and hands each batch
+// to the live-update store, whose client-side callback appends them to the graphs.
+(function () {
+    function connect() {
+        if (!window.dash_clientside || !window.dash_clientside.set_props) {
+            // Dash has not finished loading yet
+            setTimeout(connect, 500);
+            return;
+        }
+        // EventSource reconnects on its own after the delay the server sends
+        var source = new EventSource('stream');
+        source.addEventListener('update', function (event) {
+            window.dash_clientside.set_props('live-update', {data: JSON.parse(event.data)});
+        });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', connect);
+    } else {
+        connect();
+    }
+})();
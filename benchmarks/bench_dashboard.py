@@ -0,0 +1,217 @@
+"""
+Times the dashboard's read path against synthetic databases holding 1 day, 14 days,
+1 year and 5 years of history (see synthetic_data.py): parse_log,
+filter_data_by_date, get_filtered_data without a cache, with only the in-process
+cache (as while Redis is down) and through a shared cache (a local SimpleCache
+standing in for Redis, as another worker sees it), and the fetch_data and
+update_dashboard callbacks end to end through Dash's HTTP endpoint. Reports p50, p95
+and worst latency, the peak RSS reached so far and the response payload size of each
+case. Every database is benchmarked in a process of its own, so peak RSS is per
+database.
+
+Run from the project directory:  python benchmarks/bench_dashboard.py --spans 1d 14d
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+import synthetic_data  # noqa: E402
+
+# Date ranges each read is timed for
+DEFAULT_RANGES = ['last_24_hours', 'last_7_days', 'all_time']
+
+# Graph width sent with update_dashboard, as reported by a typical desktop browser
+CHART_WIDTH = 1400
+
+# A database is regenerated once its newest sample is this old, so every range has data
+MAX_DATA_AGE = timedelta(hours=1)
+
+# Function to find or create the synthetic database for a span
+def prepare_database(data_dir, span, interval, seed, keep_raw, regenerate=False):
+    """
+    Returns the path of the span's database, generating it if it is missing, stale
+    or regenerate is set.
+    """
+    path = os.path.join(data_dir, f"{span}_{interval}s_seed{seed}{'_raw' if keep_raw else ''}.db")
+    if os.path.exists(path) and not regenerate:
+        conn = sqlite3.connect(path)
+        newest = conn.execute("SELECT MAX(timestamp) FROM internet_status").fetchone()[0]
+        conn.close()
+        if newest is not None and datetime.now().timestamp() * 1000 - newest < MAX_DATA_AGE.total_seconds() * 1000:
+            return path
+    print(f"Generating {span} of history at {interval} s per sample...", flush=True)
+    started = time.perf_counter()
+    rows, power_cycles = synthetic_data.write_database(
+        path, synthetic_data.SPANS[span], interval, seed, keep_raw
+    )
+    print(f"  {rows} samples, {power_cycles} power cycles, {os.path.getsize(path) / 1e6:.1f} MB "
+          f"in {time.perf_counter() - started:.1f} s", flush=True)
+    return path
+
+# Function to read this process's peak resident set size in MB
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+# Function to time repeated calls of a function
+def measure(name, date_range, call, repeats):
+    """
+    Runs call() repeats times and returns the latency percentiles in ms, the peak RSS
+    reached so far and the size in bytes of what the last call returned, if it
+    returned bytes.
+    """
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = call()
+        timings.append((time.perf_counter() - started) * 1000)
+    p50, p95 = np.percentile(timings, [50, 95])
+    return {
+        'case': name,
+        'range': date_range,
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'max_ms': round(max(timings), 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'payload_bytes': len(result) if isinstance(result, bytes) else None,
+    }
+
+# Function to call a Dash callback through the app's HTTP endpoint
+def post_callback(client, outputs, inputs, state=()):
+    """
+    Returns the response body. Outputs are (id, property) pairs and inputs and state
+    (id, property, value) triples, as dash-renderer sends them.
+    """
+    if len(outputs) > 1:
+        output = '..' + '...'.join(f"{id}.{prop}" for id, prop in outputs) + '..'
+        output_specs = [{'id': id, 'property': prop} for id, prop in outputs]
+    else:
+        output = f"{outputs[0][0]}.{outputs[0][1]}"
+        output_specs = {'id': outputs[0][0], 'property': outputs[0][1]}
+    response = client.post('/_dash-update-component', json={
+        'output': output,
+        'outputs': output_specs,
+        'inputs': [{'id': id, 'property': prop, 'value': value} for id, prop, value in inputs],
+        'state': [{'id': id, 'property': prop, 'value': value} for id, prop, value in state],
+        'changedPropIds': [f"{inputs[0][0]}.{inputs[0][1]}"],
+    })
+    if response.status_code != 200:
+        raise RuntimeError(f"Callback {output} failed with {response.status_code}: {response.data[:200]!r}")
+    return response.data
+
+# Function to benchmark every case against one database
+def run_span(span, db_path, date_ranges, repeats):
+    """
+    Runs in a process of its own and returns one result per case and range.
+    """
+    # The dashboard logs every read at INFO, which would dominate the timings
+    logging.basicConfig(level=logging.WARNING)
+    from flask_caching.backends import SimpleCache
+    import internet_status_dashboard as dashboard
+    import versioned_cache
+    logging.getLogger().setLevel(logging.WARNING)
+    dashboard.get_db_path = lambda: db_path
+    client = dashboard.server.test_client()
+
+    results = []
+    def record(name, date_range, call):
+        result = measure(name, date_range, call, repeats)
+        result['span'] = span
+        results.append(result)
+
+    configured_cache = dashboard.filtered_data_cache
+    all_time_df = dashboard.parse_log(db_path, 'all_time')
+    # Stands in for Redis: values are pickled on the way in and out, as with Redis
+    stand_in = SimpleCache(threshold=64)
+    for date_range in date_ranges:
+        record('parse_log', date_range, lambda: dashboard.parse_log(db_path, date_range))
+        record('filter_data_by_date', date_range, lambda: dashboard.filter_data_by_date(all_time_df, date_range))
+
+        # A fresh cache per call misses every time
+        def uncached():
+            dashboard.filtered_data_cache = versioned_cache.VersionedCache(None)
+            return dashboard.get_filtered_data(db_path, date_range)
+        record('get_filtered_data[uncached]', date_range, uncached)
+
+        # Redis down: hits come from the in-process cache
+        dashboard.filtered_data_cache = versioned_cache.VersionedCache(None)
+        dashboard.get_filtered_data(db_path, date_range)
+        record('get_filtered_data[in-process]', date_range, lambda: dashboard.get_filtered_data(db_path, date_range))
+
+        # Each call gets an empty in-process cache, so every hit comes from the stand-in
+        dashboard.filtered_data_cache = versioned_cache.VersionedCache(stand_in)
+        dashboard.get_filtered_data(db_path, date_range)
+        def shared():
+            dashboard.filtered_data_cache = versioned_cache.VersionedCache(stand_in)
+            return dashboard.get_filtered_data(db_path, date_range)
+        record('get_filtered_data[shared]', date_range, shared)
+
+        # The callbacks run with the dashboard's own cache
+        dashboard.filtered_data_cache = configured_cache
+        fetch_inputs = [
+            ('interval-component', 'n_intervals', 0),
+            ('date-range-dropdown', 'value', date_range),
+            ('site-dropdown', 'value', 'local'),
+        ]
+        fetch = lambda: post_callback(client, [('filtered-data', 'data')], fetch_inputs, [('filtered-data', 'data', None)])
+        record('fetch_data', date_range, fetch)
+        filtered_data = json.loads(fetch())['response']['filtered-data']['data']
+        record('update_dashboard', date_range, lambda: post_callback(
+            client,
+            [('success-graph', 'figure'), ('latency-graph', 'figure'), ('packetloss-graph', 'figure')],
+            [('filtered-data', 'data', filtered_data), ('chart-width', 'data', CHART_WIDTH)],
+            [('latency-metrics-checkbox', 'value', ['avg_latency_ms', 'max_latency_ms', 'min_latency_ms'])],
+        ))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard read path on synthetic databases.")
+    parser.add_argument('--spans', nargs='+', default=list(synthetic_data.SPANS), choices=list(synthetic_data.SPANS),
+                        help="history lengths to benchmark (default: all)")
+    parser.add_argument('--ranges', nargs='+', default=DEFAULT_RANGES, help="date ranges to read")
+    parser.add_argument('--repeats', type=int, default=20, help="runs per case (default 20)")
+    parser.add_argument('--interval', type=int, default=synthetic_data.DEFAULT_INTERVAL,
+                        help=f"seconds between synthetic samples (default {synthetic_data.DEFAULT_INTERVAL})")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the synthetic data (default 0)")
+    parser.add_argument('--keep-raw', action='store_true',
+                        help="keep every raw sample instead of applying the retention tiers")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'internet_status_bench'),
+                        help="where the synthetic databases are kept between runs")
+    parser.add_argument('--regenerate', action='store_true', help="regenerate the databases even if current")
+    parser.add_argument('--json', help="also write the results to this file, for comparing runs")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = []
+    print(f"{'span':<5} {'case':<30} {'range':<14} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'peak MB':>8} {'payload KB':>11}")
+    for span in args.spans:
+        db_path = prepare_database(args.data_dir, span, args.interval, args.seed, args.keep_raw, args.regenerate)
+        # A new process per database, so its peak RSS is not carried over from the last
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            span_results = pool.submit(run_span, span, db_path, args.ranges, args.repeats).result()
+        for result in span_results:
+            payload = f"{result['payload_bytes'] / 1024:.1f}" if result['payload_bytes'] is not None else '-'
+            print(f"{span:<5} {result['case']:<30} {result['range']:<14} {result['p50_ms']:>9.1f} "
+                  f"{result['p95_ms']:>9.1f} {result['max_ms']:>9.1f} {result['peak_rss_mb']:>8.0f} {payload:>11}")
+        results.extend(span_results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
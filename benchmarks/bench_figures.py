@@ -0,0 +1,107 @@
+"""
+Times building and serialising the dashboard's three sample graphs at 1k, 20k and
+200k rows, comparing trace data passed as pandas Series (how update_dashboard built
+figures before figures.py) with the NumPy and typed array traces from figures.py.
+
+Run from the project directory:  python benchmarks/bench_figures.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.io.json as plotly_json
+from dash._utils import to_json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import figures  # noqa: E402
+
+ROW_COUNTS = [1_000, 20_000, 200_000]
+METRICS = ['avg_latency_ms', 'max_latency_ms', 'min_latency_ms']
+
+# Function to generate a bucketed sample frame like aggregation.downsample returns
+def synthetic_samples(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = pd.Series(pd.date_range('2024-01-01', periods=rows, freq='10s'))
+    success = np.where(rng.random(rows) < 0.02, rng.choice([0, 50], rows), 100).astype(np.float64)
+    avg = rng.gamma(4, 5, rows)
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'success': success,
+        'success_min': np.minimum(success, 90),
+        'success_max': success,
+        'avg_latency_ms': avg,
+        'max_latency_ms': avg * 1.5,
+        'min_latency_ms': avg * 0.5,
+        'packet_loss': 100 - success,
+    })
+
+# Function to build the three graphs the way update_dashboard did, from pandas Series
+def series_figures(df, power_cycle_df):
+    def trace(column, **extra):
+        return {'x': df['timestamp'], 'y': df[column], 'type': 'scattergl', 'mode': 'lines', **extra}
+    layout = {
+        'plot_bgcolor': '#1e1e1e', 'paper_bgcolor': '#1e1e1e', 'font': {'color': '#ffffff'},
+        'xaxis': {'range': [df['timestamp'].min(), None], 'autorange': 'max'},
+    }
+    success = {
+        'data': [
+            trace('success', meta='success'),
+            trace('success_min', meta='success'),
+            trace('success_max', meta='success', fill='tonexty'),
+            {'x': power_cycle_df['timestamp'], 'y': [50] * len(power_cycle_df), 'mode': 'markers'},
+        ],
+        'layout': layout,
+    }
+    latency = {'data': [trace(metric, meta=metric) for metric in METRICS], 'layout': layout}
+    packetloss = {'data': [trace('packet_loss', meta='packet_loss')], 'layout': layout}
+    return success, latency, packetloss
+
+# Function to build the three graphs with figures.py
+def array_figures(df, power_cycle_df):
+    x_range = [df['timestamp'].iloc[0], None]
+    x = figures.date_strings(df['timestamp'])
+    return (
+        figures.success_figure(df, power_cycle_df, x_range, '10 s', x),
+        figures.latency_figure(df, METRICS, x_range, 500, x),
+        figures.packetloss_figure(df, x_range, [0, 100], x),
+    )
+
+# Function to time a build-and-serialise round, returning the best of repeats
+def measure(build, df, power_cycle_df, repeats):
+    best_build = best_serialise = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        built = build(df, power_cycle_df)
+        built_at = time.perf_counter()
+        payload = to_json(built)
+        finished = time.perf_counter()
+        best_build = min(best_build, built_at - started)
+        best_serialise = min(best_serialise, finished - built_at)
+    return best_build * 1000, best_serialise * 1000, len(payload.encode())
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard figure serialisation.")
+    parser.add_argument('--repeats', type=int, default=5, help="runs per case, best is reported (default 5)")
+    parser.add_argument('--engines', nargs='+', default=['json', 'orjson'],
+                        help="plotly JSON engines to compare (default json orjson)")
+    args = parser.parse_args()
+
+    print(f"{'engine':<7} {'rows':>8} {'traces':<7} {'build ms':>9} {'json ms':>9} {'payload KB':>11}")
+    for engine in args.engines:
+        try:
+            plotly_json.config.default_engine = engine
+        except ValueError as e:
+            print(f"Skipping {engine}: {e}")
+            continue
+        for rows in ROW_COUNTS:
+            df = synthetic_samples(rows)
+            power_cycle_df = df.loc[df['success'] == 0, ['timestamp']].iloc[::20]
+            for label, build in (('series', series_figures), ('arrays', array_figures)):
+                build_ms, serialise_ms, size = measure(build, df, power_cycle_df, args.repeats)
+                print(f"{engine:<7} {rows:>8} {label:<7} {build_ms:>9.1f} {serialise_ms:>9.1f} {size / 1024:>11.0f}")
+
+if __name__ == '__main__':
+    main()
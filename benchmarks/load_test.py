@@ -0,0 +1,239 @@
+"""
+Load-tests a running dashboard with simulated browsers. Each one loads the page the
+way dash-renderer does (the page, layout and dependencies, then the badge, site list
+and data fetch, then every callback fed by the fetched data) and starts over as soon
+as it is done. Reports requests per second and p50/p95/p99 latency at each number of
+concurrent dashboards, by default 1, 10 and 50.
+
+Against a dashboard that is already running:
+    python benchmarks/load_test.py --url http://localhost:8050
+Or let the script start gunicorn with 1, 2 and 4 workers in turn, to see throughput
+scale with cores:
+    python benchmarks/load_test.py --serve 1 2 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import requests
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Numbers of dashboards open at once
+DEFAULT_CONCURRENCY = [1, 10, 50]
+
+# Graph width and log table page sent with the callbacks, as a desktop browser would
+CHART_WIDTH = 1400
+LOG_PAGE_SIZE = 10
+
+# Port gunicorn is started on with --serve, and how long it gets to come up
+SERVE_PORT = 8051
+SERVE_STARTUP = 60
+
+# Function to call a Dash callback over HTTP
+def post_callback(session, url, outputs, inputs, state=()):
+    """
+    Returns the decoded response. Outputs are (id, property) pairs and inputs and
+    state (id, property, value) triples, as dash-renderer sends them.
+    """
+    if len(outputs) > 1:
+        output = '..' + '...'.join(f"{id}.{prop}" for id, prop in outputs) + '..'
+        output_specs = [{'id': id, 'property': prop} for id, prop in outputs]
+    else:
+        output = f"{outputs[0][0]}.{outputs[0][1]}"
+        output_specs = {'id': outputs[0][0], 'property': outputs[0][1]}
+    response = session.post(f"{url}/_dash-update-component", json={
+        'output': output,
+        'outputs': output_specs,
+        'inputs': [{'id': id, 'property': prop, 'value': value} for id, prop, value in inputs],
+        'state': [{'id': id, 'property': prop, 'value': value} for id, prop, value in state],
+        'changedPropIds': [f"{inputs[0][0]}.{inputs[0][1]}"],
+    })
+    response.raise_for_status()
+    return response.json()
+
+# Function to load the dashboard once, as a browser opening it would
+def load_dashboard(session, url, date_range, timed):
+    """
+    Makes every request of a page load in dependency order, each through timed(name,
+    request), which returns what the request returned.
+    """
+    timed('page', lambda: session.get(f"{url}/").raise_for_status())
+    timed('layout', lambda: session.get(f"{url}/_dash-layout").raise_for_status())
+    timed('dependencies', lambda: session.get(f"{url}/_dash-dependencies").raise_for_status())
+    timed('update_internet_status', lambda: post_callback(
+        session, url, [('internet-status', 'children'), ('internet-status', 'style')],
+        [('internet-interval', 'n_intervals', 0)],
+    ))
+    timed('update_site_options', lambda: post_callback(
+        session, url, [('site-dropdown', 'options')], [('interval-component', 'n_intervals', 0)],
+    ))
+    fetched = timed('fetch_data', lambda: post_callback(
+        session, url, [('filtered-data', 'data')],
+        [('interval-component', 'n_intervals', 0), ('date-range-dropdown', 'value', date_range),
+         ('site-dropdown', 'value', 'local')],
+        [('filtered-data', 'data', None)],
+    ))
+    filtered_data = fetched['response']['filtered-data']['data']
+    data = ('filtered-data', 'data', filtered_data)
+    width = ('chart-width', 'data', CHART_WIDTH)
+    timed('update_dashboard', lambda: post_callback(
+        session, url, [('success-graph', 'figure'), ('latency-graph', 'figure'), ('packetloss-graph', 'figure')],
+        [data, width], [('latency-metrics-checkbox', 'value', ['avg_latency_ms', 'max_latency_ms', 'min_latency_ms'])],
+    ))
+    timed('update_status_counts', lambda: post_callback(
+        session, url, [('full-up-count', 'children'), ('partial-up-count', 'children'), ('down-count', 'children')],
+        [data],
+    ))
+    timed('update_probe_graphs', lambda: post_callback(
+        session, url, [('target-latency-graph', 'figure'), ('latency-percentile-graph', 'figure')], [data, width],
+    ))
+    timed('update_incidents', lambda: post_callback(
+        session, url, [('incident-availability', 'children'), ('incident-mttr', 'children'),
+                       ('incident-mtbf', 'children'), ('incident-count', 'children'), ('incident-table', 'data')],
+        [data],
+    ))
+    timed('update_log_table', lambda: post_callback(
+        session, url, [('log-table', 'data'), ('log-table', 'page_count')],
+        [data, ('log-table', 'page_current', 0), ('log-table', 'page_size', LOG_PAGE_SIZE),
+         ('log-table', 'sort_by', []), ('log-table', 'filter_query', '')],
+    ))
+
+# Function to run simulated dashboards on threads in one process
+def run_clients(url, clients, date_range, duration):
+    """
+    Returns a (request, latency in ms, ok) tuple for every request made until the
+    duration has passed. Runs in a process of its own, so the load is not limited
+    by one interpreter.
+    """
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        def timed(name, request):
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = request()
+                ok = True
+                return result
+            finally:
+                with lock:
+                    samples.append((name, (time.perf_counter() - started) * 1000, ok))
+        while time.monotonic() < deadline:
+            try:
+                load_dashboard(session, url, date_range, timed)
+            except Exception:
+                # Counted as an error above; start the next page load
+                time.sleep(0.1)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+# Function to load the dashboard from a number of simulated browsers at once
+def run_level(url, concurrency, date_range, duration, processes):
+    """
+    Returns requests per second, latency percentiles in ms and the error count with
+    `concurrency` dashboards loading the page over and over for `duration` seconds.
+    """
+    processes = max(1, min(processes, concurrency))
+    shares = [concurrency // processes + (index < concurrency % processes) for index in range(processes)]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(run_clients, url, share, date_range, duration) for share in shares]
+        samples = [sample for future in futures for sample in future.result()]
+    elapsed = time.perf_counter() - started
+    latencies = [latency for _, latency, ok in samples if ok]
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (float('nan'),) * 3
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(samples) - len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(p50), 1),
+        'p95_ms': round(float(p95), 1),
+        'p99_ms': round(float(p99), 1),
+    }
+
+# Function to start gunicorn from the project's config with a given number of workers
+def serve(workers, port=SERVE_PORT):
+    """
+    Returns the gunicorn process once the dashboard answers on the port.
+    """
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+         '--bind', f"127.0.0.1:{port}", '--workers', str(workers)],
+        cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + SERVE_STARTUP
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/_dash-layout", timeout=1).raise_for_status()
+            return process
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"gunicorn did not answer within {SERVE_STARTUP} seconds")
+
+# Function to run every concurrency level against one server and print the results
+def run_levels(url, args, label):
+    results = []
+    for concurrency in args.concurrency:
+        result = run_level(url, concurrency, args.range, args.duration, args.processes)
+        result['server'] = label
+        print(f"{label:<12} {result['concurrency']:>11} {result['requests']:>9} {result['rps']:>8.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7}",
+              flush=True)
+        results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the dashboard with simulated browsers.")
+    parser.add_argument('--url', default='http://localhost:8050', help="dashboard to test (default %(default)s)")
+    parser.add_argument('--serve', nargs='+', type=int, metavar='WORKERS',
+                        help="start gunicorn with each of these worker counts in turn instead of using --url")
+    parser.add_argument('--concurrency', nargs='+', type=int, default=DEFAULT_CONCURRENCY,
+                        help="numbers of concurrent dashboards (default 1 10 50)")
+    parser.add_argument('--duration', type=float, default=20, help="seconds per concurrency level (default 20)")
+    parser.add_argument('--range', default='last_24_hours', help="date range each dashboard shows")
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help="client processes the dashboards are spread over (default: one per core)")
+    parser.add_argument('--json', help="also write the results to this file, for comparing runs")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'server':<12} {'dashboards':>11} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'errors':>7}")
+    if args.serve:
+        for workers in args.serve:
+            process = serve(workers)
+            try:
+                results.extend(run_levels(f"http://127.0.0.1:{SERVE_PORT}", args, f"{workers} workers"))
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait()
+    else:
+        results.extend(run_levels(args.url.rstrip('/'), args, args.url))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
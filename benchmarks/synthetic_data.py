@@ -0,0 +1,198 @@
+"""
+Generates synthetic collector databases for the dashboard benchmarks: internet_status
+samples with a daily latency cycle, random probe loss, outages and degraded spells,
+and the power_cycle_events the collector would have logged for the longer outages.
+The database is built the way a real one is, with the rollups and incidents backfilled
+by schema.ensure_schema and, unless --keep-raw is given, old rows trimmed by the
+collector's retention tiers.
+
+Run from the project directory:  python benchmarks/synthetic_data.py --days 14 out.db
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import retention  # noqa: E402
+import schema  # noqa: E402
+
+# History lengths benchmarked by default, in days
+SPANS = {
+    '1d': 1,
+    '14d': 14,
+    '1y': 365,
+    '5y': 5 * 365,
+}
+
+# Seconds between samples; the daemon samples every 10 seconds, the older one-shot
+# collector every 60
+DEFAULT_INTERVAL = 60
+
+# Probes per sample counted in internet_status, as check_internet.py sends them: 5
+# pings to each of 3 targets
+PROBES_PER_SAMPLE = 15
+
+# Chance of an individual probe being lost outside outages
+BASE_PROBE_LOSS = 0.002
+
+# Mean days between outages, and their median and longest duration in seconds
+OUTAGE_EVERY_DAYS = 3
+OUTAGE_MEDIAN = 180
+OUTAGE_LONGEST = 6 * 3600
+
+# Mean days between degraded spells, their median duration in seconds and the range
+# of probe loss during one
+DEGRADED_EVERY_DAYS = 7
+DEGRADED_MEDIAN = 20 * 60
+DEGRADED_LOSS = (0.2, 0.6)
+
+# Outages longer than this get a power cycle this long after they start, at most one
+# per cooldown, as the decision engine would
+POWER_CYCLE_AFTER = 40
+POWER_CYCLE_COOLDOWN = 3600
+
+# Rows inserted per executemany call, so the 5-year database is never held as tuples
+CHUNK_ROWS = 100_000
+
+INSERT_SAMPLE = """
+INSERT INTO internet_status (timestamp, status, success_percentage, avg_latency_ms,
+                             max_latency_ms, min_latency_ms, packet_loss)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Function to mark the samples covered by randomly placed spells
+def random_spells(rng, timestamps, every_days, median_seconds, longest_seconds):
+    """
+    Returns a spell index per sample (-1 outside spells) and the (start, end) epoch ms
+    of each spell, which arrive as a Poisson process and last a log-normal time.
+    """
+    span_ms = timestamps[-1] - timestamps[0]
+    count = rng.poisson(span_ms / (every_days * 86_400_000))
+    starts = np.sort(rng.integers(timestamps[0], timestamps[-1], count))
+    durations = np.clip(rng.lognormal(np.log(median_seconds), 1.2, count), 20, longest_seconds) * 1000
+    ends = starts + durations.astype(np.int64)
+    # The last spell starting at or before each sample covers it if it has not ended
+    spell = np.searchsorted(starts, timestamps, side='right') - 1
+    if not count:
+        return np.full(len(timestamps), -1), starts, ends
+    covered = (spell >= 0) & (timestamps < ends[np.maximum(spell, 0)])
+    return np.where(covered, spell, -1), starts, ends
+
+# Function to generate the samples and power cycles of a span of history
+def generate(days, end=None, interval=DEFAULT_INTERVAL, seed=0):
+    """
+    Returns a dict of sample columns as NumPy arrays, timestamps in epoch ms, and the
+    epoch ms timestamps of the power cycles.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or datetime.now()
+    rows = int(days * 86400 / interval)
+    timestamps = schema.to_epoch_ms(end) - np.arange(rows - 1, -1, -1, dtype=np.int64) * interval * 1000
+
+    # Latency peaks in the evening, with occasional spikes in the maximum
+    hours = ((timestamps // 1000 + end.astimezone().utcoffset().total_seconds()) % 86400) / 3600
+    from_peak = (hours - 21 + 12) % 24 - 12
+    base = 12 + 8 * np.exp(-from_peak ** 2 / 8)
+    avg = base * rng.gamma(8, 1 / 8, rows)
+    loss_chance = np.full(rows, BASE_PROBE_LOSS)
+
+    degraded, degraded_starts, _ = random_spells(rng, timestamps, DEGRADED_EVERY_DAYS, DEGRADED_MEDIAN, OUTAGE_LONGEST)
+    if len(degraded_starts):
+        spell_loss = rng.uniform(*DEGRADED_LOSS, len(degraded_starts))
+        loss_chance = np.where(degraded >= 0, spell_loss[np.maximum(degraded, 0)], loss_chance)
+        avg = np.where(degraded >= 0, avg * 3, avg)
+
+    outage, outage_starts, outage_ends = random_spells(rng, timestamps, OUTAGE_EVERY_DAYS, OUTAGE_MEDIAN, OUTAGE_LONGEST)
+    loss_chance = np.where(outage >= 0, 1.0, loss_chance)
+
+    lost = rng.binomial(PROBES_PER_SAMPLE, loss_chance)
+    success = (PROBES_PER_SAMPLE - lost) * 100 // PROBES_PER_SAMPLE
+    up = success > 0
+    samples = {
+        'timestamp': timestamps,
+        'success_percentage': success,
+        'avg_latency_ms': np.where(up, avg, np.nan),
+        'max_latency_ms': np.where(up, avg * (1 + rng.gamma(2, 0.5, rows)), np.nan),
+        'min_latency_ms': np.where(up, avg * rng.uniform(0.4, 0.8, rows), np.nan),
+        'packet_loss': (lost * 100 // PROBES_PER_SAMPLE).astype(np.float64),
+    }
+
+    power_cycles = []
+    for start, stop in zip(outage_starts, outage_ends):
+        at = start + POWER_CYCLE_AFTER * 1000
+        if at < stop and (not power_cycles or at - power_cycles[-1] >= POWER_CYCLE_COOLDOWN * 1000):
+            power_cycles.append(int(at))
+    return samples, power_cycles
+
+# Function to build a status message like check_internet.summarise does
+def status_message(success):
+    if success == 100:
+        return "Internet is fully up (100% success)"
+    if success > 0:
+        return f"Internet is partially up ({success}% success)"
+    return "Internet is down (0% success)"
+
+# Function to write a synthetic database
+def write_database(path, days, interval=DEFAULT_INTERVAL, seed=0, keep_raw=False, end=None):
+    """
+    Creates the database at path, replacing any there, and returns the number of
+    samples and power cycles generated. Rows are loaded before the rollups and
+    incidents exist, so ensure_schema backfills them in one pass each.
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    end = end or datetime.now()
+    samples, power_cycles = generate(days, end, interval, seed)
+
+    conn = sqlite3.connect(path)
+    for statement in schema.TABLES + schema.INDEXES:
+        conn.execute(statement)
+    for start in range(0, len(samples['timestamp']), CHUNK_ROWS):
+        chunk = {column: values[start:start + CHUNK_ROWS] for column, values in samples.items()}
+        success = chunk['success_percentage'].tolist()
+        latencies = [
+            [None if np.isnan(value) else value for value in chunk[column].tolist()]
+            for column in ('avg_latency_ms', 'max_latency_ms', 'min_latency_ms')
+        ]
+        conn.executemany(INSERT_SAMPLE, zip(
+            chunk['timestamp'].tolist(), map(status_message, success), success, *latencies,
+            chunk['packet_loss'].tolist()
+        ))
+    conn.executemany(
+        "INSERT INTO power_cycle_events (timestamp, reason) VALUES (?, ?)",
+        [(timestamp, "3 of the last 4 samples below 1% success") for timestamp in power_cycles]
+    )
+    conn.execute(f"PRAGMA user_version = {schema.SCHEMA_VERSION}")
+    conn.commit()
+
+    schema.ensure_schema(conn, path)
+    if not keep_raw:
+        retention.RetentionEngine().run(conn, end)
+    conn.execute("VACUUM")
+    conn.close()
+    return len(samples['timestamp']), len(power_cycles)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic internet_status database.")
+    parser.add_argument('path', help="database file to create (replaced if it exists)")
+    parser.add_argument('--days', type=float, default=14, help="days of history (default 14)")
+    parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL,
+                        help=f"seconds between samples (default {DEFAULT_INTERVAL})")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default 0)")
+    parser.add_argument('--keep-raw', action='store_true',
+                        help="keep every raw sample instead of applying the retention tiers")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows, power_cycles = write_database(args.path, args.days, args.interval, args.seed, args.keep_raw)
+    print(f"Wrote {rows} samples and {power_cycles} power cycles to {args.path} "
+          f"in {time.perf_counter() - started:.1f} s ({os.path.getsize(args.path) / 1e6:.1f} MB)")
+
+if __name__ == '__main__':
+    main()
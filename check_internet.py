@@ -0,0 +1,518 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+import signal
+import socket
+import sqlite3
+import struct
+import sys
+import time
+from datetime import datetime
+
+import decision_engine
+import power_cycle_nbn
+import retention
+import schema
+import tapo_control
+import uploader
+
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# File references
+DB_FILE = os.path.join(SCRIPT_DIR, 'logs/internet_status.db')
+LOG_FILE = os.path.join(SCRIPT_DIR, 'logs/check_internet.log')
+os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+
+# Set up logging configuration
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler(LOG_FILE), logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+# Targets pinged over ICMP
+TARGETS = ["8.8.8.8", "1.1.1.1", "9.9.9.9"]
+PING_COUNT_PER_TARGET = 5
+
+# Targets probed with a TCP connect, which still gets through where ICMP is filtered
+TCP_TARGETS = [("8.8.8.8", 53), ("1.1.1.1", 53), ("9.9.9.9", 53)]
+
+PING_TIMEOUT = 2  # Reduced timeout for faster failure detection
+
+# Seconds between samples in daemon mode
+SAMPLE_INTERVAL = 10
+
+# Daemon mode holds samples in memory and writes them after this many samples or
+# seconds, whichever comes first, in one short transaction
+COMMIT_BATCH_SIZE = 6
+COMMIT_INTERVAL = 60
+
+# Samples kept in memory while the database cannot be written; the oldest are dropped past this
+MAX_PENDING_SAMPLES = 360
+
+# Seconds between uploads to a central dashboard in daemon mode
+UPLOAD_INTERVAL = 60
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+# Latency reported by the system ping command
+PING_TIME_PATTERN = re.compile(r'time=([0-9.]+)')
+
+# Function to compute the internet checksum of an ICMP packet
+def icmp_checksum(data):
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+# Function to build an ICMP echo request
+def build_echo_request(ident, seq):
+    payload = b'internet-status'
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    checksum = icmp_checksum(header + payload)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + payload
+
+class IcmpProber:
+    """
+    Sends ICMP echo requests from a single socket and matches replies by sequence
+    number, so any number of pings can be in flight at once without spawning
+    processes. Uses an unprivileged ICMP datagram socket where the kernel allows
+    it (net.ipv4.ping_group_range) and a raw socket when running as root.
+    """
+
+    def __init__(self, sock, raw):
+        self.sock = sock
+        self.raw = raw
+        self.ident = os.getpid() & 0xFFFF
+        self.seq = 0
+        self.pending = {}
+        self.reading = False
+
+    @classmethod
+    def open(cls):
+        """
+        Returns a prober, or None if this process may not open ICMP sockets.
+        """
+        for sock_type, raw in ((socket.SOCK_DGRAM, False), (socket.SOCK_RAW, True)):
+            try:
+                sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            except OSError:
+                continue
+            sock.setblocking(False)
+            return cls(sock, raw)
+        return None
+
+    def close(self):
+        if self.reading:
+            asyncio.get_running_loop().remove_reader(self.sock.fileno())
+            self.reading = False
+        self.sock.close()
+
+    def _on_readable(self):
+        received_at = time.perf_counter()
+        while True:
+            try:
+                data = self.sock.recv(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            if self.raw:
+                # Raw sockets deliver the IP header and every ICMP packet on the host
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+            # Datagram sockets get their identifier rewritten and filtered by the kernel
+            if icmp_type != ICMP_ECHO_REPLY or (self.raw and ident != self.ident):
+                continue
+            future = self.pending.pop(seq, None)
+            if future is not None and not future.done():
+                future.set_result(received_at)
+
+    async def ping(self, host, timeout):
+        """
+        Returns the round trip time in ms, or None if no reply arrived in time.
+        """
+        loop = asyncio.get_running_loop()
+        if not self.reading:
+            loop.add_reader(self.sock.fileno(), self._on_readable)
+            self.reading = True
+        self.seq = (self.seq + 1) & 0xFFFF
+        seq = self.seq
+        future = loop.create_future()
+        self.pending[seq] = future
+        sent_at = time.perf_counter()
+        try:
+            self.sock.sendto(build_echo_request(self.ident, seq), (host, 0))
+            received_at = await asyncio.wait_for(future, timeout)
+            return (received_at - sent_at) * 1000
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            self.pending.pop(seq, None)
+
+# Function to ping a host with the system ping command
+async def ping_with_command(host, timeout):
+    """
+    Fallback for hosts that do not allow ICMP sockets. Returns the round trip time
+    in ms, or None.
+    """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'ping', '-c', '1', '-W', str(timeout), host,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        output, _ = await process.communicate()
+    except OSError as e:
+        logger.error(f"Failed to run ping: {e}")
+        return None
+    match = PING_TIME_PATTERN.search(output.decode(errors='replace'))
+    return float(match.group(1)) if match else None
+
+# Function to time a TCP connection to a host
+async def tcp_probe(host, port, timeout):
+    """
+    Returns the time in ms to complete a TCP handshake, or None. Refusals count as
+    failures, since a local firewall can reject on the remote host's behalf.
+    """
+    started_at = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    latency = (time.perf_counter() - started_at) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return latency
+
+# Function to run every probe at once
+async def run_probes(prober=None, timeout=PING_TIMEOUT):
+    """
+    Probes all targets concurrently and returns a list of (target, latency_ms or None).
+    A prober passed in is reused and left open; otherwise one is opened for this run.
+    """
+    own_prober = prober is None
+    if own_prober:
+        prober = IcmpProber.open()
+        if prober is None:
+            logger.info("ICMP sockets not permitted, falling back to the ping command.")
+    probes = []
+    for target in TARGETS:
+        for _ in range(PING_COUNT_PER_TARGET):
+            if prober is not None:
+                probes.append((target, prober.ping(target, timeout)))
+            else:
+                probes.append((target, ping_with_command(target, timeout)))
+    for host, port in TCP_TARGETS:
+        probes.append((f"{host}:{port}", tcp_probe(host, port, timeout)))
+    try:
+        latencies = await asyncio.gather(*(probe for _, probe in probes))
+    finally:
+        if own_prober and prober is not None:
+            prober.close()
+    return [(target, latency) for (target, _), latency in zip(probes, latencies)]
+
+# Function to turn probe results into an internet_status row
+def summarise(results, now):
+    """
+    Computes the success percentage, latency statistics and packet loss over the
+    ICMP pings, with the same rounding check_internet.sh used. TCP connect probes
+    are left out so the columns keep meaning ping round trips; they are kept per
+    target in probe_samples.
+    """
+    pings = [latency for target, latency in results if target in TARGETS]
+    total_count = len(pings)
+    latencies = [latency for latency in pings if latency is not None]
+    success_count = len(latencies)
+    success_percentage = success_count * 100 // total_count
+    packet_loss = (total_count - success_count) * 100 // total_count
+
+    if success_percentage == 100:
+        status = "Internet is fully up (100% success)"
+    elif success_percentage > 0:
+        status = f"Internet is partially up ({success_percentage}% success)"
+    else:
+        status = "Internet is down (0% success)"
+
+    return {
+        'timestamp': schema.to_epoch_ms(now),
+        'status': status,
+        'success_percentage': success_percentage,
+        'avg_latency_ms': sum(latencies) / success_count if latencies else None,
+        'max_latency_ms': max(latencies) if latencies else None,
+        'min_latency_ms': min(latencies) if latencies else None,
+        'packet_loss': packet_loss,
+    }
+
+# Function to queue one row in the current transaction
+def insert_row(conn, row):
+    conn.execute(
+        """
+        INSERT INTO internet_status (timestamp, status, success_percentage, avg_latency_ms,
+                                     max_latency_ms, min_latency_ms, packet_loss)
+        VALUES (:timestamp, :status, :success_percentage, :avg_latency_ms,
+                :max_latency_ms, :min_latency_ms, :packet_loss)
+        """,
+        row
+    )
+
+# Function to queue the individual probe results of one sample
+def insert_probes(conn, results, now, target_ids):
+    """
+    Stores every probe's round trip time (or NULL) against its target, keyed by the
+    sample time in epoch milliseconds and the probe's index for that target.
+    """
+    t = schema.to_epoch_ms(now)
+    seqs = {}
+    rows = []
+    for target, latency in results:
+        seq = seqs.get(target, 0)
+        seqs[target] = seq + 1
+        rtt_us = None if latency is None else int(round(latency * 1000))
+        rows.append((t, target_ids[target], seq, rtt_us))
+    conn.executemany("INSERT OR REPLACE INTO probe_samples (t, target_id, seq, rtt_us) VALUES (?, ?, ?, ?)", rows)
+
+# Function to work out every target name a sample can produce
+def probe_target_names():
+    return TARGETS + [f"{host}:{port}" for host, port in TCP_TARGETS]
+
+# Function to log a summary of one sample
+def log_row(row, level=logging.INFO):
+    logger.log(
+        level,
+        f"{row['status']} - AVG: {row['avg_latency_ms']}, MAX: {row['max_latency_ms']}, "
+        f"MIN: {row['min_latency_ms']}, loss: {row['packet_loss']}%"
+    )
+
+class CollectorDaemon:
+    """
+    Samples continuously from one process: a single SQLite connection in WAL mode,
+    one ICMP socket, samples written every few samples in one short transaction so
+    other writers are never kept waiting between samples, and retention on its own
+    slower schedule, a few bounded batches at a time between samples. Each sample
+    is checked by the power cycle decision engine as soon as it is taken.
+    """
+
+    def __init__(self, db_file, interval, uploads=None):
+        self.interval = interval
+        # Sends committed samples to a central dashboard, when one is configured
+        self.uploads = uploads
+        self.upload = None
+        self.last_upload = None
+        self.timeout = min(PING_TIMEOUT, interval * 0.8)
+        self.power_cycle = None
+        # Plug sessions are kept open so a power cycle does not start with a login
+        self.devices = tapo_control.DevicePool()
+
+        self.conn = sqlite3.connect(db_file, timeout=10)
+        # WAL lets the dashboard keep reading while a batch is being written
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        schema.ensure_schema(self.conn, db_file)
+        self.target_ids = schema.get_target_ids(self.conn, probe_target_names())
+        self.conn.commit()
+        retention.enable_incremental_vacuum(self.conn)
+        # Outage history carries on from the samples taken before a restart
+        self.decisions = decision_engine.DecisionEngine()
+        self.decisions.load(self.conn, datetime.now())
+
+        # Samples not yet written, as (row, results, now)
+        self.pending = []
+        self.last_commit = time.monotonic()
+        self.retention = retention.RetentionEngine()
+
+    def commit(self):
+        """
+        Writes the pending samples and commits them, along with a recorded power cycle
+        decision, so the write lock is only held for the length of the inserts.
+        """
+        try:
+            for row, results, now in self.pending:
+                insert_row(self.conn, row)
+                insert_probes(self.conn, results, now, self.target_ids)
+            self.conn.commit()
+        except sqlite3.Error:
+            # Keeps the samples for the next attempt rather than holding the lock
+            self.conn.rollback()
+            del self.pending[:-MAX_PENDING_SAMPLES]
+            raise
+        finally:
+            self.last_commit = time.monotonic()
+        if self.pending:
+            logger.info(f"Committed {len(self.pending)} samples")
+            self.pending = []
+
+    def record(self, row, results, now):
+        self.pending.append((row, results, now))
+        # Only degraded samples are worth a log line at this sampling rate
+        log_row(row, logging.INFO if row['success_percentage'] < 100 else logging.DEBUG)
+
+        # Commit failures straight away so outages show up without waiting for a batch
+        if (len(self.pending) >= COMMIT_BATCH_SIZE
+                or time.monotonic() - self.last_commit >= COMMIT_INTERVAL
+                or row['success_percentage'] == 0):
+            self.commit()
+
+        # Retention commits each batch, so pending samples are committed first
+        if self.retention.due():
+            self.commit()
+            self.retention.step(self.conn, now)
+
+    def log_power_cycle_event(self, reason):
+        # Written through the daemon's connection, which a second connection would wait on
+        try:
+            self.conn.execute(
+                "INSERT INTO power_cycle_events (timestamp, reason) VALUES (?, ?)",
+                (schema.to_epoch_ms(datetime.now()), reason)
+            )
+            self.commit()
+            logger.info("Power cycle event logged successfully.")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to log power cycle event: {e}")
+
+    def check_failures(self, row):
+        try:
+            decision = self.decisions.observe(self.conn, row)
+            if decision is None:
+                return
+            self.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to record power cycle decision: {e}")
+            return
+        if decision.action != 'power_cycle':
+            return
+        if self.power_cycle is not None and not self.power_cycle.done():
+            logger.info("Power cycle already in progress, not starting another.")
+            return
+        # Run as a task so sampling carries on during the power cycle
+        self.power_cycle = asyncio.create_task(
+            power_cycle_nbn.control_tapo(self.devices, decision.detail, self.log_power_cycle_event)
+        )
+
+    def start_upload(self, loop):
+        if self.uploads is None or (self.upload is not None and not self.upload.done()):
+            return
+        if self.last_upload is not None and time.monotonic() - self.last_upload < UPLOAD_INTERVAL:
+            return
+        self.last_upload = time.monotonic()
+        # The upload blocks on the network, so it runs in a thread while sampling carries on
+        self.upload = loop.run_in_executor(None, self.uploads.upload_pending)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+        prober = IcmpProber.open()
+        if prober is None:
+            logger.info("ICMP sockets not permitted, falling back to the ping command.")
+        logger.info(f"Collector daemon started, sampling every {self.interval} seconds.")
+        keep_warm = asyncio.create_task(self.devices.keep_warm())
+        next_sample = loop.time()
+        try:
+            while not stop.is_set():
+                now = datetime.now()
+                results = await run_probes(prober, self.timeout)
+                row = summarise(results, now)
+                try:
+                    self.record(row, results, now)
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to insert log into db: {e}")
+                self.check_failures(row)
+                self.start_upload(loop)
+
+                next_sample += self.interval
+                delay = next_sample - loop.time()
+                if delay < 0:
+                    # Fell behind (e.g. the host was suspended); resync instead of bursting
+                    next_sample = loop.time()
+                    delay = 0
+                try:
+                    await asyncio.wait_for(stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            logger.info("Collector daemon stopping.")
+            keep_warm.cancel()
+            try:
+                self.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to insert log into db: {e}")
+            self.conn.close()
+            if prober is not None:
+                prober.close()
+            if self.power_cycle is not None:
+                await self.power_cycle
+            if self.upload is not None:
+                await self.upload
+
+def run_once(uploads=None):
+    now = datetime.now()
+    results = asyncio.run(run_probes())
+    row = summarise(results, now)
+    log_row(row)
+
+    try:
+        conn = sqlite3.connect(DB_FILE, timeout=10)
+        schema.ensure_schema(conn, DB_FILE)
+        # The history is rebuilt from earlier runs' samples, then checked with this one
+        decisions = decision_engine.DecisionEngine()
+        decisions.load(conn, now)
+        insert_row(conn, row)
+        insert_probes(conn, results, now, schema.get_target_ids(conn, probe_target_names()))
+        decision = decisions.observe(conn, row)
+        conn.commit()
+        retention.enable_incremental_vacuum(conn)
+        # Runs for at most one step's budget; anything left is trimmed by the next run
+        retention.RetentionEngine().step(conn, now)
+        conn.close()
+        logger.info("Log successfully inserted into db")
+    except sqlite3.Error as e:
+        logger.error(f"Failed to insert log into db: {e}")
+        decision = None
+
+    if uploads is not None:
+        uploads.upload_pending()
+
+    if decision is not None and decision.action == 'power_cycle':
+        asyncio.run(power_cycle_nbn.control_tapo(reason=decision.detail))
+
+def main():
+    parser = argparse.ArgumentParser(description="Check internet connectivity and log it to SQLite.")
+    parser.add_argument('--daemon', action='store_true',
+                        help="keep running and sample continuously instead of checking once")
+    parser.add_argument('--interval', type=float, default=SAMPLE_INTERVAL,
+                        help=f"seconds between samples in daemon mode (default {SAMPLE_INTERVAL})")
+    parser.add_argument('--upload-url',
+                        help="also send samples to a central dashboard, e.g. http://hub:8050/api/ingest "
+                             "(the token is read from INGEST_TOKEN)")
+    parser.add_argument('--site', default=socket.gethostname(),
+                        help="site name the uploaded samples are shown under (default: host name)")
+    parser.add_argument('--collector', default=socket.gethostname(),
+                        help="collector ID sent with uploads (default: host name)")
+    args = parser.parse_args()
+
+    if args.upload_url and args.site == schema.DEFAULT_SITE:
+        parser.error(f"--site must not be '{schema.DEFAULT_SITE}', which the dashboard keeps for its own collector")
+
+    uploads = None
+    if args.upload_url:
+        uploads = uploader.Uploader(DB_FILE, args.upload_url, args.site, args.collector,
+                                    os.environ.get('INGEST_TOKEN'))
+
+    if args.daemon:
+        asyncio.run(CollectorDaemon(DB_FILE, args.interval, uploads).run())
+    else:
+        run_once(uploads)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import collections
+import itertools
+import logging
+from datetime import timedelta
+
+import schema
+
+logger = logging.getLogger(__name__)
+
+# Seconds after a power cycle before another may be started automatically. Counts
+# from the last one that completed, whether started by the collector, the dashboard
+# or power_cycle_nbn_override.py.
+COOLDOWN_PERIOD = 3600
+
+# Seconds after deciding to power cycle before deciding to again, so a power cycle
+# still in progress or one that failed to reach the plug is retried without waiting
+# out the full cooldown
+RETRY_PERIOD = 300
+
+# How far back the sample history reaches; older samples are dropped
+HISTORY = timedelta(minutes=10)
+
+# One sample as the policies see it; timestamps in epoch milliseconds
+Sample = collections.namedtuple('Sample', ['timestamp', 'success', 'loss'])
+
+# A policy that fired: its name, what it saw, and whether the modem is to be power
+# cycled ('power_cycle') or the cooldown held it back ('cooldown')
+Decision = collections.namedtuple('Decision', ['policy', 'detail', 'action'])
+
+HISTORY_QUERY = """
+SELECT timestamp, success_percentage, packet_loss
+FROM internet_status
+WHERE site = ? AND timestamp >= ?
+ORDER BY timestamp
+"""
+
+INSERT_DECISION = """
+INSERT INTO power_cycle_decisions (timestamp, policy, detail, action)
+VALUES (?, ?, ?, ?)
+"""
+
+class FailedSamples:
+    """
+    Fires when at least `failures` of the last `window` samples had a success rate
+    below `below` percent, by default when they reached no target at all. Allowing
+    a success among the failures catches a link that flaps back for a moment.
+    """
+
+    def __init__(self, failures, window, below=1):
+        self.failures = failures
+        self.window = window
+        self.below = below
+        self.name = f"failed_samples_{failures}_of_{window}"
+
+    def check(self, samples):
+        """
+        Returns what the policy saw if it fires on the samples, oldest first, or None.
+        """
+        recent = list(itertools.islice(reversed(samples), self.window))
+        failed = sum(1 for sample in recent if sample.success is not None and sample.success < self.below)
+        if failed < self.failures:
+            return None
+        return f"{failed} of the last {len(recent)} samples below {self.below}% success"
+
+class SustainedLoss:
+    """
+    Fires when every sample over at least `duration` lost `threshold` percent or
+    more of its probes, which catches a link too degraded to use that still
+    answers the odd probe.
+    """
+
+    def __init__(self, threshold, duration):
+        self.threshold = threshold
+        self.duration = duration
+        self.name = f"sustained_loss_{threshold}"
+
+    def check(self, samples):
+        """
+        Returns what the policy saw if it fires on the samples, oldest first, or None.
+        """
+        start = None
+        for sample in reversed(samples):
+            if sample.loss is None or sample.loss < self.threshold:
+                break
+            start = sample.timestamp
+        if start is None or samples[-1].timestamp - start < self.duration.total_seconds() * 1000:
+            return None
+        return f"packet loss at or above {self.threshold}% for {(samples[-1].timestamp - start) // 1000}s"
+
+# Policies checked after every sample, in order; the first to fire decides. With the
+# daemon's 10-second samples the first fires 30-40 seconds into a total outage.
+POLICIES = [
+    # Three of the last four samples reached nothing
+    FailedSamples(failures=3, window=4),
+    # Most probes lost for two minutes straight
+    SustainedLoss(threshold=80, duration=timedelta(minutes=2)),
+]
+
+# Function to work out how long automatic power cycles are still held back
+def cooldown_remaining(conn, now_ms, cooldown=COOLDOWN_PERIOD, retry=RETRY_PERIOD):
+    """
+    Returns the seconds left before a power cycle may start, or 0. This is the only
+    place the cooldown is enforced: it counts from the last power cycle logged in
+    power_cycle_events and, for the shorter RETRY_PERIOD, from the last decision to
+    power cycle in power_cycle_decisions. Each is a single index lookup.
+    """
+    last_cycle = conn.execute(
+        "SELECT MAX(timestamp) FROM power_cycle_events WHERE site = ?", (schema.DEFAULT_SITE,)
+    ).fetchone()[0]
+    last_decision = conn.execute(
+        "SELECT MAX(timestamp) FROM power_cycle_decisions WHERE action = 'power_cycle'"
+    ).fetchone()[0]
+    until = max(
+        last_cycle + cooldown * 1000 if last_cycle is not None else 0,
+        last_decision + retry * 1000 if last_decision is not None else 0,
+    )
+    return max(0, (until - now_ms) // 1000)
+
+class DecisionEngine:
+    """
+    Decides when to power cycle the modem from the collector's own samples. Recent
+    samples are held in memory and checked against each policy as they arrive. A
+    policy firing is recorded in power_cycle_decisions in the collector's
+    transaction and the history starts over, so the decision survives a restart
+    together with the samples behind it: load() rebuilds the history from the
+    samples taken since the last decision.
+    """
+
+    def __init__(self, policies=POLICIES, cooldown=COOLDOWN_PERIOD, retry=RETRY_PERIOD, history=HISTORY):
+        self.policies = policies
+        self.cooldown = cooldown
+        self.retry = retry
+        self.history_ms = int(history.total_seconds() * 1000)
+        self.samples = collections.deque()
+
+    def load(self, conn, now):
+        """
+        Restores the history from this host's samples within the history span that
+        were taken after the last decision.
+        """
+        last_decision = conn.execute("SELECT MAX(timestamp) FROM power_cycle_decisions").fetchone()[0]
+        since = schema.to_epoch_ms(now) - self.history_ms
+        if last_decision is not None:
+            since = max(since, last_decision + 1)
+        rows = conn.execute(HISTORY_QUERY, (schema.DEFAULT_SITE, since)).fetchall()
+        self.samples = collections.deque(Sample(*row) for row in rows)
+        logger.info(f"Decision history restored with {len(self.samples)} samples.")
+
+    def observe(self, conn, row):
+        """
+        Adds an internet_status row to the history and checks the policies. Returns
+        the Decision if one fired, after recording it on conn for the caller to
+        commit, or None.
+        """
+        self.samples.append(Sample(row['timestamp'], row['success_percentage'], row['packet_loss']))
+        cutoff = row['timestamp'] - self.history_ms
+        while self.samples[0].timestamp < cutoff:
+            self.samples.popleft()
+
+        for policy in self.policies:
+            detail = policy.check(self.samples)
+            if detail is not None:
+                break
+        else:
+            return None
+
+        remaining = cooldown_remaining(conn, row['timestamp'], self.cooldown, self.retry)
+        decision = Decision(policy.name, detail, 'cooldown' if remaining else 'power_cycle')
+        conn.execute(INSERT_DECISION, (row['timestamp'],) + decision)
+        self.samples.clear()
+        if remaining:
+            logger.info(f"{detail}, but the cooldown holds power cycles back for {remaining} more seconds.")
+        else:
+            logger.info(f"{detail}. Power cycling modem...")
+        return decision
@@ -0,0 +1,287 @@
+import base64
+
+import numpy as np
+
+# Dark theme shared by every graph, built once at import
+THEME_LAYOUT = {
+    'plot_bgcolor': '#1e1e1e',
+    'paper_bgcolor': '#1e1e1e',
+    'font': {'color': '#ffffff'},
+    'legend': {
+        'orientation': 'h',
+        'x': 0,
+        'y': -0.2  # Position below the graph
+    },
+    'hovermode': 'closest',
+}
+
+# NumPy type behind each Plotly typed array dtype used here
+TYPED_ARRAY_DTYPES = {
+    'f8': np.float64,
+    'f4': np.float32,
+    'i4': np.int32,
+}
+
+# Function to build a graph layout on top of the shared theme
+def layout(title, title_color, yaxis, xaxis=None, **extra):
+    """
+    Returns a layout with the theme, a title in title_color and the given axes. The
+    theme's nested dicts are shared between layouts rather than copied, so callers
+    must replace them instead of modifying them.
+    """
+    return {
+        **THEME_LAYOUT,
+        'title': title,
+        'titlefont': {'color': title_color},
+        'yaxis': {'color': '#ffffff', **yaxis},
+        'xaxis': {'title': 'Timestamp', 'color': '#ffffff', **(xaxis or {})},
+        **extra,
+    }
+
+# Function to encode a numeric column as a Plotly typed array
+def typed_array(values, dtype='f8'):
+    """
+    Returns the values in Plotly's base64 typed array form, which plotly.js decodes
+    straight into a typed array instead of parsing a JSON list. NaN is kept and
+    drawn as a gap. Traces extended by the live stream must use plain arrays, as
+    Plotly.extendTraces cannot append to these.
+    """
+    array = np.ascontiguousarray(values, dtype=TYPED_ARRAY_DTYPES[dtype])
+    return {'dtype': dtype, 'bdata': base64.b64encode(array.tobytes()).decode('ascii')}
+
+# Function to encode naive local timestamps as a typed array of milliseconds
+def typed_dates(timestamps):
+    """
+    Returns the wall-clock times as milliseconds in a typed array. A date axis reads
+    numbers as milliseconds since the epoch in UTC, so the axis shows the local
+    times unchanged; it needs 'type': 'date' since numbers alone autotype as linear.
+    """
+    return typed_array(np.asarray(timestamps, dtype='datetime64[ms]').astype(np.int64))
+
+# Function to format naive local timestamps as plain date strings
+def date_strings(timestamps):
+    """
+    Returns the timestamps as an array of ISO strings, formatted by NumPy in one pass
+    rather than serialised one Timestamp at a time. Each string is as short as its
+    value allows (whole-second times have no milliseconds). For traces the live
+    stream extends, which appends date strings.
+    """
+    return np.datetime_as_string(np.asarray(timestamps, dtype='datetime64[ms]'), unit='auto')
+
+# Function to pass a numeric column as a plain array
+def plain_array(values):
+    """
+    Returns the values as a float NumPy array, which the JSON encoder writes as a list
+    with NaN as null.
+    """
+    return np.asarray(values, dtype=np.float64)
+
+# Colours and names of the latency metrics
+LATENCY_COLORS = {
+    'avg_latency_ms': '#ffcc00',
+    'max_latency_ms': '#ff6666',
+    'min_latency_ms': '#66ff66'
+}
+LATENCY_NAMES = {
+    'avg_latency_ms': 'Avg Latency (ms)',
+    'max_latency_ms': 'Max Latency (ms)',
+    'min_latency_ms': 'Min Latency (ms)'
+}
+
+PERCENTILE_COLORS = {'p50': '#66ff66', 'p95': '#ffcc00', 'p99': '#ff6666'}
+
+# Function to build the x axis shared by the graphs the live stream extends
+def live_xaxis(x_range):
+    # Only the left end is fixed; the right end autoscales so streamed points stay in view
+    return {'range': x_range, 'autorange': 'max'}
+
+# Function to build the success rate graph
+def success_figure(plot_df, power_cycle_df, x_range, band_label=None, x=None):
+    """
+    Returns the success rate graph with power cycle markers. With a band_label the
+    rows are buckets and their min/max success is drawn as a shaded band. x is the
+    rows' date_strings, when already formatted for another graph.
+    """
+    if x is None:
+        x = date_strings(plot_df['timestamp'])
+    # Each trace's meta names the sample column the live stream appends to it
+    traces = [
+        {
+            'x': x,
+            'y': plain_array(plot_df['success']),
+            'meta': 'success',
+            'type': 'scattergl',  # Use Scattergl for better performance with large datasets
+            'mode': 'lines',
+            'name': 'Success Rate (%)',
+            'line': {'color': '#00ccff', 'width': 2},
+            'marker': {'size': 5, 'symbol': 'circle'}
+        },
+    ]
+    if band_label is not None:
+        # Shaded min/max band for bucketed data so dips inside a bucket stay visible.
+        # The stream does not extend these, so they can be sent as typed arrays.
+        band_x = typed_dates(plot_df['timestamp'])
+        traces += [
+            {
+                'x': band_x,
+                'y': typed_array(plot_df['success_min']),
+                'type': 'scattergl',
+                'mode': 'lines',
+                'line': {'width': 0},
+                'showlegend': False,
+                'hoverinfo': 'skip'
+            },
+            {
+                'x': band_x,
+                'y': typed_array(plot_df['success_max']),
+                'type': 'scattergl',
+                'mode': 'lines',
+                'fill': 'tonexty',
+                'fillcolor': 'rgba(0, 204, 255, 0.2)',
+                'line': {'width': 0},
+                'name': f'Success Range per {band_label}',
+                'hoverinfo': 'skip'
+            },
+        ]
+    traces.append({
+        'x': date_strings(power_cycle_df['timestamp']),
+        'y': np.full(len(power_cycle_df), 50),  # Place markers at the middle (50%) of the success graph
+        'meta': 'power_cycle',
+        'mode': 'markers',
+        'name': 'NBN Power Cycle',
+        'marker': {'color': 'red', 'size': 24, 'symbol': 'square'},
+        # Display timestamp and a fixed label on hover, which also holds for streamed markers
+        'hovertemplate': 'NBN Power Cycle Event<br>%{x}<extra></extra>'
+    })
+    return {
+        'data': traces,
+        'layout': layout(
+            'Internet Connectivity Over Time', '#00ccff',
+            {'title': 'Ping Response Success Rate (%)', 'range': [0, 100]},
+            {**live_xaxis(x_range), 'type': 'date'},
+        )
+    }
+
+# Message shown on the latency graph while no metric is selected
+NO_METRIC_ANNOTATION = {
+    'text': "Please select at least one latency metric to display.",
+    'xref': "paper",
+    'yref': "paper",
+    'showarrow': False,
+    'font': {
+        'size': 16,
+        'color': '#ffffff'
+    }
+}
+
+# Function to work out the latency y axis for the selected metrics
+def latency_y_max(metric_max, metrics, max_latency):
+    """
+    Returns the top of the y axis for the selected metrics given each metric's
+    maximum: a 10% buffer above the largest, capped at max_latency.
+    """
+    return min(max((metric_max[metric] for metric in metrics), default=0) * 1.1, max_latency)
+
+# Function to build the latency graph
+def latency_figure(plot_df, metrics, x_range, max_latency, x=None):
+    """
+    Returns the latency graph with a trace for every metric, only the selected ones
+    visible, and the y axis scaled to them up to max_latency, or a prompt to pick a
+    metric if none are selected. Each metric's maximum and max_latency are kept in
+    the layout's meta, so the metric checkboxes can show and hide traces and rescale
+    the axis in the browser without a round trip (see the dashboard's clientside
+    callback).
+    """
+    metric_max = {
+        metric: float(np.nanmax(plot_df[metric].to_numpy(dtype=np.float64), initial=0))
+        for metric in LATENCY_COLORS
+    }
+    if x is None:
+        x = date_strings(plot_df['timestamp'])
+    return {
+        'data': [
+            {
+                'x': x,
+                'y': plain_array(plot_df[metric]),
+                'meta': metric,
+                'visible': metric in metrics,
+                'type': 'scattergl',
+                'mode': 'lines',
+                'name': LATENCY_NAMES[metric],
+                'line': {'color': color, 'width': 2},
+                'marker': {'size': 5, 'symbol': 'circle'}
+            }
+            for metric, color in LATENCY_COLORS.items()
+        ],
+        'layout': layout(
+            'Latency Over Time', '#ffcc00',
+            {'title': 'Latency (ms)', 'range': [0, latency_y_max(metric_max, metrics, max_latency) if metrics else max_latency]},
+            {**live_xaxis(x_range), 'type': 'date'},
+            annotations=[] if metrics else [NO_METRIC_ANNOTATION],
+            meta={'metric_max': metric_max, 'max_latency': max_latency},
+        )
+    }
+
+# Function to build the packet loss graph
+def packetloss_figure(plot_df, x_range, y_range, x=None):
+    if x is None:
+        x = date_strings(plot_df['timestamp'])
+    return {
+        'data': [
+            {
+                'x': x,
+                'y': plain_array(plot_df['packet_loss']),
+                'meta': 'packet_loss',
+                'type': 'scattergl',
+                'mode': 'lines',
+                'name': 'Packet Loss (%)',
+                'line': {'color': '#ff0000', 'width': 2},
+                'marker': {'size': 5, 'symbol': 'circle'}
+            },
+        ],
+        'layout': layout(
+            'Packet Loss Over Time', '#ff0000',
+            {'title': 'Packet Loss (%)', 'range': y_range},
+            {**live_xaxis(x_range), 'type': 'date'},
+        )
+    }
+
+# Layout of the graphs built from individual probe samples
+PROBE_AXES = ({'title': 'Latency (ms)', 'rangemode': 'tozero'}, {'type': 'date'})
+
+# Function to build the per-target latency graph
+def target_latency_figure(target_df, width_label):
+    traces = []
+    for target, rows in target_df.groupby('target', sort=True):
+        traces.append({
+            'x': typed_dates(rows['timestamp']),
+            'y': typed_array(rows['avg_rtt_ms']),
+            'customdata': typed_array(rows['loss']),
+            'type': 'scattergl',
+            'mode': 'lines',
+            'name': target,
+            'line': {'width': 2},
+            'hovertemplate': '%{y:.1f} ms, %{customdata:.0f}% lost<extra>' + target + '</extra>'
+        })
+    return {
+        'data': traces,
+        'layout': layout(f'Latency by Target (mean per {width_label})', '#ffcc00', *PROBE_AXES)
+    }
+
+# Function to build the latency percentile graph
+def percentile_figure(percentile_df, width_label):
+    x = typed_dates(percentile_df['timestamp'])
+    return {
+        'data': [
+            {
+                'x': x,
+                'y': typed_array(percentile_df[column]),
+                'type': 'scattergl',
+                'mode': 'lines',
+                'name': f'{column} Latency (ms)',
+                'line': {'color': color, 'width': 2}
+            }
+            for column, color in PERCENTILE_COLORS.items()
+        ],
+        'layout': layout(f'Latency Percentiles (per {width_label})', '#ffcc00', *PROBE_AXES)
+    }
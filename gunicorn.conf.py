@@ -0,0 +1,69 @@
+"""
+Gunicorn settings for serving the dashboard in production:
+
+    gunicorn -c gunicorn.conf.py
+
+Each worker is a process of its own with a pool of threads, so a slow callback
+holds up one thread rather than every client. The status badge, power cycle jobs
+and cached query results are shared between workers through Redis. Each open
+dashboard holds one thread for its /stream connection, so allow for that when
+setting DASH_THREADS.
+
+/metrics reports the sum over every worker: each worker writes its metrics to
+METRICS_DIR (logs/metrics by default) every few seconds and when it exits, and
+whichever worker answers a scrape adds them up. The directory is emptied when the
+server starts, so counters restart from zero only on a restart, not on a reload.
+
+Send SIGHUP to the master (systemctl reload dash_app) to replace the workers
+gracefully: new workers start, then the old ones finish their requests within
+graceful_timeout. Imports are preloaded in the master, so picking up new code
+needs a restart.
+"""
+import multiprocessing
+import os
+import shutil
+
+# The application, from wsgi.py
+wsgi_app = 'wsgi:application'
+
+bind = os.environ.get('DASH_BIND', '0.0.0.0:8050')
+
+# One worker per core by default; each holds its own in-process caches
+workers = int(os.environ.get('DASH_WORKERS', multiprocessing.cpu_count()))
+
+# Threads per worker, enough for the open /stream connections and the callbacks
+worker_class = 'gthread'
+threads = int(os.environ.get('DASH_THREADS', 16))
+
+# Import the dashboard once in the master and fork the workers from it, so they
+# start quickly and share its memory until they write to it
+preload_app = True
+
+# Seconds a worker may go silent before it is restarted, and that workers being
+# replaced get to finish their requests; open /stream connections are cut at the
+# end of it and the browser reconnects
+timeout = 60
+graceful_timeout = 30
+
+# Seconds an idle keep-alive connection is held, for clients polling every few seconds
+keepalive = 5
+
+errorlog = '-'
+loglevel = 'info'
+
+# Where workers publish their metrics; set before the app is imported, which reads it
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.realpath(__file__)), 'logs/metrics'))
+
+# Function to drop the metrics of a previous run when the server starts
+def on_starting(server):
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+# Function to start each worker's background threads, which are not inherited from the master
+def post_fork(server, worker):
+    import internet_status_dashboard
+    internet_status_dashboard.start_background()
+
+# Function to publish a worker's final metrics, so the sum keeps its requests
+def worker_exit(server, worker):
+    import metrics
+    metrics.write_snapshot()
@@ -0,0 +1,179 @@
+import json
+import logging
+import numbers
+import re
+import sqlite3
+import zlib
+
+import read_connections
+import schema
+
+logger = logging.getLogger(__name__)
+
+# Site and collector names: letters, digits, '.', '_' and '-'
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# Largest batch accepted, in samples plus power cycles
+MAX_BATCH_ROWS = 5000
+
+# Largest batch body accepted once decompressed, in bytes
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+# Sample columns a batch sends, one array each, with the values each may hold
+SAMPLE_COLUMNS = {
+    'timestamp': 'timestamp',
+    'status': 'text',
+    'success_percentage': 'percentage',
+    'avg_latency_ms': 'number',
+    'max_latency_ms': 'number',
+    'min_latency_ms': 'number',
+    'packet_loss': 'number',
+}
+
+POWER_CYCLE_COLUMNS = {
+    'timestamp': 'timestamp',
+    'reason': 'text',
+}
+
+# Rows already held for the same site and timestamp are skipped, so a batch can be
+# sent again after a lost response without duplicating anything
+INSERT_SAMPLE = """
+INSERT OR IGNORE INTO internet_status (site, collector, timestamp, status, success_percentage,
+                                       avg_latency_ms, max_latency_ms, min_latency_ms, packet_loss)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_POWER_CYCLE = """
+INSERT OR IGNORE INTO power_cycle_events (site, timestamp, reason)
+VALUES (?, ?, ?)
+"""
+
+# Function to decompress and decode an uploaded batch
+def decode_batch(body, content_encoding=None):
+    """
+    Returns the JSON object in the request body, gunzipping it first when sent with
+    Content-Encoding: gzip. Raises ValueError for anything that is not a JSON object
+    or that would decompress to more than MAX_BODY_BYTES.
+    """
+    if content_encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, MAX_BODY_BYTES)
+        except zlib.error as e:
+            raise ValueError(f"Invalid gzip body: {e}")
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"Batch is larger than {MAX_BODY_BYTES} bytes")
+    elif content_encoding not in (None, 'identity'):
+        raise ValueError(f"Unsupported Content-Encoding: {content_encoding}")
+    elif len(body) > MAX_BODY_BYTES:
+        raise ValueError(f"Batch is larger than {MAX_BODY_BYTES} bytes")
+    try:
+        batch = json.loads(body)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(batch, dict):
+        raise ValueError("Batch must be a JSON object")
+    return batch
+
+# Function to check one value of a batch column
+def _valid(value, kind):
+    if kind == 'timestamp':
+        return isinstance(value, numbers.Integral) and not isinstance(value, bool) and value > 0
+    if value is None:
+        return kind != 'percentage'
+    if kind == 'text':
+        return isinstance(value, str) and len(value) <= 256
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        return False
+    if kind == 'percentage':
+        return isinstance(value, numbers.Integral) and 0 <= value <= 100
+    return value >= 0
+
+# Function to turn a columnar section of a batch into rows
+def _rows(section, columns, name):
+    """
+    Returns the section's rows as tuples in the order of columns. The section holds
+    one equally long array per column; optional columns may be left out.
+    """
+    if section is None:
+        return []
+    if not isinstance(section, dict):
+        raise ValueError(f"'{name}' must be an object of column arrays")
+    unknown = set(section) - set(columns)
+    if unknown:
+        raise ValueError(f"Unknown '{name}' columns: {', '.join(sorted(unknown))}")
+    if not isinstance(section.get('timestamp'), list):
+        raise ValueError(f"'{name}' needs a timestamp array")
+    length = len(section['timestamp'])
+    arrays = []
+    for column, kind in columns.items():
+        values = section.get(column, [None] * length)
+        if not isinstance(values, list) or len(values) != length:
+            raise ValueError(f"'{name}.{column}' must be an array as long as '{name}.timestamp'")
+        for index, value in enumerate(values):
+            if not _valid(value, kind):
+                raise ValueError(f"Invalid {name}.{column}[{index}]: {value!r}")
+        arrays.append(values)
+    return list(zip(*arrays))
+
+# Function to validate a decoded batch
+def parse_batch(batch):
+    """
+    Returns (site, collector, samples, power_cycles) for a batch of the form
+
+        {"site": "office", "collector": "pi-1",
+         "samples": {"timestamp": [...], "status": [...], "success_percentage": [...],
+                     "avg_latency_ms": [...], "max_latency_ms": [...],
+                     "min_latency_ms": [...], "packet_loss": [...]},
+         "power_cycles": {"timestamp": [...], "reason": [...]}}
+
+    with timestamps in epoch milliseconds. Rows are tuples in the order of
+    SAMPLE_COLUMNS and POWER_CYCLE_COLUMNS. Raises ValueError if anything is missing
+    or out of range, or if the batch claims this host's own site.
+    """
+    site = batch.get('site')
+    collector = batch.get('collector')
+    if not isinstance(site, str) or not NAME_PATTERN.match(site):
+        raise ValueError("'site' must be 1-64 letters, digits, '.', '_' or '-'")
+    if site == schema.DEFAULT_SITE:
+        # Its samples would merge with this host's, and its power cycles would hold
+        # back or trigger this host's own
+        raise ValueError(f"'site' must not be '{schema.DEFAULT_SITE}', which is this dashboard's own collector")
+    if collector is not None and (not isinstance(collector, str) or not NAME_PATTERN.match(collector)):
+        raise ValueError("'collector' must be 1-64 letters, digits, '.', '_' or '-'")
+    samples = _rows(batch.get('samples'), SAMPLE_COLUMNS, 'samples')
+    power_cycles = _rows(batch.get('power_cycles'), POWER_CYCLE_COLUMNS, 'power_cycles')
+    if len(samples) + len(power_cycles) > MAX_BATCH_ROWS:
+        raise ValueError(f"Batch has more than {MAX_BATCH_ROWS} rows")
+    return site, collector, samples, power_cycles
+
+# Function to write a validated batch to the database
+def write_batch(db_path, site, collector, samples, power_cycles):
+    """
+    Inserts the batch in a single transaction, so it is stored either whole or not at
+    all and the rollup and incident triggers run once per new row. Returns the number
+    of samples and power cycles inserted and of duplicates skipped.
+    """
+    # Waits out the collector's commits and checkpoints rather than failing the batch
+    conn = read_connections.connect_writable(db_path)
+    try:
+        schema.ensure_schema(conn, db_path)
+        with conn:
+            # Power cycles go first, so an incident closed by this batch's samples finds
+            # the power cycle that ended it
+            inserted_power_cycles = conn.executemany(
+                INSERT_POWER_CYCLE, [(site,) + row for row in power_cycles]
+            ).rowcount
+            inserted_samples = conn.executemany(
+                INSERT_SAMPLE, [(site, collector) + row for row in samples]
+            ).rowcount
+    finally:
+        conn.close()
+    result = {
+        'samples': inserted_samples,
+        'power_cycles': inserted_power_cycles,
+        'duplicates': len(samples) - inserted_samples + len(power_cycles) - inserted_power_cycles,
+    }
+    logger.info(f"Stored batch from {site}/{collector or '-'}: {result['samples']} samples, "
+                f"{result['power_cycles']} power cycles, {result['duplicates']} duplicates skipped.")
+    return result
@@ -1,18 +1,38 @@
 import dash
 from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import pandas as pd
-import subprocess
 import datetime
+import gzip
+import hashlib
+import hmac
 import sqlite3
+from flask import Response, g, request
 from flask_caching import Cache
+import plotly.io.json as plotly_json
 import redis
 import os
-import sys
+import threading
+import time
+import uuid
 import logging
-import socket
 
-SCRIPT_DIR = os.path.dirname(os.path.realpath(sys.argv[0])) 
+import aggregation
+import figures
+import ingest
+import live_feed
+import metrics
+import power_jobs
+import read_connections
+import result_store
+import schema
+import status_checker
+import status_db
+import table_query
+import versioned_cache
+
+# Directory of this file, also when it is imported by a WSGI server rather than run
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +43,7 @@ logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
+logger = logging.getLogger(__name__)
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
@@ -32,41 +53,31 @@ server = app.server  # Expose the Flask server for caching
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')  # can set this in your environment
 
 cache = Cache(app.server, config={
-    'CACHE_TYPE': 'redis',
+    'CACHE_TYPE': 'RedisCache',
     'CACHE_REDIS_URL': REDIS_URL,
     'CACHE_DEFAULT_TIMEOUT': 60,  # Cache timeout in seconds (5 minutes)
 })
 
+# Read-only SQLite connections kept open per worker thread; uploads still write
+# through ingest's own connection
+db_connections = read_connections.ReadConnections()
+
 # Function to read and parse data from the SQLite database
-def parse_log(db_path):
+def parse_log(db_path, date_range='all_time', after=None, site=schema.DEFAULT_SITE):
     """
-    Fetches all records from the internet_status table.
+    Fetches the site's records in the selected date range from the internet_status
+    table, optionally only those newer than the 'after' timestamp.
     """
     try:
-        conn = sqlite3.connect(db_path)
-        query = """
-        SELECT timestamp,
-               status AS status_message,
-               success_percentage AS success,
-               avg_latency_ms,
-               max_latency_ms,
-               min_latency_ms,
-               packet_loss
-        FROM internet_status
-        """
-        df = pd.read_sql_query(query, conn)
-        # Convert the 'timestamp' column to datetime type
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        # Ensure numeric columns are indeed numeric
-        numeric_columns = ['success', 'avg_latency_ms', 'max_latency_ms', 'min_latency_ms', 'packet_loss']
-        for col in numeric_columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')  # Convert, setting errors to NaN
+        conn = db_connections.get(db_path)
+        # Push the site and range bound into SQL so only rows in the window are read. The
+        # columns come back already typed, with timestamps converted from epoch milliseconds.
+        df = status_db.read_status(conn, status_db.get_start_date(date_range), after, site)
         # Cap the values to prevent outliers
         df['avg_latency_ms'] = df['avg_latency_ms'].clip(upper=500)  # Updated to 500ms as per user
         df['max_latency_ms'] = df['max_latency_ms'].clip(upper=500)
         df['min_latency_ms'] = df['min_latency_ms'].clip(upper=500)
         df['packet_loss'] = df['packet_loss'].clip(upper=100)
-        conn.close()
         logger.info("Data parsed successfully from the database.")
         return df
     except Exception as e:
@@ -78,17 +89,8 @@ def filter_data_by_date(log_data, date_range):
     """
     Filters the log data based on the selected date range.
     """
-    now = pd.to_datetime(datetime.datetime.now())
-
-    if date_range == 'last_12_hours':
-        start_date = now - pd.DateOffset(hours=12)
-    elif date_range == 'last_24_hours':
-        start_date = now - pd.DateOffset(hours=24)
-    elif date_range == 'last_48_hours':
-        start_date = now - pd.DateOffset(hours=48)
-    elif date_range == 'last_7_days':
-        start_date = now - pd.DateOffset(days=7)
-    else:
+    start_date = status_db.get_start_date(date_range)
+    if start_date is None:
         return log_data  # For 'all_time', no filtering
 
     # Filter the data by the calculated date range
@@ -96,31 +98,312 @@ def filter_data_by_date(log_data, date_range):
     logger.info(f"Data filtered for date range: {date_range}")
     return filtered_data
 
-# Cached data fetching function with error handling
-@cache.memoize(timeout=300)  # Cache timeout of 5 minutes
-def get_filtered_data(db_path, date_range):
+# Background connectivity check shared by every client, published through the cache
+internet_checker = status_checker.StatusChecker(cache)
+
+# Power cycles started from the dashboard, run in the background one at a time
+power_cycles = power_jobs.PowerCycleJobs(cache)
+
+# Function to start the background work each serving process keeps running
+def start_background():
+    """
+    Logs in to the smart plug so the first power cycle does not wait for it, and
+    starts publishing this process's metrics for /metrics to sum across workers.
+    Called once the serving process exists: by __main__ here, and by
+    gunicorn.conf.py in each worker after it is forked, since threads do not
+    survive a fork.
+    """
+    power_jobs.device_pool.start()
+    metrics.start_flushing()
+
+# Status shown for each power cycle job state
+POWER_CYCLE_LABELS = {
+    power_jobs.QUEUED: "Power cycle accepted, connecting to the plug...",
+    power_jobs.OFF: "Plug turned off",
+    power_jobs.WAITING: "Plug off, waiting before turning it back on...",
+    power_jobs.ON: "Power cycle complete",
+    power_jobs.FAILED: "Power cycle failed",
+}
+
+# Columns kept in each server-side result
+COLUMNS_TO_CACHE = ['timestamp', 'success', 'avg_latency_ms', 'max_latency_ms', 'min_latency_ms', 'packet_loss']
+
+# Server-side results, keyed by the small handle kept in the filtered-data store
+results = result_store.ResultStore()
+
+# Full fetches, cached under the version of the rows they were read from
+filtered_data_cache = versioned_cache.VersionedCache(cache, name='filtered_data')
+
+# Function to read the records in a date range in the columns kept for the dashboard
+def read_filtered_data(db_path, date_range, site=schema.DEFAULT_SITE):
+    filtered_df = parse_log(db_path, date_range, site=site)
+    if filtered_df.empty:
+        logger.warning("Filtered DataFrame is empty after applying date range.")
+        return pd.DataFrame(columns=COLUMNS_TO_CACHE)
+    # Select only necessary columns for caching to reduce memory usage
+    logger.info(f"Returning filtered data with {len(filtered_df)} records.")
+    return filtered_df[COLUMNS_TO_CACHE].reset_index(drop=True)
+
+# Function to build a cache key that holds while the rows in a date range are unchanged
+def data_version_key(name, db_path, date_range, site=schema.DEFAULT_SITE):
+    """
+    Returns the key for the named result, or None if the data version could not be
+    read. Checking costs two index lookups.
+    """
+    try:
+        conn = db_connections.get(db_path)
+        first_id, last_id = status_db.read_data_version(conn, status_db.get_start_date(date_range), site)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read the data version, fetching without the cache: {e}")
+        return None
+    return f"{name}:{db_path}:{site}:{date_range}:{first_id}:{last_id}"
+
+# Cached data fetching function
+def get_filtered_data(db_path, date_range, site=schema.DEFAULT_SITE):
+    """
+    Retrieves the site's filtered data from the database, reusing a cached result
+    while the rows in the date range are unchanged.
+    """
+    key = data_version_key('filtered_data', db_path, date_range, site)
+    if key is None:
+        return read_filtered_data(db_path, date_range, site)
+    return filtered_data_cache.get_or_build(key, lambda: read_filtered_data(db_path, date_range, site))
+
+# Gzipped /api/samples responses, cached the same way as full fetches
+samples_payload_cache = versioned_cache.VersionedCache(cache, name='samples_payload')
+
+# Function to encode the records in a date range as a compressed columnar JSON payload
+def read_samples_payload(db_path, date_range, site=schema.DEFAULT_SITE):
+    """
+    Returns gzip-compressed JSON with one array per column, timestamps in epoch
+    milliseconds and missing values as null, ready to be sent as it is.
+    """
+    conn = db_connections.get(db_path)
+    arrays = status_db.read_status_arrays(conn, status_db.get_start_date(date_range), site=site)
+    # The status message is derived from success, so it is not worth sending
+    del arrays['status_message']
+    body = plotly_json.to_json_plotly({
+        'site': site,
+        'date_range': date_range,
+        'rows': len(arrays['timestamp']),
+        'columns': arrays,
+    })
+    return gzip.compress(body.encode(), compresslevel=6)
+
+# Power cycle events per site, cached until another event is recorded
+power_cycle_cache = versioned_cache.VersionedCache(cache, name='power_cycles')
+
+# Function to read a site's power cycle events
+def read_power_cycles(db_path, site=schema.DEFAULT_SITE):
+    conn = db_connections.get(db_path)
+    power_cycle_df = status_db.read_power_cycle_events(conn, site=site)
+    logger.info(f"Fetched {len(power_cycle_df)} power cycle events for {site}.")
+    return power_cycle_df
+
+# Function to get a site's power cycle events, read once per new event
+def get_power_cycles(db_path, site=schema.DEFAULT_SITE):
+    """
+    Returns the site's power cycle events, oldest first, from the cache unless an
+    event has been recorded since they were read. Returns an empty frame on error.
+    """
+    try:
+        conn = db_connections.get(db_path)
+        version = status_db.read_power_cycle_version(conn)
+        key = f"power_cycles:{db_path}:{site}:{version}"
+        return power_cycle_cache.get_or_build(key, lambda: read_power_cycles(db_path, site))
+    except Exception as e:
+        logger.error(f"Failed to fetch power cycle events: {e}")
+        return pd.DataFrame(columns=['timestamp'])
+
+# Function to fetch only what changed since the last fetch
+def get_data_since(db_path, date_range, cursor, site=schema.DEFAULT_SITE):
     """
-    Retrieves filtered data from the database, utilizing Redis for caching.
+    Returns the site's records written after the cursor, how many of the held records
+    have aged out of the window, and the updated cursor. Returns None when a full
+    reload is needed instead, including when rows written since the cursor fall
+    inside the held range: a collector replaying its backlog, or a second collector
+    at the site, can write rows older than the newest one held.
     """
+    if cursor.get('last_id') is None:
+        return None
+    conn = None
     try:
-        df = parse_log(db_path)
-        if df.empty:
-            logger.warning("Parsed DataFrame is empty.")
-            return []
-        filtered_df = filter_data_by_date(df, date_range)
-        if filtered_df.empty:
-            logger.warning("Filtered DataFrame is empty after applying date range.")
-            return []
-        # Select only necessary columns for caching to reduce memory usage
-        columns_to_cache = ['timestamp', 'success', 'avg_latency_ms', 'max_latency_ms', 'min_latency_ms', 'packet_loss']
-        logger.info(f"Returning filtered data with {len(filtered_df)} records.")
-        return filtered_df[columns_to_cache].to_dict('records')
+        conn = db_connections.get(db_path)
+        # Read from one snapshot, so no row lands between the checks and the new rows
+        conn.execute("BEGIN")
+        last_id = status_db.read_last_id(conn)
+        start_date = status_db.get_start_date(date_range)
+        if start_date is None:
+            # Retention trims 'all_time' from the front; resync in full when that happens
+            oldest = status_db.read_first_timestamp(conn, site=site)
+            if oldest is not None and oldest > cursor['first']:
+                return None
+            aged_count = 0
+            first = cursor['first']
+        else:
+            if cursor['last'] < schema.to_epoch_ms(start_date):
+                return None  # The whole held window has aged out
+            aged_count = status_db.count_status(conn, cursor['first'], start_date, site)
+            first = status_db.read_first_timestamp(conn, start_date, site) if aged_count else cursor['first']
+
+        if status_db.count_late_rows(conn, cursor['last_id'], cursor['last'], start_date, site):
+            logger.info("Rows arrived out of order, reloading in full.")
+            return None
+
+        new_df = parse_log(db_path, date_range, after=cursor['last'], site=site)
+        new_df = new_df[COLUMNS_TO_CACHE] if not new_df.empty else pd.DataFrame(columns=COLUMNS_TO_CACHE)
+        last = cursor['last'] if new_df.empty else schema.to_epoch_ms(new_df['timestamp'].max())
+        logger.info(f"Incremental fetch: {len(new_df)} new records, {aged_count} aged out.")
+        return new_df, aged_count, {'date_range': date_range, 'first': first or last, 'last': last, 'last_id': last_id}
     except Exception as e:
-        logger.error(f"Redis Cache Error: {e}")
-        # Fallback to fetching data without caching
-        df = parse_log(db_path)
-        filtered_df = filter_data_by_date(df, date_range)
-        return filtered_df.to_dict('records') if not filtered_df.empty else []
+        logger.error(f"Incremental fetch failed: {e}")
+        return None
+    finally:
+        if conn is not None and conn.in_transaction:
+            conn.commit()
+
+# Function to describe which rows a result holds
+def make_cursor(date_range, df, last_id=None):
+    """
+    Builds the cursor for a result, or None if there is no data. last_id is the
+    newest internet_status ID read before the result was: every row up to it is
+    either held or outside the range.
+    """
+    if df.empty:
+        return None
+    return {
+        'date_range': date_range,
+        'first': schema.to_epoch_ms(df['timestamp'].iloc[0]),
+        'last': schema.to_epoch_ms(df['timestamp'].iloc[-1]),
+        'last_id': last_id,
+    }
+
+# Function to look up the result behind a filtered-data handle
+def load_result(filtered_data):
+    """
+    Returns the DataFrame for the handle in the filtered-data store, rebuilding it
+    from the database if this process no longer holds it.
+    """
+    if not filtered_data:
+        return pd.DataFrame(columns=COLUMNS_TO_CACHE)
+    df = results.get(filtered_data['handle'])
+    if df is None:
+        logger.info(f"Result {filtered_data['handle']} not held, rebuilding it.")
+        df = get_filtered_data(get_db_path(), filtered_data['date_range'], get_site(filtered_data))
+        results.put(df, filtered_data['handle'])
+    return df
+
+# Function to read which site a filtered-data handle is for
+def get_site(filtered_data):
+    return filtered_data.get('site', schema.DEFAULT_SITE)
+
+# Function to locate the SQLite database
+def get_db_path():
+    return os.path.join(SCRIPT_DIR, 'logs/internet_status.db')
+
+# Single database watcher feeding every open /stream connection in this process
+live_updates = live_feed.LiveFeed(get_db_path())
+
+# Server-sent events stream of new samples and power cycle events, read by assets/live.js
+@server.route('/stream')
+def stream():
+    return Response(
+        live_updates.stream(),
+        mimetype='text/event-stream',
+        # Stop proxies from caching or buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Samples in a date range as columnar JSON, e.g. /api/samples?range=last_24_hours&site=office
+@server.route('/api/samples')
+def samples():
+    date_range = request.args.get('range', 'last_12_hours')
+    if date_range != 'all_time' and date_range not in status_db.DATE_RANGES:
+        return Response(f"Unknown range: {date_range}", status=400, mimetype='text/plain')
+    site = request.args.get('site', schema.DEFAULT_SITE)
+    if not ingest.NAME_PATTERN.match(site):
+        return Response(f"Invalid site: {site}", status=400, mimetype='text/plain')
+    db_path = get_db_path()
+
+    # The key changes whenever the rows do, so it doubles as the ETag
+    key = data_version_key('samples_payload', db_path, date_range, site)
+    if key is None:
+        payload = read_samples_payload(db_path, date_range, site)
+        etag = None
+    else:
+        etag = hashlib.sha1(key.encode()).hexdigest()
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+        payload = samples_payload_cache.get_or_build(key, lambda: read_samples_payload(db_path, date_range, site))
+
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if etag is not None:
+        headers['ETag'] = f'"{etag}"'
+    if 'gzip' in request.accept_encodings:
+        # A hit sends the cached bytes as they are
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        payload = gzip.decompress(payload)
+    return Response(payload, mimetype='application/json', headers=headers)
+
+# Shared secret collectors at other sites send as a Bearer token; uploads are refused
+# while it is unset
+INGEST_TOKEN = os.environ.get('INGEST_TOKEN')
+
+# Batched sample uploads from remote collectors (see uploader.py), optionally gzipped
+@server.route('/api/ingest', methods=['POST'])
+def ingest_batch():
+    if not INGEST_TOKEN:
+        return Response("Ingestion is disabled; set INGEST_TOKEN to enable it", status=403, mimetype='text/plain')
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {INGEST_TOKEN}"):
+        return Response("Invalid token", status=401, mimetype='text/plain')
+    if request.content_length is not None and request.content_length > ingest.MAX_BODY_BYTES:
+        return Response("Batch too large", status=413, mimetype='text/plain')
+    try:
+        batch = ingest.parse_batch(ingest.decode_batch(request.get_data(), request.content_encoding))
+        result = ingest.write_batch(get_db_path(), *batch)
+    except ValueError as e:
+        return Response(str(e), status=400, mimetype='text/plain')
+    except sqlite3.Error as e:
+        logger.error(f"Failed to store uploaded batch: {e}")
+        return Response("Could not store the batch", status=503, mimetype='text/plain')
+    return result
+
+# Directory each request's stack samples are written to when set, for flame graphs
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
+# Function to name what a request is for in the metrics: the Dash callback it runs or its route
+def request_handler_name():
+    if request.path.endswith('/_dash-update-component'):
+        body = request.get_json(silent=True) or {}
+        entry = app.callback_map.get(body.get('output'), {})
+        return getattr(entry.get('callback'), '__name__', 'unknown_callback')
+    return request.endpoint or 'unknown'
+
+@server.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    if PROFILE_DIR:
+        g.stack_sampler = metrics.StackSampler(threading.get_ident()).start()
+
+# Records each request's duration and response size, which for Dash callbacks includes
+# serialising the figures to JSON on top of the callback itself
+@server.after_request
+def record_request_metrics(response):
+    handler = request_handler_name()
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, handler=handler)
+    # Streamed responses such as /stream have no length
+    if not response.is_streamed and response.content_length is not None:
+        metrics.RESPONSE_BYTES.observe(response.content_length, handler=handler)
+    sampler = g.pop('stack_sampler', None)
+    if sampler is not None:
+        sampler.stop(os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{handler}-{uuid.uuid4().hex[:8]}.folded"))
+    return response
+
+# Metrics for this worker in the Prometheus text format
+@server.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 # Function to calculate dynamic y-axis range with buffer and capping
 def calculate_y_range(data_series, absolute_max, buffer_ratio=0.1):
@@ -136,15 +419,6 @@ def calculate_y_range(data_series, absolute_max, buffer_ratio=0.1):
     y_max = min(dynamic_max, absolute_max)
     return [0, y_max]
 
-# Function to check internet connection
-def is_internet_up():
-    try:
-        # Connect to Google Public DNS to check internet
-        socket.create_connection(("8.8.8.8", 53), timeout=2)
-        return True
-    except OSError:
-        return False
-
 # Dashboard layout
 app.layout = html.Div([
     # Centered heading
@@ -186,6 +460,8 @@ app.layout = html.Div([
                 }
             ),
             html.Div(id='power-cycle-status', style={'color': '#00ccff', 'margin-top': '10px'}),
+            # Polls the power cycle job's status while one is running
+            dcc.Interval(id='power-cycle-interval', interval=2 * 1000, disabled=True),
         ], style={'display': 'flex', 'alignItems': 'center'}) 
     ], style={
         'display': 'flex',
@@ -216,9 +492,28 @@ app.layout = html.Div([
         )
     ], style={'backgroundColor': '#121212', 'padding': '10px', 'border-radius': '8px'}),
 
-    # Store for filtered data
+    # Site selector, listing every site that has sent samples
+    html.Div([
+        html.H4("Select Site", style={'color': '#ffffff'}),
+        dcc.Dropdown(
+            id='site-dropdown',
+            options=[{'label': schema.DEFAULT_SITE, 'value': schema.DEFAULT_SITE}],
+            value=schema.DEFAULT_SITE,
+            clearable=False,
+            style={'backgroundColor': '#121212', 'color': '#00ccff'},
+            className='dropdown',
+        )
+    ], style={'backgroundColor': '#121212', 'padding': '10px', 'border-radius': '8px'}),
+
+    # Store for the handle of the filtered data kept on the server
     dcc.Store(id='filtered-data'),
 
+    # Store for the browser's graph width, used to size downsampling buckets
+    dcc.Store(id='chart-width'),
+
+    # Store fed by assets/live.js with each batch of samples streamed from /stream
+    dcc.Store(id='live-update'),
+
     # Status counts section
     html.Div([
         html.Div([
@@ -228,6 +523,32 @@ app.layout = html.Div([
         ], style={'display': 'flex', 'justify-content': 'space-around', 'color': '#ffffff'})
     ], style={'backgroundColor': '#1e1e1e', 'padding': '10px', 'border-radius': '8px', 'margin-top': '10px'}),
 
+    # Incidents section: reliability figures and the runs of failed samples behind them
+    html.Div([
+        html.Div([
+            html.H4(id="incident-availability", style={'color': '#00ccff'}),
+            html.H4(id="incident-mttr", style={'color': '#ffcc00'}),
+            html.H4(id="incident-mtbf", style={'color': '#66ff66'}),
+            html.H4(id="incident-count", style={'color': '#ff6666'})
+        ], style={'display': 'flex', 'justify-content': 'space-around', 'color': '#ffffff'}),
+        dash_table.DataTable(
+            id='incident-table',
+            style_table={'overflowX': 'auto', 'backgroundColor': '#333', 'color': '#fff'},
+            style_cell={'textAlign': 'left', 'backgroundColor': '#333', 'color': '#fff'},
+            columns=[
+                {'name': 'Started', 'id': 'started_at'},
+                {'name': 'Ended', 'id': 'ended_at'},
+                {'name': 'Duration', 'id': 'duration'},
+                {'name': 'Type', 'id': 'kind'},
+                {'name': 'Worst Success (%)', 'id': 'success_min', 'type': 'numeric'},
+                {'name': 'Max Latency (ms)', 'id': 'max_latency_ms', 'type': 'numeric'},
+                {'name': 'Max Packet Loss (%)', 'id': 'packet_loss_max', 'type': 'numeric'},
+                {'name': 'Power Cycle', 'id': 'power_cycle_at'},
+            ],
+            page_size=5,
+        ),
+    ], style={'backgroundColor': '#1e1e1e', 'padding': '10px', 'border-radius': '8px', 'margin-top': '10px'}),
+
     # Graphs within Loading components
     dcc.Loading(dcc.Graph(id="success-graph"), type="default"),
 
@@ -248,6 +569,11 @@ app.layout = html.Div([
 
     dcc.Loading(dcc.Graph(id="latency-graph"), type="default"),
 
+    # Per-target latency and latency percentiles from the individual probe samples
+    dcc.Loading(dcc.Graph(id="target-latency-graph"), type="default"),
+
+    dcc.Loading(dcc.Graph(id="latency-percentile-graph"), type="default"),
+
     html.Div([], style={'backgroundColor': '#121212', 'padding': '10px', 'border-radius': '8px', 'margin-top': '10px'}),
 
     dcc.Loading(dcc.Graph(id="packetloss-graph"), type="default"),
@@ -260,7 +586,23 @@ app.layout = html.Div([
                 id='log-table',
                 style_table={'overflowX': 'auto', 'backgroundColor': '#333', 'color': '#fff'},
                 style_cell={'textAlign': 'left', 'backgroundColor': '#333', 'color': '#fff'},
+                columns=[
+                    {'name': 'Timestamp', 'id': 'timestamp'},
+                    {'name': 'Success (%)', 'id': 'success', 'type': 'numeric'},
+                    {'name': 'Avg Latency (ms)', 'id': 'avg_latency_ms', 'type': 'numeric'},
+                    {'name': 'Max Latency (ms)', 'id': 'max_latency_ms', 'type': 'numeric'},
+                    {'name': 'Min Latency (ms)', 'id': 'min_latency_ms', 'type': 'numeric'},
+                    {'name': 'Packet Loss (%)', 'id': 'packet_loss', 'type': 'numeric'},
+                ],
+                # Paging, sorting and filtering run on the server so only one page is sent
+                page_current=0,
                 page_size=10,
+                page_action='custom',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
             ),
             type="default"
         )
@@ -279,40 +621,180 @@ app.layout = html.Div([
 ], style={'backgroundColor': '#121212', 'padding': '20px'})
 
 
-# Callback to fetch and store filtered data
+# Callback to list the sites that have sent samples
+@app.callback(
+    Output('site-dropdown', 'options'),
+    Input('interval-component', 'n_intervals')
+)
+@metrics.callback
+def update_site_options(n):
+    try:
+        db_path = get_db_path()
+        conn = db_connections.get(db_path)
+        sites = status_db.read_sites(conn)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read sites: {e}")
+        sites = []
+    if schema.DEFAULT_SITE not in sites:
+        sites.insert(0, schema.DEFAULT_SITE)
+    return [{'label': site, 'value': site} for site in sites]
+
+# Callback to fetch data and store a handle to it
 @app.callback(
     Output('filtered-data', 'data'),
     [
         Input('interval-component', 'n_intervals'),
-        Input('date-range-dropdown', 'value')
-    ]
+        Input('date-range-dropdown', 'value'),
+        Input('site-dropdown', 'value')
+    ],
+    State('filtered-data', 'data')
 )
-def fetch_data(n, date_range):
-    # Determine the directory of the current script
-    SCRIPT_DIR = os.path.dirname(os.path.realpath(sys.argv[0]))
-    db_path = os.path.join(SCRIPT_DIR, 'logs/internet_status.db')
-    
-    filtered_data = get_filtered_data(db_path, date_range)
-    return filtered_data
+@metrics.callback
+def fetch_data(n, date_range, site, current):
+    db_path = get_db_path()
+
+    # Interval ticks only append new rows and drop aged ones from the held result
+    if (dash.ctx.triggered_id == 'interval-component' and current
+            and current.get('date_range') == date_range and get_site(current) == site):
+        df = results.get(current['handle'])
+        if df is not None and not df.empty:
+            delta = get_data_since(db_path, date_range, make_cursor(date_range, df, current.get('last_id')), site)
+            if delta is not None:
+                new_df, aged_count, cursor = delta
+                if new_df.empty and not aged_count:
+                    return dash.no_update
+                # The result is sorted oldest first, so aged rows are always at the front
+                df = pd.concat([df.iloc[aged_count:], new_df], ignore_index=True)
+                results.put(df, current['handle'])
+                return {'handle': current['handle'], 'date_range': date_range, 'site': site,
+                        'rows': len(df), 'last': cursor['last'], 'last_id': cursor['last_id']}
+
+    # Read before the rows, so a row written meanwhile has a higher ID than the cursor
+    try:
+        last_id = status_db.read_last_id(db_connections.get(db_path))
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read the newest ID, the next refresh reloads in full: {e}")
+        last_id = None
+    df = get_filtered_data(db_path, date_range, site)
+    handle = results.put(df)
+    cursor = make_cursor(date_range, df, last_id)
+    return {'handle': handle, 'date_range': date_range, 'site': site, 'rows': len(df),
+            'last': cursor and cursor['last'], 'last_id': last_id}
+
+# Client-side callback to report the graph width so buckets match the screen
+app.clientside_callback(
+    """
+    function(n, width) {
+        // Unchanged widths are not sent on, so the graphs are not rebuilt for nothing
+        return window.innerWidth === width ? window.dash_clientside.no_update : window.innerWidth;
+    }
+    """,
+    Output('chart-width', 'data'),
+    Input('interval-component', 'n_intervals'),
+    State('chart-width', 'data')
+)
+
+# Client-side callback to append streamed samples to the graphs without rebuilding them.
+# Each trace's meta names the sample column it plots; power cycle markers sit at 50%.
+# The stream carries every site, so only the selected site's rows are kept.
+app.clientside_callback(
+    """
+    function(update, success_fig, latency_fig, packetloss_fig, site) {
+        var no_update = window.dash_clientside.no_update;
+        function pick(values, sites) {
+            return values.filter(function(value, i) { return sites[i] === site; });
+        }
+        function extend(fig) {
+            if (!update || !fig || !fig.data) {
+                return no_update;
+            }
+            var x = [], y = [], traces = [];
+            fig.data.forEach(function(trace, i) {
+                var times, values;
+                if (trace.meta === 'power_cycle') {
+                    times = pick(update.power_cycles.timestamp, update.power_cycles.site);
+                    values = times.map(function() { return 50; });
+                } else if (trace.meta in update.samples) {
+                    times = pick(update.samples.timestamp, update.samples.site);
+                    values = pick(update.samples[trace.meta], update.samples.site);
+                }
+                if (times && times.length) {
+                    x.push(times);
+                    y.push(values);
+                    traces.push(i);
+                }
+            });
+            return traces.length ? [{x: x, y: y}, traces] : no_update;
+        }
+        return [extend(success_fig), extend(latency_fig), extend(packetloss_fig)];
+    }
+    """,
+    Output('success-graph', 'extendData'),
+    Output('latency-graph', 'extendData'),
+    Output('packetloss-graph', 'extendData'),
+    Input('live-update', 'data'),
+    State('success-graph', 'figure'),
+    State('latency-graph', 'figure'),
+    State('packetloss-graph', 'figure'),
+    State('site-dropdown', 'value')
+)
+
+# Client-side callback to show and hide latency traces when the metric checkboxes
+# change. The figure already holds every metric, so this only flips trace visibility
+# and rescales the y axis from the maxima in the layout's meta (see figures.py).
+app.clientside_callback(
+    """
+    function(metrics, fig) {
+        if (!fig || !fig.data || !fig.layout || !fig.layout.meta) {
+            return window.dash_clientside.no_update;
+        }
+        var meta = fig.layout.meta;
+        var y_max = metrics.length ? 0 : meta.max_latency;
+        metrics.forEach(function(metric) {
+            y_max = Math.max(y_max, Math.min(meta.metric_max[metric] * 1.1, meta.max_latency));
+        });
+        var annotations = metrics.length ? [] : [%s];
+        return Object.assign({}, fig, {
+            data: fig.data.map(function(trace) {
+                return Object.assign({}, trace, {visible: metrics.indexOf(trace.meta) !== -1});
+            }),
+            layout: Object.assign({}, fig.layout, {
+                yaxis: Object.assign({}, fig.layout.yaxis, {range: [0, y_max]}),
+                annotations: annotations
+            })
+        });
+    }
+    """ % plotly_json.to_json_plotly(figures.NO_METRIC_ANNOTATION),
+    Output('latency-graph', 'figure', allow_duplicate=True),
+    Input('latency-metrics-checkbox', 'value'),
+    State('latency-graph', 'figure'),
+    prevent_initial_call=True
+)
+
+# Absolute maximum limits of the graphs' y axes
+ABSOLUTE_MAX_LATENCY = 500  # in milliseconds
+ABSOLUTE_MAX_PACKET_LOSS = 100  # in percentage
 
-# Callback to update graphs and counts based on stored data and selected metrics
+# Callback to update the graphs when the data or the graph width changes. The metric
+# checkboxes are only read to build the latency graph; toggling them is handled in
+# the browser.
 @app.callback(
     [
         Output('success-graph', 'figure'),
         Output('latency-graph', 'figure'),
-        Output('packetloss-graph', 'figure'),
-        Output('log-table', 'data'),
-        Output('full-up-count', 'children'),
-        Output('partial-up-count', 'children'),
-        Output('down-count', 'children')
+        Output('packetloss-graph', 'figure')
     ],
     [
         Input('filtered-data', 'data'),
-        Input('latency-metrics-checkbox', 'value')  # New Input for selected metrics
-    ]
+        Input('chart-width', 'data')
+    ],
+    State('latency-metrics-checkbox', 'value')
 )
-def update_dashboard(filtered_data, selected_latency_metrics):
-    df = pd.DataFrame(filtered_data)
+@metrics.callback
+def update_dashboard(filtered_data, chart_width, selected_latency_metrics):
+    # The held result is shared between callbacks and already sorted oldest first, so
+    # it is read here without copying or sorting
+    df = load_result(filtered_data)
 
     # Debug: Check the DataFrame
     logger.info("Update Dashboard Callback:")
@@ -322,278 +804,234 @@ def update_dashboard(filtered_data, selected_latency_metrics):
     logger.debug(f"Data Head:\n{df.head()}")
     logger.debug(f"Data Tail:\n{df.tail()}")
 
-    # Fetch NBN power cycle events from the SQLite database
-    SCRIPT_DIR = os.path.dirname(os.path.realpath(sys.argv[0]))
-    db_path = os.path.join(SCRIPT_DIR, 'logs/internet_status.db')
-    
-    logger.info("Attempting to fetch NBN power cycle events from the database.")
+    if df.empty:
+        # Handle empty DataFrame
+        return {}, {}, {}
+
+    # NBN power cycle events are only read again once a new one has been recorded
+    db_path = get_db_path()
+    site = get_site(filtered_data)
+    power_cycle_df = get_power_cycles(db_path, site)
+
+    # Rollups outlive raw retention, so 'all_time' spans back to the first rollup bucket
+    start_date = status_db.get_start_date(filtered_data['date_range'])
     try:
-        conn = sqlite3.connect(db_path)
-        power_cycle_query = "SELECT timestamp FROM power_cycle_events"
-        power_cycle_df = pd.read_sql_query(power_cycle_query, conn)
-        conn.close()
-        logger.info(f"Successfully fetched {len(power_cycle_df)} power cycle events.")
-        
-        # Ensure power cycle timestamps are in datetime format
-        power_cycle_df['timestamp'] = pd.to_datetime(power_cycle_df['timestamp'])
-        
-        if not power_cycle_df.empty:
-            logger.info(f"Power cycle events timestamp range: {power_cycle_df['timestamp'].min()} to {power_cycle_df['timestamp'].max()}")
-            logger.debug(f"Power Cycle Events Data Head:\n{power_cycle_df.head()}")
-            logger.debug(f"Power Cycle Events Data Tail:\n{power_cycle_df.tail()}")
+        conn = db_connections.get(db_path)
+        span_start = start_date or status_db.read_first_rollup_bucket(conn, site)
+
+        # Bucket rows by time for the graphs so the number of points stays flat for any range
+        bucket_width = aggregation.choose_bucket_width(df, chart_width, span_start)
+        rollup = aggregation.choose_rollup(bucket_width)
+        if rollup is not None:
+            # Wide buckets are built from the rollup tables instead of raw rows
+            rollup_df = status_db.read_rollups(conn, rollup, span_start, site)
+            with metrics.timed(metrics.STAGE_SECONDS, stage='downsample'):
+                plot_df = aggregation.downsample_rollups(rollup_df, bucket_width)
         else:
-            logger.warning("No power cycle events found in the database.")
+            with metrics.timed(metrics.STAGE_SECONDS, stage='downsample'):
+                plot_df = aggregation.downsample(df, bucket_width)
     except Exception as e:
-        logger.error(f"Failed to fetch power cycle events: {e}")
+        logger.error(f"Failed to read rollups: {e}")
+        bucket_width = aggregation.choose_bucket_width(df, chart_width)
+        plot_df = aggregation.downsample(df, bucket_width)
+    x_range = [min(df['timestamp'].iloc[0], plot_df['timestamp'].min()), None]
 
-    if df.empty:
-        # Handle empty DataFrame
-        success_fig = {}
-        latency_fig = {}
-        packetloss_fig = {}
-        table_data = []
-        full_up_count = "Fully Up: 0"
-        partial_up_count = "Partially Up: 0"
-        down_count = "Down: 0"
-        return success_fig, latency_fig, packetloss_fig, table_data, full_up_count, partial_up_count, down_count
-
-    # Define absolute maximum limits
-    ABSOLUTE_MAX_LATENCY = 500  # in milliseconds
-    ABSOLUTE_MAX_PACKET_LOSS = 100  # in percentage
-
-    # Ensure the DataFrame is sorted by timestamp
-    df.sort_values('timestamp', inplace=True)
-
-    # Calculate dynamic y-axis ranges based on selected metrics
-    if selected_latency_metrics:
-        # Extract the relevant columns based on selection
-        latency_data = df[selected_latency_metrics]
-        # Determine the maximum value among the selected metrics
-        max_latency = latency_data.max().max()
-        # Calculate dynamic y-axis range with buffer, capping at ABSOLUTE_MAX_LATENCY
-        dynamic_max_latency = min(max_latency * 1.1, ABSOLUTE_MAX_LATENCY)
-        latency_y_range = [0, dynamic_max_latency]
-    else:
-        # If no metrics are selected, set y-axis to default or minimal range
-        latency_y_range = [0, ABSOLUTE_MAX_LATENCY]  # Alternatively, set to [0,1]
-
-    ## Marker options:
-    ##  'circle'
-    ##  'square'
-    ##  'diamond'
-    ##  'cross'
-    ##  'x'
-    ##  'triangle-up', 'triangle-down', 'triangle-left', 'triangle-right'
-    ##  'star', 'hexagram', 'pentagon'
-    ##  'hourglass', 'bowtie'
-    ##  'hexagon', 'octagon'
-
-    # Success rate graph using Scattergl for better performance
-    success_fig = {
-        'data': [
-            {
-                'x': df['timestamp'],
-                'y': df['success'],
-                'type': 'scattergl',  # Use Scattergl for better performance with large datasets
-                'mode': 'lines',
-                'name': 'Success Rate (%)',
-                'line': {'color': '#00ccff', 'width': 2},
-                'marker': {'size': 5, 'symbol': 'circle'}
-            },
-            # Adding power cycle markers
-            {
-                'x': power_cycle_df['timestamp'],
-                'y': [50] * len(power_cycle_df),  # Place markers at the middle (50%) of the success graph
-                'mode': 'markers',
-                'name': 'NBN Power Cycle',
-                'marker': {'color': 'red', 'size': 24, 'symbol': 'square'},
-                'text': ['NBN Power Cycle Event'] * len(power_cycle_df),  # Hover label for each marker
-                'hoverinfo': 'text+x'  # Display timestamp and custom text on hover
-            },
-        ],
-        'layout': {
-            'title': 'Internet Connectivity Over Time',
-            'yaxis': {
-                'title': 'Ping Response Success Rate (%)',
-                'range': [0, 100],
-                'color': '#ffffff'
-            },
-            'xaxis': {
-                'title': 'Timestamp',
-                'color': '#ffffff',
-                'range': [df['timestamp'].min(), df['timestamp'].max()]
-            },
-            'plot_bgcolor': '#1e1e1e',
-            'paper_bgcolor': '#1e1e1e',
-            'font': {'color': '#ffffff'},
-            'titlefont': {'color': '#00ccff'},
-            'legend': {
-                'orientation': 'h',
-                'x': 0,
-                'y': -0.2  # Position below the graph
-            },
-            'hovermode': 'closest',
-        }
-    }
+    # Figures are built from NumPy arrays on a shared layout template (see figures.py),
+    # with the timestamps formatted once for all three graphs
+    with metrics.timed(metrics.STAGE_SECONDS, stage='figures'):
+        x = figures.date_strings(plot_df['timestamp'])
+        band_label = aggregation.describe_width(bucket_width) if bucket_width is not None else None
+        success_fig = figures.success_figure(plot_df, power_cycle_df, x_range, band_label, x)
+        latency_fig = figures.latency_figure(plot_df, selected_latency_metrics, x_range, ABSOLUTE_MAX_LATENCY, x)
+        packetloss_y_range = calculate_y_range(plot_df['packet_loss'], ABSOLUTE_MAX_PACKET_LOSS)
+        packetloss_fig = figures.packetloss_figure(plot_df, x_range, [0, packetloss_y_range[1]], x)
 
-    # Latency graph using Scattergl with dynamic y-axis range
-    if selected_latency_metrics:
-        # Prepare data traces based on selected metrics
-        latency_traces = []
-        color_mapping = {
-            'avg_latency_ms': '#ffcc00',
-            'max_latency_ms': '#ff6666',
-            'min_latency_ms': '#66ff66'
-        }
-        name_mapping = {
-            'avg_latency_ms': 'Avg Latency (ms)',
-            'max_latency_ms': 'Max Latency (ms)',
-            'min_latency_ms': 'Min Latency (ms)'
-        }
-        for metric in selected_latency_metrics:
-            latency_traces.append({
-                'x': df['timestamp'],
-                'y': df[metric],
-                'type': 'scattergl',
-                'mode': 'lines',
-                'name': name_mapping.get(metric, metric),
-                'line': {'color': color_mapping.get(metric, '#000000'), 'width': 2},
-                'marker': {'size': 5, 'symbol': 'circle'}
-            })
-    else:
-        latency_traces = []
-
-    if selected_latency_metrics:
-        latency_fig = {
-            'data': latency_traces,
-            'layout': {
-                'title': 'Latency Over Time',
-                'yaxis': {
-                    'title': 'Latency (ms)',
-                    'range': latency_y_range,
-                    'color': '#ffffff'
-                },
-                'xaxis': {
-                    'title': 'Timestamp',
-                    'color': '#ffffff',
-                    'range': [df['timestamp'].min(), df['timestamp'].max()]
-                },
-                'plot_bgcolor': '#1e1e1e',
-                'paper_bgcolor': '#1e1e1e',
-                'font': {'color': '#ffffff'},
-                'titlefont': {'color': '#ffcc00'},
-                'legend': {
-                    'orientation': 'h',
-                    'x': 0,
-                    'y': -0.2
-                },
-                'hovermode': 'closest',
-            }
-        }
-    else:
-        # Display a placeholder message when no metrics are selected
-        latency_fig = {
-            'data': [],
-            'layout': {
-                'title': 'Latency Over Time',
-                'yaxis': {
-                    'title': 'Latency (ms)',
-                    'range': [0, ABSOLUTE_MAX_LATENCY],
-                    'color': '#ffffff'
-                },
-                'xaxis': {
-                    'title': 'Timestamp',
-                    'color': '#ffffff',
-                    'range': [df['timestamp'].min(), df['timestamp'].max()]
-                },
-                'annotations': [
-                    {
-                        'text': "Please select at least one latency metric to display.",
-                        'xref': "paper",
-                        'yref': "paper",
-                        'showarrow': False,
-                        'font': {
-                            'size': 16,
-                            'color': '#ffffff'
-                        }
-                    }
-                ],
-                'plot_bgcolor': '#1e1e1e',
-                'paper_bgcolor': '#1e1e1e',
-                'font': {'color': '#ffffff'},
-                'titlefont': {'color': '#ffcc00'},
-                'legend': {
-                    'orientation': 'h',
-                    'x': 0,
-                    'y': -0.2
-                },
-                'hovermode': 'closest',
-            }
-        }
+    return success_fig, latency_fig, packetloss_fig
 
-    # Packet Loss graph using Scattergl with dynamic y-axis range
-    packetloss_y_range = calculate_y_range(df['packet_loss'], ABSOLUTE_MAX_PACKET_LOSS)
-    
-    packetloss_fig = {
-        'data': [
-            {
-                'x': df['timestamp'],
-                'y': df['packet_loss'],
-                'type': 'scattergl',
-                'mode': 'lines',
-                'name': 'Packet Loss (%)',
-                'line': {'color': '#ff0000', 'width': 2},
-                'marker': {'size': 5, 'symbol': 'circle'}
-            },
-        ],
-        'layout': {
-            'title': 'Packet Loss Over Time',
-            'yaxis': {
-                'title': 'Packet Loss (%)',
-                'range': [0, packetloss_y_range[1]],  # Dynamic range
-                'color': '#ffffff'
-            },
-            'xaxis': {
-                'title': 'Timestamp',
-                'color': '#ffffff',
-                'range': [df['timestamp'].min(), df['timestamp'].max()]
-            },
-            'plot_bgcolor': '#1e1e1e',
-            'paper_bgcolor': '#1e1e1e',
-            'font': {'color': '#ffffff'},
-            'titlefont': {'color': '#ff0000'},
-            'hovermode': 'closest',
-        }
-    }
 
-    # Sort by the 'timestamp' in descending order for the table
-    filtered_data_sorted = df.sort_values(by='timestamp', ascending=False)
-    table_data = filtered_data_sorted.to_dict('records')
+# Callback to update the status counts when the data changes
+@app.callback(
+    [
+        Output('full-up-count', 'children'),
+        Output('partial-up-count', 'children'),
+        Output('down-count', 'children')
+    ],
+    Input('filtered-data', 'data')
+)
+@metrics.callback
+def update_status_counts(filtered_data):
+    if not filtered_data or not filtered_data.get('rows'):
+        return "Fully Up: 0", "Partially Up: 0", "Down: 0"
+    try:
+        # Counts come from the hourly rollup plus the partial first hour
+        conn = db_connections.get(get_db_path())
+        full_up, partial_up, down = status_db.read_status_counts(
+            conn, status_db.get_start_date(filtered_data['date_range']), get_site(filtered_data)
+        )
+    except Exception as e:
+        logger.error(f"Failed to read status counts: {e}")
+        df = load_result(filtered_data)
+        full_up = df[df['success'] == 100].shape[0]
+        partial_up = df[(df['success'] > 0) & (df['success'] < 100)].shape[0]
+        down = df[df['success'] == 0].shape[0]
+    return f"Fully Up: {full_up}", f"Partially Up: {partial_up}", f"Down: {down}"
+
+
+# Callback to update the per-target latency and percentile graphs
+@app.callback(
+    [
+        Output('target-latency-graph', 'figure'),
+        Output('latency-percentile-graph', 'figure')
+    ],
+    [
+        Input('filtered-data', 'data'),
+        Input('chart-width', 'data')
+    ]
+)
+@metrics.callback
+def update_probe_graphs(filtered_data, chart_width):
+    # Individual probes are only recorded by this host's own collector
+    if not filtered_data or get_site(filtered_data) != schema.DEFAULT_SITE:
+        return {}, {}
+    try:
+        db_path = get_db_path()
+        conn = db_connections.get(db_path)
+        start_date = status_db.get_start_date(filtered_data['date_range']) or status_db.read_first_probe_time(conn)
+        if start_date is None:
+            return {}, {}
+        # Bucket in SQLite so only a few hundred rows per target come back
+        bucket_width = aggregation.bucket_width_for_span(datetime.datetime.now() - start_date, chart_width)
+        target_df = status_db.read_target_latency(conn, start_date, bucket_width)
+        percentile_df = aggregation.histogram_percentiles(
+            status_db.read_latency_histogram(conn, start_date, bucket_width)
+        )
+    except Exception as e:
+        logger.error(f"Failed to read probe samples: {e}")
+        return {}, {}
 
-    # Calculate status counts based on raw data
-    full_up_count = f"Fully Up: {df[df['success'] == 100].shape[0]}"
-    partial_up_count = f"Partially Up: {df[(df['success'] > 0) & (df['success'] < 100)].shape[0]}"
-    down_count = f"Down: {df[df['success'] == 0].shape[0]}"
+    width_label = aggregation.describe_width(bucket_width)
+    target_fig = figures.target_latency_figure(target_df, width_label)
+    percentile_fig = figures.percentile_figure(percentile_df, width_label)
+    return target_fig, percentile_fig
 
-    return success_fig, latency_fig, packetloss_fig, table_data, full_up_count, partial_up_count, down_count
 
+# Function to format a duration as e.g. '2d 3h', '4h 12m' or '35s'
+def format_duration(delta):
+    seconds = int(delta.total_seconds())
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    if minutes:
+        return f"{minutes}m {seconds}s"
+    return f"{seconds}s"
 
-# Callback to handle the button click
+# Callback to update the incident figures and table from the incident index
+@app.callback(
+    [
+        Output('incident-availability', 'children'),
+        Output('incident-mttr', 'children'),
+        Output('incident-mtbf', 'children'),
+        Output('incident-count', 'children'),
+        Output('incident-table', 'data')
+    ],
+    Input('filtered-data', 'data')
+)
+@metrics.callback
+def update_incidents(filtered_data):
+    if not filtered_data:
+        return "Availability: -", "MTTR: -", "MTBF: -", "Incidents: 0", []
+    try:
+        db_path = get_db_path()
+        conn = db_connections.get(db_path)
+        site = get_site(filtered_data)
+        start_date = status_db.get_start_date(filtered_data['date_range'])
+        summary = status_db.read_incident_summary(conn, start_date, site=site)
+        incidents = status_db.read_incidents(conn, start_date, site=site)
+    except Exception as e:
+        logger.error(f"Failed to read incidents: {e}")
+        return "Availability: -", "MTTR: -", "MTBF: -", "Incidents: -", []
+    if summary is None:
+        return "Availability: -", "MTTR: -", "MTBF: -", "Incidents: 0", []
+
+    availability = (f"Availability: {summary['availability']:.2f}% "
+                    f"({summary['outage_availability']:.2f}% excluding degraded)")
+    mttr = f"MTTR: {format_duration(summary['mttr'])}" if summary['mttr'] is not None else "MTTR: -"
+    mtbf = f"MTBF: {format_duration(summary['mtbf'])}" if summary['mtbf'] is not None else "MTBF: -"
+    outages = summary['outages']
+    count = f"Incidents: {summary['incidents']} ({outages} {'outage' if outages == 1 else 'outages'})"
+
+    rows = []
+    for incident in incidents.itertuples():
+        rows.append({
+            'started_at': incident.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'ended_at': incident.ended_at.strftime('%Y-%m-%d %H:%M:%S') if pd.notna(incident.ended_at) else 'Ongoing',
+            'duration': format_duration(incident.duration),
+            'kind': incident.kind,
+            'success_min': incident.success_min,
+            'max_latency_ms': None if pd.isna(incident.max_latency_ms) else round(incident.max_latency_ms, 1),
+            'packet_loss_max': incident.packet_loss_max,
+            'power_cycle_at': incident.power_cycle_at.strftime('%H:%M:%S') if pd.notna(incident.power_cycle_at) else '',
+        })
+    return availability, mttr, mtbf, count, rows
+
+
+# Callback to serve one page of the log table from the server-side result
+@app.callback(
+    [
+        Output('log-table', 'data'),
+        Output('log-table', 'page_count')
+    ],
+    [
+        Input('filtered-data', 'data'),
+        Input('log-table', 'page_current'),
+        Input('log-table', 'page_size'),
+        Input('log-table', 'sort_by'),
+        Input('log-table', 'filter_query')
+    ]
+)
+@metrics.callback
+def update_log_table(filtered_data, page_current, page_size, sort_by, filter_query):
+    df = load_result(filtered_data)
+    # Newest entries first unless the user picks a sort order. The row order is worked
+    # out once per result, filter and sort, and each page is cut from it.
+    def build(held):
+        return table_query.row_order(held, filter_query, sort_by, default_column='timestamp', default_ascending=False)
+    order = None
+    if filtered_data:
+        order = results.get_view(filtered_data['handle'], table_query.view_key(filter_query, sort_by), build)
+    if order is None:
+        order = build(df)
+    return table_query.get_page(df, page_current, page_size, order)
+
+
+# Callback to queue a power cycle and report its progress
 @app.callback(
     Output('power-cycle-status', 'children'),
-    Input('power-cycle-button', 'n_clicks')
+    Output('power-cycle-interval', 'disabled'),
+    Input('power-cycle-button', 'n_clicks'),
+    Input('power-cycle-interval', 'n_intervals')
 )
-def trigger_power_cycle(n_clicks):
-    if n_clicks > 0:
-        # Run the external script using subprocess
-        try:
-            SCRIPT_DIR = os.path.dirname(os.path.realpath(sys.argv[0]))
-            script_path = os.path.join(SCRIPT_DIR, 'power_cycle_nbn_override.py')
-            result = subprocess.run(["/usr/bin/python3", script_path], check=True, capture_output=True, text=True)
-            return f"Power cycle triggered at {datetime.datetime.now()}"
-        except subprocess.CalledProcessError as e:
-            return f"Power cycle failed: {e.stderr}"
-    return ""
+@metrics.callback
+def trigger_power_cycle(n_clicks, n_intervals):
+    # The job runs in the background, so this returns straight away
+    if dash.ctx.triggered_id == 'power-cycle-button' and n_clicks > 0:
+        job, accepted = power_cycles.submit()
+        if not accepted:
+            return f"A power cycle is already in progress: {POWER_CYCLE_LABELS[job['state']]}", False
+    else:
+        job = power_cycles.status()
+        if job is None:
+            return "", True
+
+    updated = datetime.datetime.fromtimestamp(job['updated_at']).strftime('%H:%M:%S')
+    status = f"{POWER_CYCLE_LABELS[job['state']]} ({updated})"
+    if job['error']:
+        status += f": {job['error']}"
+    return status, job['state'] in power_jobs.FINISHED_STATES
 
 # Callback to update the internet connection status with dynamic color
 @app.callback(
@@ -601,8 +1039,23 @@ def trigger_power_cycle(n_clicks):
     Output('internet-status', 'style'),
     Input('internet-interval', 'n_intervals')
 )
+@metrics.callback
 def update_internet_status(n):
-    if is_internet_up():
+    # Read the state published by the background checker rather than probing per client
+    internet_checker.start()
+    state = internet_checker.latest()
+    if internet_checker.is_stale(state):
+        return "Internet: Unknown", {
+            'backgroundColor': '#888888',  # Grey background while no recent check is available
+            'color': '#1e1e1e',
+            'textAlign': 'center',
+            'fontSize': '18px',
+            'padding': '8px 15px',
+            'borderRadius': '5px',
+            'fontWeight': 'bold',
+            'font-family': 'Arial, sans-serif', # Match badge font family
+        }
+    if state['up']:
         return "Internet: Up", {
             'backgroundColor': '#4CAF50',  # Green background for up
             'color': '#1e1e1e',  # White text
@@ -628,5 +1081,6 @@ def update_internet_status(n):
         }
 
 if __name__ == '__main__':
-    # Ensure Redis server is running and accessible
-    app.run_server(host='0.0.0.0', port=8050, debug=False)
+    # Development server, a single process; see gunicorn.conf.py for serving in production
+    start_background()
+    app.run(host='0.0.0.0', port=8050, debug=False)
@@ -0,0 +1,179 @@
+import datetime
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from aggregation import LATENCY_CAP
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the database for newly committed rows
+POLL_INTERVAL = 2
+
+# Seconds of silence after which a comment is sent to keep the connection open
+KEEPALIVE_INTERVAL = 15
+
+# Updates queued for one client before it is considered stalled and dropped
+MAX_QUEUED_UPDATES = 100
+
+# Milliseconds the browser waits before reconnecting a dropped stream
+RECONNECT_DELAY = 5000
+
+LIVE_STATUS_QUERY = """
+SELECT id, timestamp, success_percentage, avg_latency_ms, max_latency_ms, min_latency_ms, packet_loss, site
+FROM internet_status
+WHERE id > ?
+ORDER BY id
+"""
+
+LIVE_POWER_CYCLE_QUERY = """
+SELECT id, timestamp, site
+FROM power_cycle_events
+WHERE id > ?
+ORDER BY id
+"""
+
+# Function to format an epoch-ms timestamp the way the graphs' x values are sent
+def format_x(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp / 1000).isoformat(sep=' ', timespec='milliseconds')
+
+# Function to cap a latency the same way the dashboard does when loading rows
+def cap_latency(value):
+    return None if value is None else min(value, LATENCY_CAP)
+
+class LiveFeed:
+    """
+    Watches the database from one background thread and fans each batch of newly
+    written samples and power cycle events out to every connected stream, so the
+    cost per new sample is one small query however many dashboards are open.
+    """
+
+    def __init__(self, db_path, poll_interval=POLL_INTERVAL):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self):
+        """
+        Registers a new client and returns the queue its updates are put on.
+        """
+        self._start()
+        updates = queue.Queue(MAX_QUEUED_UPDATES)
+        with self._lock:
+            self._subscribers.add(updates)
+        logger.info(f"Live stream opened ({len(self._subscribers)} connected).")
+        return updates
+
+    def unsubscribe(self, updates):
+        with self._lock:
+            self._subscribers.discard(updates)
+        logger.info(f"Live stream closed ({len(self._subscribers)} connected).")
+
+    def is_subscribed(self, updates):
+        with self._lock:
+            return updates in self._subscribers
+
+    def stream(self):
+        """
+        Yields a client's updates formatted as server-sent events.
+        """
+        updates = self.subscribe()
+        try:
+            yield f"retry: {RECONNECT_DELAY}\n\n"
+            while self.is_subscribed(updates):
+                try:
+                    update = updates.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: update\ndata: {json.dumps(update)}\n\n"
+        finally:
+            self.unsubscribe(updates)
+
+    def publish(self, update):
+        """
+        Queues an update for every client, dropping clients that have stopped reading.
+        """
+        with self._lock:
+            for updates in list(self._subscribers):
+                try:
+                    updates.put_nowait(update)
+                except queue.Full:
+                    self._subscribers.discard(updates)
+                    logger.warning("Dropped a live stream client that stopped reading.")
+
+    def _start(self):
+        # Threads do not survive a fork, so start one per process on first use
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+            self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        status_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM internet_status").fetchone()[0]
+        power_cycle_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM power_cycle_events").fetchone()[0]
+        return conn, status_id, power_cycle_id
+
+    def _read_update(self, conn, status_id, power_cycle_id):
+        """
+        Returns the update for rows written after the given IDs (or None if there are
+        none), with the new IDs.
+        """
+        status_rows = conn.execute(LIVE_STATUS_QUERY, (status_id,)).fetchall()
+        power_cycle_rows = conn.execute(LIVE_POWER_CYCLE_QUERY, (power_cycle_id,)).fetchall()
+        if not status_rows and not power_cycle_rows:
+            return None, status_id, power_cycle_id
+
+        update = {
+            'samples': {
+                'timestamp': [format_x(row[1]) for row in status_rows],
+                'success': [row[2] for row in status_rows],
+                'avg_latency_ms': [cap_latency(row[3]) for row in status_rows],
+                'max_latency_ms': [cap_latency(row[4]) for row in status_rows],
+                'min_latency_ms': [cap_latency(row[5]) for row in status_rows],
+                'packet_loss': [None if row[6] is None else min(row[6], 100) for row in status_rows],
+                'site': [row[7] for row in status_rows],
+            },
+            'power_cycles': {
+                'timestamp': [format_x(row[1]) for row in power_cycle_rows],
+                'site': [row[2] for row in power_cycle_rows],
+            },
+        }
+        if status_rows:
+            status_id = status_rows[-1][0]
+        if power_cycle_rows:
+            power_cycle_id = power_cycle_rows[-1][0]
+        return update, status_id, power_cycle_id
+
+    def _run(self):
+        conn = None
+        data_version = None
+        while True:
+            try:
+                if conn is None:
+                    conn, status_id, power_cycle_id = self._connect()
+                # data_version only changes when another connection commits, so idle
+                # polls cost a single pragma
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if version != data_version:
+                    data_version = version
+                    update, status_id, power_cycle_id = self._read_update(conn, status_id, power_cycle_id)
+                    if update is not None:
+                        self.publish(update)
+            except sqlite3.Error as e:
+                logger.warning(f"Live feed could not read the database: {e}")
+                if conn is not None:
+                    conn.close()
+                conn = None
+                data_version = None
+            time.sleep(self.poll_interval)
@@ -0,0 +1,347 @@
+import collections
+import contextlib
+import copy
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Upper bounds of the size histogram buckets, in bytes or rows
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Seconds between stack samples while a request is profiled
+PROFILE_INTERVAL = 0.001
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Directory each worker process writes its series to, so /metrics reports the sum
+# over every worker whichever one answers the scrape. Unset for a single process;
+# gunicorn.conf.py sets it and empties it when the server starts.
+MULTIPROCESS_DIR = os.environ.get('METRICS_DIR')
+
+# Seconds between a worker's snapshots, so the sum trails the live values by up to this
+FLUSH_INTERVAL = 5
+
+class Metric:
+    """
+    A metric family in the Prometheus text format, with one series per combination
+    of label values. Series are kept in this process; with MULTIPROCESS_DIR set,
+    each worker also writes them there and render() sums them over every worker.
+    """
+
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    @staticmethod
+    def _format_labels(pairs):
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def snapshot(self):
+        """
+        Returns a copy of every series as a list of [label values, value] pairs.
+        """
+        with self._lock:
+            return [[list(key), copy.deepcopy(value)] for key, value in self._series.items()]
+
+    def render(self, series=None):
+        """
+        Returns the lines for the given series (by default this process's own), as
+        a dict of label values to value.
+        """
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        if series is None:
+            with self._lock:
+                series = dict(self._series)
+        for key, value in sorted(series.items()):
+            lines.extend(self._render_series(list(zip(self.labels, key)), value))
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    @staticmethod
+    def merge(total, value):
+        return value if total is None else total + value
+
+    def _render_series(self, pairs, value):
+        return [f"{self.name}{self._format_labels(pairs)} {value}"]
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Counts per bucket, then the sum and count of every observation
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @staticmethod
+    def merge(total, series):
+        if total is None:
+            return [list(series[0]), series[1], series[2]]
+        return [[a + b for a, b in zip(total[0], series[0])], total[1] + series[1], total[2] + series[2]]
+
+    def _render_series(self, pairs, series):
+        counts, total, count = series
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{self._format_labels(pairs + [('le', bound)])} {cumulative}")
+        lines.append(f"{self.name}_bucket{self._format_labels(pairs + [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{self._format_labels(pairs)} {total}")
+        lines.append(f"{self.name}_count{self._format_labels(pairs)} {count}")
+        return lines
+
+# Every metric created in this process, in the order /metrics lists them
+REGISTRY = []
+
+CALLBACK_SECONDS = Histogram(
+    'dashboard_callback_duration_seconds',
+    "Time spent in each Dash callback function, excluding JSON serialisation.",
+    ['callback'],
+)
+REQUEST_SECONDS = Histogram(
+    'dashboard_request_duration_seconds',
+    "Time from request to response per Dash callback or route, including JSON serialisation.",
+    ['handler'],
+)
+RESPONSE_BYTES = Histogram(
+    'dashboard_response_bytes',
+    "Size of each response body per Dash callback or route, as sent.",
+    ['handler'],
+    SIZE_BUCKETS,
+)
+QUERY_SECONDS = Histogram(
+    'dashboard_query_duration_seconds',
+    "Time spent in each SQLite read, including building its DataFrame.",
+    ['query'],
+)
+QUERY_ROWS = Histogram(
+    'dashboard_query_rows',
+    "Rows returned by each SQLite read.",
+    ['query'],
+    SIZE_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    'dashboard_stage_duration_seconds',
+    "Time spent in each stage of building the graphs, such as downsampling or building figures.",
+    ['stage'],
+)
+CACHE_REQUESTS = Counter(
+    'dashboard_cache_requests_total',
+    "Cache lookups by cache and result: hit_local, hit_shared or miss.",
+    ['cache', 'result'],
+)
+CACHE_SECONDS = Histogram(
+    'dashboard_cache_duration_seconds',
+    "Time spent reading from and writing to the shared cache (Redis), including pickling.",
+    ['cache', 'operation'],
+)
+
+# Function to render every metric in the Prometheus text format
+def render():
+    """
+    Renders this process's series, or with MULTIPROCESS_DIR set the sum of every
+    worker's: this one's live series and the last snapshot of each other worker,
+    including workers that have since exited, so counters never go backwards.
+    """
+    lines = []
+    if not MULTIPROCESS_DIR:
+        for metric in REGISTRY:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+    snapshots = [snapshot()]
+    own = f"{os.getpid()}.json"
+    try:
+        names = sorted(os.listdir(MULTIPROCESS_DIR))
+    except OSError as e:
+        logger.warning(f"Could not read worker metrics from {MULTIPROCESS_DIR}: {e}")
+        names = []
+    for name in names:
+        if name == own or not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(MULTIPROCESS_DIR, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping worker metrics in {name}: {e}")
+    for metric in REGISTRY:
+        totals = {}
+        for worker in snapshots:
+            for key, value in worker.get(metric.name, []):
+                key = tuple(key)
+                totals[key] = metric.merge(totals.get(key), value)
+        lines.extend(metric.render(totals))
+    return '\n'.join(lines) + '\n'
+
+# Function to copy every series in this process
+def snapshot():
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+# Function to publish this process's series for the other workers to sum
+def write_snapshot():
+    if not MULTIPROCESS_DIR:
+        return
+    path = os.path.join(MULTIPROCESS_DIR, f"{os.getpid()}.json")
+    try:
+        os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+        # Written aside and renamed, so a reader never sees half a file
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot(), f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {path}: {e}")
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+# Function to start writing this process's snapshot every FLUSH_INTERVAL seconds
+def start_flushing(interval=FLUSH_INTERVAL):
+    """
+    Starts the writer thread in this process if MULTIPROCESS_DIR is set and it is
+    not already running. Safe to call again after a fork.
+    """
+    global _flusher_pid
+    if not MULTIPROCESS_DIR:
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            write_snapshot()
+
+    threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+
+# Function to time a block of code into a histogram
+@contextlib.contextmanager
+def timed(histogram, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+# Function to count the rows in a query result
+def row_count(result):
+    """
+    Returns the number of rows in a DataFrame, a dict of column arrays or a list,
+    or None for anything else, including a dict of single values such as a summary.
+    """
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, dict):
+        column = next(iter(result.values()), None)
+        return len(column) if isinstance(column, (list, tuple, np.ndarray, pd.Series)) else None
+    if isinstance(result, list):
+        return len(result)
+    return None
+
+# Decorator recording the duration and row count of a status_db read
+def query(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with timed(QUERY_SECONDS, query=function.__name__):
+            result = function(*args, **kwargs)
+        rows = row_count(result)
+        if rows is not None:
+            QUERY_ROWS.observe(rows, query=function.__name__)
+        return result
+    return wrapper
+
+# Decorator recording the duration of a Dash callback
+def callback(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with timed(CALLBACK_SECONDS, callback=function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every PROFILE_INTERVAL seconds from a
+    background thread while a request runs, and writes the stacks in the folded
+    format ('outer;inner;leaf count' per line) that flamegraph.pl, speedscope and
+    similar tools read. Sampling sees where time goes in C calls such as SQLite
+    queries too, which a tracing profiler attributes poorly.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self, path):
+        """
+        Stops sampling and writes the folded stacks to path.
+        """
+        self._stop.set()
+        self._thread.join()
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Wrote {sum(self.stacks.values())} stack samples to {path}")
@@ -1,134 +1,64 @@
 import asyncio
-import tapo
 import json  # Importing json for pretty printing the output
 import logging
 import sqlite3
 import os
-import sys
 from datetime import datetime
 
-SCRIPT_DIR = os.path.dirname(os.path.realpath(sys.argv[0])) 
+import decision_engine
+import schema
+import tapo_control
 
-# Set up logging configuration
-logging.basicConfig(
-    filename=os.path.join(SCRIPT_DIR, 'logs/check_internet.log'),
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# Resolved from this file so it is the same when imported by the collector daemon
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 
-# Your Tapo credentials and IP address
-email = "example@example.com"
-password = "password"
-device_ip = "device_ip_address"
-device_name = "device_name"
-
-# Cooldown settings
-COOLDOWN_FILE=os.path.join(SCRIPT_DIR, 'logs/cooldown.txt'),
-COOLDOWN_PERIOD = 3600  # 1 hr cooldown in seconds (3600 seconds = 1 hr)
+# Tapo credentials and plugs are configured in tapo_control.py
 
 # The time to wait between turning off and on the device (in seconds)
 wait_time = 30  # You can change this to any number of seconds
-retry_attempts = 3  # Number of retries if a connection fails
+
+# Database the collector writes to
+DB_FILE = os.path.join(SCRIPT_DIR, 'logs/internet_status.db')
 
 # Log power cycle event to SQLite database
-def log_power_cycle_event(reason="Internet down for 5+ minutes"):
+def log_power_cycle_event(reason="Internet down"):
     try:
-        db_file = os.path.join(SCRIPT_DIR, 'logs/internet_status.db')
-        conn = sqlite3.connect(db_file)
+        conn = sqlite3.connect(DB_FILE)
         cursor = conn.cursor()
+        # Timestamps are stored as epoch milliseconds
         cursor.execute("INSERT INTO power_cycle_events (timestamp, reason) VALUES (?, ?)",
-                       (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), reason))
+                       (int(datetime.now().timestamp() * 1000), reason))
         conn.commit()
         conn.close()
         logging.info("Power cycle event logged successfully.")
     except sqlite3.Error as e:
         logging.error(f"Failed to log power cycle event: {e}")
 
-# Function to check if cooldown period is active
-def is_in_cooldown():
-    if os.path.exists(COOLDOWN_FILE):
-        with open(COOLDOWN_FILE, "r") as f:
-            last_cycle = int(f.read().strip())
-        current_time = int(datetime.now().timestamp())
-        time_diff = current_time - last_cycle
-        if time_diff < COOLDOWN_PERIOD:
-            logging.info(f"Cooldown period is still active, skipping power cycle. Time left: {COOLDOWN_PERIOD - time_diff} seconds.")
-            return True
-    return False
-
-# Function to update cooldown file
-def update_cooldown_file():
-    with open(COOLDOWN_FILE, "w") as f:
-        f.write(str(int(datetime.now().timestamp())))
-    logging.info("Cooldown file updated with the current timestamp.")
-
-async def control_tapo():
+# Power cycle the modem through the given device pool, or a fresh one. The cooldown is
+# checked by the caller (see decision_engine.py) before deciding to power cycle.
+# log_event(reason) records the event; the collector daemon passes one writing through its own connection.
+async def control_tapo(pool=None, reason="Internet down", log_event=log_power_cycle_event):
+    if pool is None:
+        pool = tapo_control.DevicePool()
     try:
-        # Check if we are within cooldown period
-        if is_in_cooldown():
-            return
-
-        # Initialize API client
-        client = tapo.ApiClient(email, password)
-
-        # Get the P100 device (requires `await`)
-        device = await client.p100(device_ip)
-
-        # Refresh the session (useful if connection becomes inactive)
-        await device.refresh_session()
-        logging.info(f"Session refreshed for {device_name}.")
-
-        # Turn off the device
-        await device.off()
-        logging.info(f"{device_name} has been turned off.")
-
-        # Wait for the specified period
-        await asyncio.sleep(wait_time)
-        logging.info(f"Waited for {wait_time} seconds.")
+        # Turn the plug off, wait and turn it back on, retrying with a fresh session if needed
+        await pool.power_cycle(tapo_control.DEFAULT_DEVICE, wait_time)
 
-        # Turn the device back on
-        await device.on()
-        logging.info(f"{device_name} has been turned back on.")
-
-        # Log the power cycle event
-        log_power_cycle_event("Internet down for 5+ minutes")
-
-        # Update cooldown file
-        update_cooldown_file()
+        # Log the power cycle event, which also starts the cooldown
+        log_event(reason)
 
         # Print device info after successful operation
-        await print_device_info(device)
+        await print_device_info(pool)
 
     except asyncio.TimeoutError:
         logging.error("The request timed out. Please check your network connection or the device.")
     except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-        await handle_exception(device)
-
-async def handle_exception(device):
-    # Retry logic on exception
-    for attempt in range(1, retry_attempts + 1):
-        try:
-            logging.warning(f"Attempting to refresh session and retry... (Attempt {attempt}/{retry_attempts})")
-            await device.refresh_session()
-
-            # Try to turn the device on after failure
-            await device.on()
-            logging.info(f"{device_name} has been turned back on after retry attempt {attempt}.")
+        logging.error(f"Power cycle failed: {e}")
 
-            # Print device info after successful retry
-            await print_device_info(device)
-            return  # Exit the loop if successful
-        except Exception as retry_error:
-            logging.error(f"Retry attempt {attempt} failed: {retry_error}")
-            if attempt == retry_attempts:
-                logging.critical(f"All retry attempts failed. Please check your connection.")
-                return
-
-async def print_device_info(device):
+async def print_device_info(pool):
     try:
         # Get additional device information in JSON format
-        device_info_json = await device.get_device_info_json()
+        device_info_json = await pool.device_info(tapo_control.DEFAULT_DEVICE)
 
         # Pretty print the JSON response
         pretty_device_info = json.dumps(device_info_json, indent=4)
@@ -136,5 +66,24 @@ async def print_device_info(device):
     except Exception as e:
         logging.error(f"Failed to retrieve device info: {e}")
 
-# Run the async function
-asyncio.run(control_tapo())
+# Run the async function when started as a script; the collector daemon imports control_tapo
+if __name__ == '__main__':
+    # Set up logging configuration
+    logging.basicConfig(
+        filename=os.path.join(SCRIPT_DIR, 'logs/check_internet.log'),
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    # Run on its own, the script still respects the cooldown
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        schema.ensure_schema(conn, DB_FILE)
+        remaining = decision_engine.cooldown_remaining(conn, schema.to_epoch_ms(datetime.now()))
+        conn.close()
+    except sqlite3.Error as e:
+        logging.error(f"Could not check the cooldown: {e}")
+        remaining = 0
+    if remaining:
+        logging.info(f"Cooldown period is still active, skipping power cycle. Time left: {remaining} seconds.")
+    else:
+        asyncio.run(control_tapo())
@@ -1,110 +1,73 @@
 import asyncio
-import tapo
 import json  # Importing json for pretty printing the output
 import logging
 import sqlite3
 import os
-import sys
 from datetime import datetime
 
-SCRIPT_DIR = os.path.dirname(os.path.realpath(sys.argv[0])) 
+import read_connections
+import tapo_control
 
-# Set up logging configuration
-logging.basicConfig(
-    filename=os.path.join(SCRIPT_DIR, 'logs/check_internet.log'),
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# Resolved from this file so it is the same when imported by the dashboard
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 
-# Your Tapo credentials and IP address
-email = "example@example.com"
-password = "password"
-device_ip = "device_ip_address"
-device_name = "device_name"
+# Tapo credentials and plugs are configured in tapo_control.py
 
 # The time to wait between turning off and on the device (in seconds)
 wait_time = 30  # You can change this to any number of seconds
-retry_attempts = 3  # Number of retries if a connection fails
 
 # Log power cycle event to SQLite database
 def log_power_cycle_event(reason="Internet down for 5+ minutes"):
     try:   
         db_file = os.path.join(SCRIPT_DIR, 'logs/internet_status.db')
-        conn = sqlite3.connect(db_file)
+        # Waits out the collector's commits rather than losing the event
+        conn = read_connections.connect_writable(db_file)
         cursor = conn.cursor()
+        # Timestamps are stored as epoch milliseconds
         cursor.execute("INSERT INTO power_cycle_events (timestamp, reason) VALUES (?, ?)",
-                       (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), reason))
+                       (int(datetime.now().timestamp() * 1000), reason))
         conn.commit()
         conn.close()
         logging.info("Power cycle event logged successfully.")
     except sqlite3.Error as e:
         logging.error(f"Failed to log power cycle event: {e}")
 
-async def control_tapo():
+# Power cycle the plug through the device pool, reporting each step ('off', 'waiting', 'on') to progress
+async def power_cycle(pool, reason="manually triggered", progress=None):
+    """
+    Turns the plug off, waits wait_time seconds and turns it back on, then logs the
+    event. Raises if the plug could not be turned back on.
+    """
+    device_name = tapo_control.DEVICES[tapo_control.DEFAULT_DEVICE]['name']
     try:
-        # Initialize API client
-        client = tapo.ApiClient(email, password)
-
-        # Get the P100 device (requires `await`)
-        device = await client.p100(device_ip)
-
-        # Refresh the session (useful if connection becomes inactive)
-        await device.refresh_session()
-        print(f"Session refreshed for {device_name}.")
-
-        # Turn off the device
-        await device.off()
-        print(f"{device_name} has been turned off.")
-        logging.info(f"OVERIDE: {device_name} has been turned off.")
-
-        # Wait for the specified period
-        await asyncio.sleep(wait_time)
-        print(f"Waited for {wait_time} seconds.")
-
-        # Turn the device back on
-        await device.on()
-        print(f"{device_name} has been turned back on.")
-        logging.info(f"OVERIDE: {device_name} has been turned on.")
-
-        # Log the power cycle event
-        log_power_cycle_event("manually triggered")
-
-        # Print device info after successful operation
-        await print_device_info(device)
-
+        # Reuses the pool's session, reconnecting and retrying if it has gone stale
+        await pool.power_cycle(tapo_control.DEFAULT_DEVICE, wait_time, progress)
+        print(f"{device_name} has been power cycled.")
+        logging.info(f"OVERIDE: {device_name} has been power cycled.")
     except asyncio.TimeoutError:
         print("The request timed out. Please check your network connection or the device.")
+        raise
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        await handle_exception(device)
+        logging.info(f"OVERIDE: Power cycle failed: {e}")
+        raise
 
-async def handle_exception(device):
-    # Retry logic on exception
-    for attempt in range(1, retry_attempts + 1):
-        try:
-            print(f"Attempting to refresh session and retry... (Attempt {attempt}/{retry_attempts})")
-            logging.info(f"OVERIDE: Attempting to refresh session and retry... (Attempt {attempt}/{retry_attempts}).")
-            await device.refresh_session()
+    # Log the power cycle event
+    log_power_cycle_event(reason)
 
-            # Try to turn the device on after failure
-            await device.on()
-            print(f"{device_name} has been turned back on after retry attempt {attempt}.")
-            logging.info(f"OVERIDE: {device_name} has been turned back on after retry attempt {attempt}.")
+    # Print device info after successful operation
+    await print_device_info(pool)
 
-            # Print device info after successful retry
-            await print_device_info(device)
-            return  # Exit the loop if successful
-        except Exception as retry_error:
-            print(f"Retry attempt {attempt} failed: {retry_error}")
-            if attempt == retry_attempts:
-                print(f"All retry attempts failed. Please check your connection.")
-                logging.info(f"OVERIDE: All retry attempts failed. Please check your connection.")
-                return
+async def control_tapo():
+    try:
+        await power_cycle(tapo_control.DevicePool(), "manually triggered")
+    except Exception as e:
+        print(f"Power cycle failed: {e}")
 
-async def print_device_info(device):
+async def print_device_info(pool):
     try:
         # Get additional device information in JSON format
-        device_info_json = await device.get_device_info_json()
+        device_info_json = await pool.device_info(tapo_control.DEFAULT_DEVICE)
 
         # Pretty print the JSON response
         pretty_device_info = json.dumps(device_info_json, indent=4)
@@ -112,5 +75,12 @@ async def print_device_info(device):
     except Exception as e:
         print(f"Failed to retrieve device info: {e}")
 
-# Run the async function
-asyncio.run(control_tapo())
+# Run the async function when started as a script; the dashboard imports power_cycle
+if __name__ == '__main__':
+    # Set up logging configuration
+    logging.basicConfig(
+        filename=os.path.join(SCRIPT_DIR, 'logs/check_internet.log'),
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(control_tapo())
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+import uuid
+
+import power_cycle_nbn_override
+import tapo_control
+
+logger = logging.getLogger(__name__)
+
+# Device power cycled by the dashboard button
+DEFAULT_DEVICE = tapo_control.DEFAULT_DEVICE
+
+# Job states, in the order a successful job passes through them
+QUEUED = 'queued'
+OFF = 'off'
+WAITING = 'waiting'
+ON = 'on'
+FAILED = 'failed'
+FINISHED_STATES = (ON, FAILED)
+
+# Seconds a job may hold its device before another job is allowed to start anyway,
+# in case the process running it died
+JOB_TIMEOUT = 600
+
+# Seconds a finished job's status stays readable
+JOB_HISTORY = 3600
+
+# Cache keys for a device's latest job and for the lock held while one runs
+JOB_KEY = 'power_cycle:job:{device}'
+LOCK_KEY = 'power_cycle:lock:{device}'
+
+# Plug sessions kept open by this process, so a power cycle starts with one request
+device_pool = tapo_control.BackgroundPool()
+
+# Function to run the manual power cycle in this process
+def run_override(reason, progress):
+    device_pool.run(power_cycle_nbn_override.power_cycle, reason, progress)
+
+class PowerCycleJobs:
+    """
+    Runs power cycles as background jobs, at most one at a time per device, so a
+    request only has to queue the job. Job status is kept in the shared cache where
+    there is one, so every dashboard worker reports the same job and a second click
+    from any of them is refused while a cycle is in progress.
+    """
+
+    def __init__(self, cache=None, run=run_override):
+        self.cache = cache
+        self.run = run
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, device=DEFAULT_DEVICE, reason="manually triggered"):
+        """
+        Queues a power cycle of the device. Returns (job, accepted); when a job for
+        the device is already running, that job is returned with accepted False.
+        """
+        with self._lock:
+            current = self.status(device)
+            if current is not None and current['state'] not in FINISHED_STATES:
+                return current, False
+
+            now = time.time()
+            job = {
+                'id': uuid.uuid4().hex,
+                'device': device,
+                'reason': reason,
+                'state': QUEUED,
+                'error': None,
+                'started_at': now,
+                'updated_at': now,
+            }
+            if not self._acquire(job):
+                return self.status(device), False
+            self._save(job)
+
+        threading.Thread(target=self._execute, args=(job,), name=f'power-cycle-{device}', daemon=True).start()
+        logger.info(f"Power cycle of {device} queued ({reason}).")
+        return job, True
+
+    def status(self, device=DEFAULT_DEVICE):
+        """
+        Returns the latest job for the device, or None if there is none.
+        """
+        if self.cache is not None:
+            try:
+                job = self.cache.get(JOB_KEY.format(device=device))
+                if job is not None:
+                    return job
+            except Exception as e:
+                logger.debug(f"Could not read power cycle job from cache: {e}")
+        return self._jobs.get(device)
+
+    def _acquire(self, job):
+        if self.cache is None:
+            return True
+        try:
+            return self.cache.add(LOCK_KEY.format(device=job['device']), job['id'], timeout=JOB_TIMEOUT)
+        except Exception as e:
+            # Without the shared cache only this process's own jobs can be checked
+            logger.debug(f"Could not take the power cycle lock: {e}")
+            return True
+
+    def _release(self, job):
+        if self.cache is None:
+            return
+        try:
+            key = LOCK_KEY.format(device=job['device'])
+            if self.cache.get(key) == job['id']:
+                self.cache.delete(key)
+        except Exception as e:
+            logger.debug(f"Could not release the power cycle lock: {e}")
+
+    def _save(self, job):
+        self._jobs[job['device']] = job
+        if self.cache is not None:
+            try:
+                self.cache.set(JOB_KEY.format(device=job['device']), job, timeout=JOB_HISTORY)
+            except Exception as e:
+                logger.debug(f"Could not publish power cycle job to cache: {e}")
+
+    def _update(self, job, state, error=None):
+        job = dict(job, state=state, error=error, updated_at=time.time())
+        self._save(job)
+        logger.info(f"Power cycle of {job['device']}: {state}" + (f" ({error})" if error else ""))
+        return job
+
+    def _execute(self, job):
+        def progress(state):
+            nonlocal job
+            job = self._update(job, state)
+
+        try:
+            self.run(job['reason'], progress)
+            if job['state'] != ON:
+                job = self._update(job, ON)
+        except Exception as e:
+            job = self._update(job, FAILED, str(e) or type(e).__name__)
+        finally:
+            self._release(job)
@@ -0,0 +1,85 @@
+import logging
+import os
+import sqlite3
+import threading
+
+import schema
+
+logger = logging.getLogger(__name__)
+
+# Bytes of the database file each connection maps into memory, so reads are served
+# from the OS page cache without copying through SQLite's own buffers
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Page cache per connection in KiB (SQLite takes a negative cache_size as KiB)
+CACHE_SIZE_KB = 16 * 1024
+
+# Prepared statements each connection keeps for reuse
+CACHED_STATEMENTS = 256
+
+# Seconds a connection waits on a lock before failing, e.g. while a checkpoint runs
+# or the collector commits a batch
+BUSY_TIMEOUT = 10
+
+# Function to open a short-lived writable connection for the dashboard's own writes
+def connect_writable(db_path):
+    return sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+
+class ReadConnections:
+    """
+    Keeps one read-only SQLite connection per thread and database open for the
+    life of the thread, so its page cache, memory map and prepared statements
+    carry over from one callback to the next. Before the first connection to a
+    database is opened, a short-lived writable connection checks the schema and
+    switches the database to WAL, in which readers never block the collector's
+    writes and are never blocked by them. Connections are only ever used by the
+    thread that opened them, and a forked worker opens its own.
+    """
+
+    def __init__(self, mmap_size=MMAP_SIZE, cache_size_kb=CACHE_SIZE_KB):
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self._local = threading.local()
+        self._prepared = set()
+        self._lock = threading.Lock()
+
+    def get(self, db_path):
+        """
+        Returns this thread's read-only connection to the database, opening it on
+        first use. Callers must not close it, and must read every row of a
+        statement they start (or discard its cursor) so it does not hold a read
+        snapshot open.
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            # Connections inherited across a fork belong to the parent
+            self._local.connections = {}
+            self._local.pid = os.getpid()
+        conn = self._local.connections.get(db_path)
+        if conn is None:
+            self._prepare(db_path)
+            conn = sqlite3.connect(
+                f"file:{db_path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT,
+                cached_statements=CACHED_STATEMENTS
+            )
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+            self._local.connections[db_path] = conn
+            logger.info(f"Opened read-only connection to {db_path} in thread {threading.get_ident()}.")
+        return conn
+
+    def _prepare(self, db_path):
+        # Once per database per process: the schema and WAL need a writable connection
+        with self._lock:
+            if (db_path, os.getpid()) in self._prepared:
+                return
+            conn = connect_writable(db_path)
+            try:
+                schema.ensure_schema(conn, db_path)
+                mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+                if mode != 'wal':
+                    logger.warning(f"Could not switch {db_path} to WAL, journal mode is {mode}.")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not prepare {db_path} for reading: {e}")
+            finally:
+                conn.close()
+            self._prepared.add((db_path, os.getpid()))
@@ -0,0 +1,80 @@
+import collections
+import logging
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Number of result sets kept in memory before the least recently used is dropped
+DEFAULT_MAX_ENTRIES = 32
+
+# Number of derived views, such as the log table's sorted rows, kept per result
+DEFAULT_MAX_VIEWS = 4
+
+class ResultStore:
+    """
+    Keeps query results on the server, keyed by a small handle that the browser
+    holds instead of the data itself. Entries are evicted least recently used
+    first, so callers must be able to rebuild a result whose handle has gone.
+    Views derived from a result are kept alongside it until it is replaced.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_views=DEFAULT_MAX_VIEWS):
+        self.max_entries = max_entries
+        self.max_views = max_views
+        self._entries = collections.OrderedDict()
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def put(self, df, handle=None):
+        """
+        Stores a result under the given handle, or a new one, and returns the handle.
+        """
+        if handle is None:
+            handle = uuid.uuid4().hex
+        with self._lock:
+            self._entries[handle] = df
+            self._entries.move_to_end(handle)
+            self._views.pop(handle, None)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._views.pop(evicted, None)
+                logger.debug(f"Evicted result {evicted}.")
+        return handle
+
+    def get(self, handle):
+        """
+        Returns the result stored under the handle, or None if it is unknown.
+        """
+        with self._lock:
+            df = self._entries.get(handle)
+            if df is not None:
+                self._entries.move_to_end(handle)
+            return df
+
+    def get_view(self, handle, key, build):
+        """
+        Returns the view of the handle's result stored under key, building it with
+        build(df) on first use, or None if the handle is unknown. Views are dropped
+        when the result is replaced, least recently used first beyond max_views.
+        """
+        df = self.get(handle)
+        if df is None:
+            return None
+        with self._lock:
+            built_on, views = self._views.get(handle, (None, None))
+            if built_on is df and key in views:
+                views.move_to_end(key)
+                return views[key]
+        view = build(df)
+        with self._lock:
+            # The result may have been replaced while the view was built
+            if self._entries.get(handle) is df:
+                built_on, views = self._views.get(handle, (None, None))
+                if built_on is not df:
+                    views = collections.OrderedDict()
+                    self._views[handle] = (df, views)
+                views[key] = view
+                while len(views) > self.max_views:
+                    views.popitem(last=False)
+        return view
@@ -0,0 +1,140 @@
+import logging
+import sqlite3
+import time
+from datetime import timedelta
+
+import schema
+
+logger = logging.getLogger(__name__)
+
+# How long each tier keeps its rows, finest first. Samples are summed into every
+# rollup tier as they are written, so dropping a tier's old rows loses only detail:
+# raw samples and probes are kept for a week, 5-minute rollups for 90 days, and
+# the hourly and daily rollups, which grow by a few rows a day, for good.
+RETENTION_TIERS = [
+    # (table, time column, kept for)
+    ('internet_status', 'timestamp', timedelta(days=7)),
+    ('probe_samples', 't', timedelta(days=7)),
+    (schema.ROLLUPS['5min'][0], 'bucket', timedelta(days=90)),
+]
+
+# Rows deleted per batch, each committed on its own
+BATCH_SIZE = 5000
+
+# Seconds a collector spends on retention per sample before getting back to sampling
+STEP_BUDGET = 0.2
+
+# Seconds between retention passes in daemon mode
+RETENTION_INTERVAL = 3600
+
+# Free pages handed back to the file system per pass
+VACUUM_PAGES = 2000
+
+# Deletes up to batch rows older than the cutoff, oldest first. The subquery finds the
+# time batch rows in from the oldest through the time column's index; with fewer old
+# rows left than that, everything before the cutoff goes. Works for WITHOUT ROWID tables.
+DELETE_BATCH = """
+DELETE FROM {table}
+WHERE {column} < :cutoff
+  AND {column} < COALESCE(
+      (SELECT {column} FROM {table} WHERE {column} < :cutoff ORDER BY {column} LIMIT 1 OFFSET :batch),
+      :cutoff
+  )
+"""
+
+# Function to switch a database to incremental vacuuming
+def enable_incremental_vacuum(conn):
+    """
+    Sets auto_vacuum to INCREMENTAL so free pages can be returned a few at a time.
+    An existing database only takes the setting through one full VACUUM, which is run
+    here once; it needs no open transaction and briefly locks the database.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.commit()
+    started_at = time.monotonic()
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    except sqlite3.Error as e:
+        # Space is still reused, only not returned; the next start tries again
+        logger.warning(f"Could not enable incremental vacuum: {e}")
+        return
+    logger.info(f"Enabled incremental vacuum in {time.monotonic() - started_at:.1f} seconds.")
+
+# Function to hand a bounded number of free pages back to the file system
+def reclaim_space(conn, max_pages=VACUUM_PAGES):
+    """
+    Returns the number of pages freed. Does nothing unless incremental vacuum is on.
+    """
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if not free_pages or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    # executescript steps the pragma to completion; execute() frees a single page
+    conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+    return free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+class RetentionEngine:
+    """
+    Trims each tier to its retention period in bounded batches, so a pass never holds
+    the write lock for long however much has aged out, and hands the freed pages
+    back with an incremental vacuum when a pass completes. The collector calls step()
+    between samples; a pass that does not finish within the time budget carries on
+    at the next call.
+    """
+
+    def __init__(self, tiers=RETENTION_TIERS, batch_size=BATCH_SIZE, interval=RETENTION_INTERVAL):
+        self.tiers = tiers
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = []
+        self._deleted = {}
+        self._next_pass = None
+
+    def due(self):
+        """
+        Returns True if a pass is in progress or the next one should start.
+        """
+        return bool(self._pending) or self._next_pass is None or time.monotonic() >= self._next_pass
+
+    def step(self, conn, now, budget=STEP_BUDGET):
+        """
+        Deletes batches until the budget in seconds is used up or the pass is done,
+        committing each. Starts a new pass once the interval has passed since the last
+        one ended. Returns True while a pass is in progress.
+        """
+        if not self._pending:
+            if not self.due():
+                return False
+            # Cutoffs are fixed for the whole pass
+            self._pending = [(table, column, schema.to_epoch_ms(now - period)) for table, column, period in self.tiers]
+            self._deleted = {}
+
+        deadline = time.monotonic() + budget
+        while self._pending and time.monotonic() < deadline:
+            table, column, cutoff = self._pending[0]
+            deleted = conn.execute(
+                DELETE_BATCH.format(table=table, column=column),
+                {'cutoff': cutoff, 'batch': self.batch_size}
+            ).rowcount
+            conn.commit()
+            self._deleted[table] = self._deleted.get(table, 0) + deleted
+            remaining = conn.execute(f"SELECT 1 FROM {table} WHERE {column} < ? LIMIT 1", (cutoff,)).fetchone()
+            if not deleted or remaining is None:
+                self._pending.pop(0)
+
+        if self._pending:
+            return True
+        freed = reclaim_space(conn)
+        self._next_pass = time.monotonic() + self.interval
+        summary = ", ".join(f"{count} from {table}" for table, count in self._deleted.items() if count)
+        logger.info(f"Retention removed {summary or 'nothing'}; {freed} pages returned to the file system.")
+        return False
+
+    def run(self, conn, now):
+        """
+        Runs a whole pass now, still batch by batch.
+        """
+        self._next_pass = None
+        while self.step(conn, now):
+            pass
@@ -0,0 +1,615 @@
+import logging
+import numbers
+import re
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Format of the local-time text timestamps written before schema version 1, and of
+# the rollup bucket formats below
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Schema version recorded in PRAGMA user_version:
+#   0 - timestamps stored as local-time TIMESTAMP_FORMAT text (check_internet.sh)
+#   1 - timestamps and rollup buckets stored as integer epoch milliseconds
+#   2 - rows, rollups and incidents tagged with the site they were collected at
+SCHEMA_VERSION = 2
+
+# Site of the rows written by this host's own collector
+DEFAULT_SITE = 'local'
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS internet_status (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp INTEGER NOT NULL,
+        status TEXT,
+        success_percentage INTEGER,
+        avg_latency_ms REAL,
+        max_latency_ms REAL,
+        min_latency_ms REAL,
+        packet_loss REAL,
+        site TEXT NOT NULL DEFAULT 'local',
+        collector TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS power_cycle_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp INTEGER NOT NULL,
+        reason TEXT,
+        site TEXT NOT NULL DEFAULT 'local'
+    )
+    """,
+    # Small integer IDs for probe targets such as '8.8.8.8' or '1.1.1.1:53'
+    """
+    CREATE TABLE IF NOT EXISTS probe_targets (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    # One row per individual probe: t is the sample time in epoch milliseconds,
+    # seq the probe's index within the sample and rtt_us the round trip time in
+    # microseconds (NULL when the probe got no reply). WITHOUT ROWID stores the
+    # rows in the primary key b-tree, so each sample costs a handful of bytes.
+    """
+    CREATE TABLE IF NOT EXISTS probe_samples (
+        t INTEGER NOT NULL,
+        target_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        rtt_us INTEGER,
+        PRIMARY KEY (t, target_id, seq)
+    ) WITHOUT ROWID
+    """,
+    # Each time a power cycle policy fired on this host's samples (see
+    # decision_engine.py), with what it saw and whether the modem was power cycled
+    # ('power_cycle') or the cooldown held it back ('cooldown')
+    """
+    CREATE TABLE IF NOT EXISTS power_cycle_decisions (
+        id INTEGER PRIMARY KEY,
+        timestamp INTEGER NOT NULL,
+        policy TEXT NOT NULL,
+        detail TEXT,
+        action TEXT NOT NULL
+    )
+    """,
+]
+
+# Indexes that let SQLite answer range reads without scanning the whole table. A site
+# has at most one sample and one power cycle per timestamp, which is how uploaded
+# batches are deduplicated.
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_internet_status_timestamp ON internet_status (timestamp)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_internet_status_site_timestamp ON internet_status (site, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_power_cycle_events_timestamp ON power_cycle_events (timestamp)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_power_cycle_events_site_timestamp ON power_cycle_events (site, timestamp)",
+]
+
+# Rollup tables maintained at insert time, with the local-time format that truncates
+# a timestamp to the start of its bucket, or the bucket width in milliseconds for
+# buckets of whole minutes, which start on the same instants in every time zone
+ROLLUPS = {
+    '5min': ('internet_status_5min', 5 * 60 * 1000),
+    'hourly': ('internet_status_hourly', '%Y-%m-%d %H:00:00'),
+    'daily': ('internet_status_daily', '%Y-%m-%d 00:00:00'),
+}
+
+ROLLUP_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    site TEXT NOT NULL DEFAULT 'local',
+    bucket INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    full_up INTEGER NOT NULL,
+    partial_up INTEGER NOT NULL,
+    down INTEGER NOT NULL,
+    success_sum REAL,
+    success_min REAL,
+    success_max REAL,
+    avg_latency_sum REAL,
+    avg_latency_samples INTEGER NOT NULL,
+    max_latency_ms REAL,
+    min_latency_ms REAL,
+    packet_loss_sum REAL,
+    packet_loss_max REAL,
+    PRIMARY KEY (site, bucket)
+)
+"""
+
+# Lets retention find a rollup table's oldest buckets across every site
+ROLLUP_INDEX = "CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket)"
+
+# Start of the local-time bucket an epoch-ms timestamp falls into, as epoch ms.
+# Going through localtime keeps buckets on local hour and day boundaries across DST.
+ROLLUP_BUCKET = """CAST(strftime('%s', strftime('{bucket_format}', {timestamp} / 1000, 'unixepoch', 'localtime'), 'utc') AS INTEGER) * 1000"""
+
+# Start of the fixed-width bucket an epoch-ms timestamp falls into
+ROLLUP_FIXED_BUCKET = """({timestamp} - {timestamp} % {width})"""
+
+# Per-row contribution of a status row to its rollup bucket
+ROLLUP_VALUES = """
+    {bucket},
+    1,
+    {row}success_percentage = 100,
+    {row}success_percentage > 0 AND {row}success_percentage < 100,
+    {row}success_percentage = 0,
+    {row}success_percentage,
+    {row}success_percentage,
+    {row}success_percentage,
+    {row}avg_latency_ms,
+    {row}avg_latency_ms IS NOT NULL,
+    {row}max_latency_ms,
+    {row}min_latency_ms,
+    {row}packet_loss,
+    {row}packet_loss
+"""
+
+ROLLUP_COLUMNS = """
+    bucket, samples, full_up, partial_up, down,
+    success_sum, success_min, success_max,
+    avg_latency_sum, avg_latency_samples,
+    max_latency_ms, min_latency_ms,
+    packet_loss_sum, packet_loss_max
+"""
+
+# Keeps each site's rollup bucket current as rows are inserted, whichever collector
+# writes them. min()/max() with a NULL argument return NULL, hence the COALESCE fallbacks.
+ROLLUP_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON internet_status
+BEGIN
+    INSERT INTO {table} (site, {columns})
+    VALUES (NEW.site, {values})
+    ON CONFLICT (site, bucket) DO UPDATE SET
+        samples = samples + 1,
+        full_up = full_up + excluded.full_up,
+        partial_up = partial_up + excluded.partial_up,
+        down = down + excluded.down,
+        success_sum = COALESCE(success_sum + excluded.success_sum, success_sum, excluded.success_sum),
+        success_min = COALESCE(min(success_min, excluded.success_min), success_min, excluded.success_min),
+        success_max = COALESCE(max(success_max, excluded.success_max), success_max, excluded.success_max),
+        avg_latency_sum = COALESCE(avg_latency_sum + excluded.avg_latency_sum, avg_latency_sum, excluded.avg_latency_sum),
+        avg_latency_samples = avg_latency_samples + excluded.avg_latency_samples,
+        max_latency_ms = COALESCE(max(max_latency_ms, excluded.max_latency_ms), max_latency_ms, excluded.max_latency_ms),
+        min_latency_ms = COALESCE(min(min_latency_ms, excluded.min_latency_ms), min_latency_ms, excluded.min_latency_ms),
+        packet_loss_sum = COALESCE(packet_loss_sum + excluded.packet_loss_sum, packet_loss_sum, excluded.packet_loss_sum),
+        packet_loss_max = COALESCE(max(packet_loss_max, excluded.packet_loss_max), packet_loss_max, excluded.packet_loss_max);
+END
+"""
+
+# Recomputes a rollup table from the raw rows still held in internet_status
+ROLLUP_REBUILD = """
+INSERT OR REPLACE INTO {table} (site, {columns})
+SELECT site,
+       {bucket},
+       COUNT(*),
+       SUM(success_percentage = 100),
+       SUM(success_percentage > 0 AND success_percentage < 100),
+       SUM(success_percentage = 0),
+       SUM(success_percentage),
+       MIN(success_percentage),
+       MAX(success_percentage),
+       SUM(avg_latency_ms),
+       COUNT(avg_latency_ms),
+       MAX(max_latency_ms),
+       MIN(min_latency_ms),
+       SUM(packet_loss),
+       MAX(packet_loss)
+FROM internet_status
+GROUP BY 1, 2
+"""
+
+# Samples with a success percentage below this count as failed or degraded, and a
+# run of them forms an incident
+INCIDENT_SUCCESS_BELOW = 80
+
+# Milliseconds without a sample after which an open incident is taken to have ended
+# at its last failed sample, e.g. while the collector was stopped
+INCIDENT_GAP_MS = 5 * 60 * 1000
+
+# One row per run of failed or degraded samples at a site. ended_at is the first healthy sample
+# after the run (NULL while the incident is ongoing) and the worst values are taken
+# over the run's samples. power_cycle_id is the last power cycle during the incident.
+INCIDENT_TABLE = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at INTEGER NOT NULL,
+    last_failed_at INTEGER NOT NULL,
+    ended_at INTEGER,
+    samples INTEGER NOT NULL,
+    down_samples INTEGER NOT NULL,
+    success_min INTEGER,
+    max_latency_ms REAL,
+    packet_loss_max REAL,
+    power_cycle_id INTEGER,
+    site TEXT NOT NULL DEFAULT 'local'
+)
+"""
+
+INCIDENT_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_incidents_started_at ON incidents (started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_incidents_site_ended_at ON incidents (site, ended_at)",
+]
+
+# Last power cycle at the incident row's site between its start and the given time
+INCIDENT_POWER_CYCLE = """(
+    SELECT id FROM power_cycle_events
+    WHERE site = {row}.site AND timestamp >= {row}.started_at AND timestamp <= {until}
+    ORDER BY timestamp DESC LIMIT 1
+)"""
+
+# End of the open incident when a healthy sample arrives
+INCIDENT_ENDED_AT = f"""CASE WHEN NEW.timestamp - incidents.last_failed_at > {INCIDENT_GAP_MS} THEN incidents.last_failed_at ELSE NEW.timestamp END"""
+
+# Keep the incident index current as rows are inserted: a failed sample extends its
+# site's open incident or starts one, a healthy sample closes it, and a power cycle
+# during an open incident is linked to it straight away. An incident left open across
+# a gap ends at its last failed sample.
+INCIDENT_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS incidents_failed AFTER INSERT ON internet_status
+    WHEN NEW.success_percentage < {threshold}
+    BEGIN
+        UPDATE incidents SET ended_at = last_failed_at
+        WHERE site = NEW.site AND ended_at IS NULL AND NEW.timestamp - last_failed_at > {gap};
+        UPDATE incidents SET
+            last_failed_at = max(last_failed_at, NEW.timestamp),
+            samples = samples + 1,
+            down_samples = down_samples + (NEW.success_percentage = 0),
+            success_min = min(success_min, NEW.success_percentage),
+            max_latency_ms = COALESCE(max(max_latency_ms, NEW.max_latency_ms), max_latency_ms, NEW.max_latency_ms),
+            packet_loss_max = COALESCE(max(packet_loss_max, NEW.packet_loss), packet_loss_max, NEW.packet_loss)
+        WHERE site = NEW.site AND ended_at IS NULL;
+        INSERT INTO incidents (site, started_at, last_failed_at, samples, down_samples, success_min,
+                               max_latency_ms, packet_loss_max)
+        SELECT NEW.site, NEW.timestamp, NEW.timestamp, 1, NEW.success_percentage = 0, NEW.success_percentage,
+               NEW.max_latency_ms, NEW.packet_loss
+        WHERE NOT EXISTS (SELECT 1 FROM incidents WHERE site = NEW.site AND ended_at IS NULL);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS incidents_recovered AFTER INSERT ON internet_status
+    WHEN NEW.success_percentage >= {threshold}
+    BEGIN
+        UPDATE incidents SET
+            ended_at = {ended_at},
+            power_cycle_id = COALESCE({power_cycle}, power_cycle_id)
+        WHERE site = NEW.site AND ended_at IS NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS incidents_power_cycle AFTER INSERT ON power_cycle_events
+    BEGIN
+        UPDATE incidents SET power_cycle_id = NEW.id
+        WHERE site = NEW.site AND ended_at IS NULL AND NEW.timestamp - last_failed_at <= {gap};
+    END
+    """,
+]
+
+# Recomputes the incidents covered by the raw rows still held in internet_status, with
+# the same rules as the triggers: within a site, a failed sample after a healthy one or
+# after a gap starts a new run, and a run ends at the next healthy sample unless that
+# came after a gap
+INCIDENT_REBUILD = """
+WITH samples AS (
+    SELECT site, timestamp, success_percentage, max_latency_ms, packet_loss,
+           success_percentage < {threshold} AS failed,
+           timestamp - LAG(timestamp) OVER (PARTITION BY site ORDER BY timestamp) AS since_previous,
+           LAG(success_percentage < {threshold}) OVER (PARTITION BY site ORDER BY timestamp) AS previous_failed
+    FROM internet_status
+),
+runs AS (
+    SELECT *,
+           SUM(failed AND (previous_failed IS NOT 1 OR since_previous > {gap}))
+               OVER (PARTITION BY site ORDER BY timestamp) AS run
+    FROM samples
+),
+summaries AS (
+    SELECT site,
+           MIN(CASE WHEN failed THEN timestamp END) AS started_at,
+           MAX(CASE WHEN failed THEN timestamp END) AS last_failed_at,
+           MIN(CASE WHEN NOT failed THEN timestamp END) AS recovered_at,
+           SUM(failed) AS samples,
+           SUM(failed AND success_percentage = 0) AS down_samples,
+           MIN(CASE WHEN failed THEN success_percentage END) AS success_min,
+           MAX(CASE WHEN failed THEN max_latency_ms END) AS max_latency_ms,
+           MAX(CASE WHEN failed THEN packet_loss END) AS packet_loss_max
+    FROM runs
+    WHERE run > 0
+    GROUP BY site, run
+),
+ended AS (
+    SELECT *,
+           CASE
+               WHEN recovered_at - last_failed_at <= {gap} THEN recovered_at
+               WHEN recovered_at IS NOT NULL
+                    OR last_failed_at < (SELECT MAX(timestamp) FROM internet_status WHERE site = summaries.site)
+                   THEN last_failed_at
+           END AS ended_at
+    FROM summaries
+)
+INSERT INTO incidents (site, started_at, last_failed_at, ended_at, samples, down_samples, success_min,
+                       max_latency_ms, packet_loss_max, power_cycle_id)
+SELECT site, started_at, last_failed_at, ended_at, samples, down_samples, success_min,
+       max_latency_ms, packet_loss_max,
+       {power_cycle}
+FROM ended
+ORDER BY started_at
+"""
+
+# Converts a column holding legacy local-time text to epoch milliseconds. Integers are
+# kept as they are, in case a newer writer already inserted into a legacy table.
+EPOCH_MS_FROM_TEXT = """CASE typeof({column}) WHEN 'integer' THEN {column} ELSE CAST(strftime('%s', {column}, 'utc') AS INTEGER) * 1000 END"""
+
+# Copies each legacy table into its typed replacement, converting timestamps on the way
+MIGRATE_TO_EPOCH_MS = {
+    'internet_status': """
+        INSERT INTO {new_table} (id, timestamp, status, success_percentage, avg_latency_ms,
+                                 max_latency_ms, min_latency_ms, packet_loss)
+        SELECT id, {timestamp}, status, CAST(success_percentage AS INTEGER), avg_latency_ms,
+               max_latency_ms, min_latency_ms, packet_loss
+        FROM internet_status
+        WHERE timestamp IS NOT NULL
+    """,
+    'power_cycle_events': """
+        INSERT INTO {new_table} (id, timestamp, reason)
+        SELECT id, {timestamp}, reason
+        FROM power_cycle_events
+        WHERE timestamp IS NOT NULL
+    """,
+}
+
+# Columns added to each table by schema version 2, with their definitions
+SITE_COLUMNS = {
+    'internet_status': {
+        'site': "TEXT NOT NULL DEFAULT 'local'",
+        'collector': "TEXT",
+    },
+    'power_cycle_events': {
+        'site': "TEXT NOT NULL DEFAULT 'local'",
+    },
+    'incidents': {
+        'site': "TEXT NOT NULL DEFAULT 'local'",
+    },
+}
+
+# Database paths that have already had their schema checked by this process
+_checked_paths = set()
+
+# Name of the table, index or trigger a CREATE statement makes
+CREATED_NAME = re.compile(r"CREATE (?:UNIQUE )?(?:TABLE|INDEX|TRIGGER) IF NOT EXISTS (\w+)")
+
+# Function to make sure the tables, indexes and rollup tables exist
+def ensure_schema(conn, db_path):
+    """
+    Creates the tables, timestamp indexes and rollup tables once per database per
+    process, migrating databases written with text timestamps or without sites
+    first. Rollup tables that did not exist yet are backfilled from the raw rows.
+    The write lock is only taken when something is missing or out of date.
+    """
+    if db_path in _checked_paths:
+        return
+    try:
+        # Checked without a lock, so an up to date database never waits on other writers
+        if _schema_current(conn):
+            _checked_paths.add(db_path)
+            return
+        # Take the write lock first so no row lands between backfill and trigger creation
+        conn.execute("BEGIN IMMEDIATE")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1 and _table_exists(conn, 'internet_status'):
+            migrate_to_epoch_ms(conn)
+        if version < 2 and _table_exists(conn, 'internet_status'):
+            migrate_to_sites(conn)
+        for statement in TABLES + INDEXES:
+            conn.execute(statement)
+        for granularity, (table, bucket_format) in ROLLUPS.items():
+            exists = _table_exists(conn, table)
+            conn.execute(ROLLUP_TABLE.format(table=table))
+            conn.execute(ROLLUP_INDEX.format(table=table))
+            conn.execute(ROLLUP_TRIGGER.format(
+                table=table,
+                columns=ROLLUP_COLUMNS,
+                values=ROLLUP_VALUES.format(bucket=rollup_bucket(bucket_format, 'NEW.timestamp'), row='NEW.'),
+            ))
+            if not exists:
+                conn.execute(_rollup_rebuild(table, bucket_format))
+                logger.info(f"Backfilled {granularity} rollups from raw data.")
+        exists = _table_exists(conn, 'incidents')
+        conn.execute(INCIDENT_TABLE)
+        for statement in INCIDENT_INDEXES:
+            conn.execute(statement)
+        for trigger in INCIDENT_TRIGGERS:
+            conn.execute(trigger.format(
+                threshold=INCIDENT_SUCCESS_BELOW,
+                gap=INCIDENT_GAP_MS,
+                ended_at=INCIDENT_ENDED_AT,
+                power_cycle=INCIDENT_POWER_CYCLE.format(row='incidents', until=INCIDENT_ENDED_AT),
+            ))
+        if not exists:
+            _incident_rebuild(conn)
+            logger.info("Backfilled incidents from raw data.")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+        _checked_paths.add(db_path)
+        logger.info("Database indexes and rollups verified.")
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.warning(f"Could not verify database schema: {e}")
+
+# Function to check whether the schema is at the current version with every table, index and trigger
+def _schema_current(conn):
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        return False
+    statements = TABLES + INDEXES + [INCIDENT_TABLE] + INCIDENT_INDEXES + INCIDENT_TRIGGERS
+    for table, _ in ROLLUPS.values():
+        statements += [statement.replace('{table}', table) for statement in (ROLLUP_TABLE, ROLLUP_INDEX, ROLLUP_TRIGGER)]
+    expected = {CREATED_NAME.search(statement).group(1) for statement in statements}
+    existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+    return expected <= existing
+
+# Function to check whether a table exists
+def _table_exists(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+# Function to build the SQL expression for the bucket a timestamp falls into
+def rollup_bucket(bucket_format, timestamp):
+    if isinstance(bucket_format, int):
+        return ROLLUP_FIXED_BUCKET.format(width=bucket_format, timestamp=timestamp)
+    return ROLLUP_BUCKET.format(bucket_format=bucket_format, timestamp=timestamp)
+
+# Function to build the statement that recomputes one rollup table
+def _rollup_rebuild(table, bucket_format):
+    return ROLLUP_REBUILD.format(
+        table=table,
+        columns=ROLLUP_COLUMNS,
+        bucket=rollup_bucket(bucket_format, 'timestamp'),
+    )
+
+# Function to recompute the incidents covered by raw rows
+def _incident_rebuild(conn):
+    # Older incidents are kept, as their raw rows may have been removed by retention
+    conn.execute(
+        "DELETE FROM incidents WHERE ended_at IS NULL OR started_at >= "
+        "(SELECT MIN(timestamp) FROM internet_status WHERE internet_status.site = incidents.site)"
+    )
+    conn.execute(INCIDENT_REBUILD.format(
+        threshold=INCIDENT_SUCCESS_BELOW,
+        gap=INCIDENT_GAP_MS,
+        power_cycle=INCIDENT_POWER_CYCLE.format(row='ended', until='COALESCE(ended.ended_at, ended.last_failed_at)'),
+    ))
+
+# Function to convert a database with text timestamps to epoch milliseconds in place
+def migrate_to_epoch_ms(conn):
+    """
+    Rewrites internet_status, power_cycle_events and the rollup tables with integer
+    epoch-ms timestamps and typed columns. Text timestamps are read as local time.
+    Runs inside the caller's transaction; each table is copied into a new typed table
+    which then replaces the old one, so the old indexes and triggers go with it.
+    """
+    replaced = []
+    for table, copy_rows in MIGRATE_TO_EPOCH_MS.items():
+        if not _table_exists(conn, table):
+            continue
+        new_table = f"{table}_epoch_ms"
+        create = next(statement for statement in TABLES if f"EXISTS {table} (" in statement)
+        conn.execute(create.replace(f"EXISTS {table} (", f"EXISTS {new_table} (", 1))
+        conn.execute(copy_rows.format(
+            new_table=new_table,
+            timestamp=EPOCH_MS_FROM_TEXT.format(column='timestamp'),
+        ))
+        replaced.append(table)
+
+    for table, _ in ROLLUPS.values():
+        if not _table_exists(conn, table):
+            continue
+        new_table = f"{table}_epoch_ms"
+        conn.execute(ROLLUP_TABLE.format(table=new_table))
+        conn.execute(
+            f"INSERT OR REPLACE INTO {new_table} ({ROLLUP_COLUMNS}) "
+            f"SELECT {EPOCH_MS_FROM_TEXT.format(column='bucket')}, "
+            f"{ROLLUP_COLUMNS.replace('bucket, ', '')} FROM {table}"
+        )
+        replaced.append(table)
+
+    # Drop every old table before renaming so no trigger is left pointing at a missing table
+    for table in replaced:
+        conn.execute(f"DROP TABLE {table}")
+    for table in replaced:
+        conn.execute(f"ALTER TABLE {table}_epoch_ms RENAME TO {table}")
+    logger.info(f"Migrated {', '.join(replaced)} to epoch millisecond timestamps.")
+
+# Function to tag the rows of a database written before sites existed
+def migrate_to_sites(conn):
+    """
+    Adds the site columns, tagging every existing row, rollup bucket and incident as
+    DEFAULT_SITE. Rollup tables are rebuilt around their (site, bucket) key and the
+    triggers are dropped so ensure_schema recreates them per site. Duplicate samples
+    and power cycles at the same timestamp are removed, keeping the first, so the
+    unique indexes on (site, timestamp) can be created; the rollups are then
+    recomputed if any samples went. Runs inside the caller's transaction.
+    """
+    for table, columns in SITE_COLUMNS.items():
+        if not _table_exists(conn, table):
+            continue
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, definition in columns.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    removed = conn.execute(
+        "DELETE FROM internet_status WHERE id NOT IN "
+        "(SELECT MIN(id) FROM internet_status GROUP BY site, timestamp)"
+    ).rowcount
+    if removed:
+        logger.info(f"Removed {removed} duplicate samples.")
+    if _table_exists(conn, 'power_cycle_events'):
+        conn.execute(
+            "DELETE FROM power_cycle_events WHERE id NOT IN "
+            "(SELECT MIN(id) FROM power_cycle_events GROUP BY site, timestamp)"
+        )
+
+    for table, _ in ROLLUPS.values():
+        conn.execute(f"DROP TRIGGER IF EXISTS {table}_insert")
+        if not _table_exists(conn, table):
+            continue
+        if 'site' in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            continue
+        conn.execute(ROLLUP_TABLE.format(table=f"{table}_sites"))
+        conn.execute(
+            f"INSERT INTO {table}_sites (site, {ROLLUP_COLUMNS}) "
+            f"SELECT '{DEFAULT_SITE}', {ROLLUP_COLUMNS} FROM {table}"
+        )
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_sites RENAME TO {table}")
+    if removed:
+        # The rollups counted the duplicates, so recompute what the raw rows still cover
+        for table, bucket_format in ROLLUPS.values():
+            if _table_exists(conn, table):
+                conn.execute(_rollup_rebuild(table, bucket_format))
+
+    for name in ('incidents_failed', 'incidents_recovered', 'incidents_power_cycle'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP INDEX IF EXISTS idx_incidents_ended_at")
+    logger.info("Migrated the database to per-site rows.")
+
+# Function to recompute the rollup tables from raw data
+def rebuild_rollups(conn):
+    """
+    Recomputes every rollup bucket still covered by raw rows. Buckets older than the
+    raw retention window are left as they are.
+    """
+    for table, bucket_format in ROLLUPS.values():
+        conn.execute(_rollup_rebuild(table, bucket_format))
+    conn.commit()
+
+# Function to recompute the incident index from raw data
+def rebuild_incidents(conn):
+    """
+    Recomputes every incident that starts within the raw rows still held. Older
+    incidents are left as they are.
+    """
+    _incident_rebuild(conn)
+    conn.commit()
+
+# Function to convert a local datetime to epoch milliseconds
+def to_epoch_ms(value):
+    """
+    Accepts a naive local datetime (or pandas Timestamp) or a value that is already
+    in epoch milliseconds.
+    """
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if hasattr(value, 'to_pydatetime'):
+        # pandas treats naive Timestamps as UTC, datetime treats them as local time
+        value = value.to_pydatetime()
+    return int(value.timestamp() * 1000)
+
+# Function to look up (and create) the IDs of probe targets
+def get_target_ids(conn, names):
+    """
+    Returns a dict mapping each target name to its probe_targets ID.
+    """
+    conn.executemany("INSERT OR IGNORE INTO probe_targets (name) VALUES (?)", [(name,) for name in names])
+    rows = conn.execute("SELECT name, id FROM probe_targets").fetchall()
+    return {name: target_id for name, target_id in rows if name in names}
@@ -20,25 +20,17 @@ echo
 read -p "Enter your Tapo device IP: " TAPO_DEVICE_IP
 read -p "Enter your Tapo device name: " TAPO_DEVICE_NAME
 
-# Update the Python scripts with the Tapo credentials
-sed -i "s/email = .*/email = \"$TAPO_EMAIL\"/" $PROJECT_DIR/power_cycle_nbn.py
-sed -i "s/password = .*/password = \"$TAPO_PASSWORD\"/" $PROJECT_DIR/power_cycle_nbn.py
-sed -i "s/device_ip = .*/device_ip = \"$TAPO_DEVICE_IP\"/" $PROJECT_DIR/power_cycle_nbn.py
-sed -i "s/device_name = .*/device_name = \"$TAPO_DEVICE_NAME\"/" $PROJECT_DIR/power_cycle_nbn.py
-
-sed -i "s/email = .*/email = \"$TAPO_EMAIL\"/" $PROJECT_DIR/power_cycle_nbn_override.py
-sed -i "s/password = .*/password = \"$TAPO_PASSWORD\"/" $PROJECT_DIR/power_cycle_nbn_override.py
-sed -i "s/device_ip = .*/device_ip = \"$TAPO_DEVICE_IP\"/" $PROJECT_DIR/power_cycle_nbn_override.py
-sed -i "s/device_name = .*/device_name = \"$TAPO_DEVICE_NAME\"/" $PROJECT_DIR/power_cycle_nbn_override.py
+# Update the device control module with the Tapo credentials
+sed -i "s/^email = .*/email = \"$TAPO_EMAIL\"/" $PROJECT_DIR/tapo_control.py
+sed -i "s/^password = .*/password = \"$TAPO_PASSWORD\"/" $PROJECT_DIR/tapo_control.py
+sed -i "s/^device_ip = .*/device_ip = \"$TAPO_DEVICE_IP\"/" $PROJECT_DIR/tapo_control.py
+sed -i "s/^device_name = .*/device_name = \"$TAPO_DEVICE_NAME\"/" $PROJECT_DIR/tapo_control.py
 
 # Create necessary directories
 mkdir -p "$LOGS_DIR"
 
 # Create necessary log files if they don't exist
-touch "$LOGS_DIR/failure_count.txt"
 touch "$LOGS_DIR/check_internet.log"
-touch "$LOGS_DIR/cooldown.txt"
-touch "$LOGS_DIR/failure_count.txt"
 touch "$LOGS_DIR/dashboard.log"
 
 # Set up Python virtual environment and install dependencies
@@ -74,29 +66,22 @@ fi
 # Run check_internet.sh to initialize the database and log initial data
 /bin/bash $PROJECT_DIR/check_internet.sh
 
-# Create systemd service and timer files for check_internet
+# Create systemd service file for the resident check_internet collector
 sudo bash -c "cat > $SYSTEMD_DIR/check_internet.service" <<EOL
 [Unit]
 Description=Check Internet Connectivity
+After=network.target
 
 [Service]
-Type=oneshot
-ExecStart=/bin/bash $PROJECT_DIR/check_internet.sh
+Type=simple
+ExecStart=/bin/bash $PROJECT_DIR/check_internet.sh --daemon
+Restart=always
+RestartSec=5
 StandardOutput=append:$LOGS_DIR/check_internet-script.log
 StandardError=append:$LOGS_DIR/check_internet-script_error.log
-EOL
-
-sudo bash -c "cat > $SYSTEMD_DIR/check_internet.timer" <<EOL
-[Unit]
-Description=Runs Check Internet Connectivity Every Minute
-
-[Timer]
-OnCalendar=*:0/1
-AccuracySec=1s
-Persistent=true
 
 [Install]
-WantedBy=timers.target
+WantedBy=multi-user.target
 EOL
 
 # Create systemd service file for Dash app
@@ -108,7 +93,8 @@ After=network.target redis-server.service
 [Service]
 User=$USERNAME
 WorkingDirectory=$PROJECT_DIR
-ExecStart=$VENV_DIR/bin/python3 $PROJECT_DIR/internet_status_dashboard.py
+ExecStart=$VENV_DIR/bin/gunicorn -c gunicorn.conf.py
+ExecReload=/bin/kill -s HUP \$MAINPID
 Restart=always
 RestartSec=10
 Environment=PYTHONUNBUFFERED=1
@@ -117,13 +103,15 @@ Environment=PYTHONUNBUFFERED=1
 WantedBy=multi-user.target
 EOL
 
-# Enable and start the services
+# Enable and start the services, replacing the once-a-minute timer from older installs
+sudo systemctl disable --now check_internet.timer 2>/dev/null || true
+sudo rm -f $SYSTEMD_DIR/check_internet.timer
 sudo systemctl daemon-reload
-sudo systemctl enable --now check_internet.timer
+sudo systemctl enable --now check_internet.service
 sudo systemctl enable --now dash_app.service
 
 # Print status of the services
-sudo systemctl status check_internet.timer
+sudo systemctl status check_internet.service
 sudo systemctl status dash_app.service
 
 echo "Setup complete. The internet monitoring system is now running."
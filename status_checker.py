@@ -0,0 +1,116 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Host probed with a TCP connect (Google Public DNS), and how long to wait for it
+CHECK_ADDRESS = ("8.8.8.8", 53)
+CHECK_TIMEOUT = 2
+
+# Seconds between checks
+CHECK_INTERVAL = 10
+
+# Cache keys for the published state and for the lease of the process doing the checks
+STATUS_KEY = 'internet_status:latest'
+LEADER_KEY = 'internet_status:checker'
+
+# Function to check internet connection
+def is_internet_up(address=CHECK_ADDRESS, timeout=CHECK_TIMEOUT):
+    try:
+        with socket.create_connection(address, timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+class StatusChecker:
+    """
+    Checks the connection from one background thread on its own schedule and
+    publishes the result with the time it was taken, so readers never wait on a
+    probe. With a shared cache, the processes using it elect a single checker
+    through a lease and all read the same published state.
+    """
+
+    def __init__(self, cache=None, interval=CHECK_INTERVAL):
+        self.cache = cache
+        self.interval = interval
+        self._latest = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        """
+        Starts the checker thread in this process if it is not already running.
+        Safe to call on every read, including after a fork.
+        """
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='status-checker', daemon=True)
+            self._thread.start()
+            logger.info(f"Internet status checker started, checking every {self.interval} seconds.")
+
+    def latest(self):
+        """
+        Returns the latest {'up': bool, 'checked_at': epoch seconds} state, or None
+        if nothing has been checked yet.
+        """
+        if self.cache is not None:
+            try:
+                state = self.cache.get(STATUS_KEY)
+                if state is not None:
+                    return state
+            except Exception as e:
+                logger.debug(f"Could not read internet status from cache: {e}")
+        return self._latest
+
+    def is_stale(self, state, now=None):
+        """
+        Returns True if the state is missing or older than three check intervals.
+        """
+        if state is None:
+            return True
+        if now is None:
+            now = time.time()
+        return now - state['checked_at'] > self.interval * 3
+
+    def _is_leader(self):
+        # The lease outlives a few missed renewals, then another process takes over
+        if self.cache is None:
+            return True
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        lease = self.interval * 3
+        try:
+            if self.cache.add(LEADER_KEY, owner, timeout=lease):
+                return True
+            if self.cache.get(LEADER_KEY) == owner:
+                self.cache.set(LEADER_KEY, owner, timeout=lease)
+                return True
+            return False
+        except Exception as e:
+            # Without the shared cache every process has to check for itself
+            logger.debug(f"Could not take the status checker lease: {e}")
+            return True
+
+    def _publish(self, up):
+        state = {'up': up, 'checked_at': time.time()}
+        self._latest = state
+        if self.cache is not None:
+            try:
+                self.cache.set(STATUS_KEY, state, timeout=self.interval * 6)
+            except Exception as e:
+                logger.debug(f"Could not publish internet status to cache: {e}")
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                if self._is_leader():
+                    self._publish(is_internet_up())
+            except Exception as e:
+                logger.error(f"Internet status check failed: {e}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 0))
@@ -0,0 +1,446 @@
+import datetime
+import logging
+import os
+import zoneinfo
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from schema import DEFAULT_SITE, ROLLUP_COLUMNS, ROLLUPS, TIMESTAMP_FORMAT, to_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+# Length of each relative date range offered by the dashboard ('all_time' is unbounded)
+DATE_RANGES = {
+    'last_12_hours': datetime.timedelta(hours=12),
+    'last_24_hours': datetime.timedelta(hours=24),
+    'last_48_hours': datetime.timedelta(hours=48),
+    'last_7_days': datetime.timedelta(days=7),
+}
+
+STATUS_QUERY = """
+SELECT timestamp,
+       status AS status_message,
+       success_percentage AS success,
+       avg_latency_ms,
+       max_latency_ms,
+       min_latency_ms,
+       packet_loss
+FROM internet_status
+"""
+
+# NumPy types of the STATUS_QUERY columns. Nullable numbers are read as floats so a
+# NULL becomes NaN; timestamp is epoch milliseconds and never NULL.
+STATUS_DTYPES = [
+    ('timestamp', np.int64),
+    ('status_message', object),
+    ('success', np.float64),
+    ('avg_latency_ms', np.float64),
+    ('max_latency_ms', np.float64),
+    ('min_latency_ms', np.float64),
+    ('packet_loss', np.float64),
+]
+
+POWER_CYCLE_QUERY = """
+SELECT timestamp
+FROM power_cycle_events
+"""
+
+# Function to work out where a date range starts
+def get_start_date(date_range, now=None):
+    """
+    Returns the datetime the given date range starts at, or None for 'all_time'.
+    """
+    if date_range not in DATE_RANGES:
+        return None
+    if now is None:
+        now = datetime.datetime.now()
+    return now - DATE_RANGES[date_range]
+
+# Function to build a range-bounded query
+def _range_query(query, start_date, after=None, site=DEFAULT_SITE):
+    """
+    Appends a parameterised site filter and lower bounds on timestamp to the query,
+    which the (site, timestamp) indexes answer. start_date is inclusive and after is
+    exclusive.
+    """
+    conditions = ["site = ?"]
+    params = [site]
+    if start_date is not None:
+        conditions.append("timestamp >= ?")
+        params.append(to_epoch_ms(start_date))
+    if after is not None:
+        conditions.append("timestamp > ?")
+        params.append(to_epoch_ms(after))
+    query += "WHERE " + " AND ".join(conditions) + "\n"
+    return query + "ORDER BY timestamp", tuple(params)
+
+# Function to read status rows straight into NumPy arrays
+@metrics.query
+def read_status_arrays(conn, start_date=None, after=None, site=DEFAULT_SITE):
+    """
+    Reads the site's internet_status rows at or after start_date (and strictly after
+    'after'), oldest first, as a dict of one typed array per STATUS_DTYPES column.
+    """
+    query, params = _range_query(STATUS_QUERY, start_date, after, site)
+    rows = conn.execute(query, params).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(STATUS_DTYPES)
+    return {
+        name: np.array(values, dtype=dtype)
+        for (name, dtype), values in zip(STATUS_DTYPES, columns)
+    }
+
+# Function to read status rows from a given start date onwards
+@metrics.query
+def read_status(conn, start_date=None, after=None, site=DEFAULT_SITE):
+    """
+    Reads the site's internet_status rows at or after start_date (and strictly after
+    'after'), oldest first, with timestamp as naive local datetimes.
+    """
+    arrays = read_status_arrays(conn, start_date, after, site)
+    arrays['timestamp'] = from_epoch_ms(arrays['timestamp'])
+    return pd.DataFrame(arrays)
+
+# Function to count status rows in a half-open time interval
+@metrics.query
+def count_status(conn, start_date, end_date, site=DEFAULT_SITE):
+    """
+    Counts the site's internet_status rows with start_date <= timestamp < end_date.
+    """
+    row = conn.execute(
+        "SELECT COUNT(*) FROM internet_status WHERE site = ? AND timestamp >= ? AND timestamp < ?",
+        (site, to_epoch_ms(start_date), to_epoch_ms(end_date))
+    ).fetchone()
+    return row[0]
+
+# Function to read a version that changes whenever the rows in a date range change
+@metrics.query
+def read_data_version(conn, start_date=None, site=DEFAULT_SITE):
+    """
+    Returns (first_id, last_id): the ID of the site's oldest row at or after
+    start_date (of its oldest row at all for None) and the newest ID of any site.
+    Rows are only ever added or trimmed from the front, and every insert raises the
+    newest ID, so the pair stays the same as long as the rows in the range do; an
+    upload for another site merely costs a rebuild. Each is a single index lookup.
+    """
+    first = conn.execute(
+        "SELECT id FROM internet_status WHERE site = ? AND timestamp >= ? ORDER BY timestamp LIMIT 1",
+        (site, to_epoch_ms(start_date) if start_date is not None else 0)
+    ).fetchone()
+    last = conn.execute("SELECT MAX(id) FROM internet_status").fetchone()
+    return (first[0] if first else None, last[0])
+
+# Function to read the newest internet_status ID
+@metrics.query
+def read_last_id(conn):
+    """
+    Returns the newest internet_status ID of any site, or None if there are no rows.
+    IDs only grow, so every row written later has a higher one.
+    """
+    return conn.execute("SELECT MAX(id) FROM internet_status").fetchone()[0]
+
+# Function to count rows written after an ID that sort before a timestamp
+@metrics.query
+def count_late_rows(conn, after_id, until, start_date=None, site=DEFAULT_SITE):
+    """
+    Counts the site's rows with an ID above after_id and a timestamp at or before
+    'until' (epoch ms), and at or after start_date: rows that arrived out of order,
+    such as a backlog replayed by an uploader or a second collector at the site.
+    Only the rows written since after_id are scanned.
+    """
+    row = conn.execute(
+        "SELECT COUNT(*) FROM internet_status "
+        "WHERE id > ? AND +site = ? AND +timestamp <= ? AND +timestamp >= ?",
+        (after_id, site, until, to_epoch_ms(start_date) if start_date is not None else 0)
+    ).fetchone()
+    return row[0]
+
+# Function to read a version that changes whenever a power cycle event is added
+@metrics.query
+def read_power_cycle_version(conn):
+    """
+    Returns the newest power_cycle_events ID of any site, or None if there are none.
+    Events are never updated or trimmed, so this is a single index lookup.
+    """
+    return conn.execute("SELECT MAX(id) FROM power_cycle_events").fetchone()[0]
+
+# Function to truncate a datetime to the start of its rollup bucket
+def bucket_start(value, bucket_format):
+    if isinstance(bucket_format, int):
+        # Fixed-width buckets are whole minutes, so they can be truncated in local time
+        return value - (value - datetime.datetime.min) % datetime.timedelta(milliseconds=bucket_format)
+    return datetime.datetime.strptime(value.strftime(bucket_format), TIMESTAMP_FORMAT)
+
+# Function to find the oldest status timestamp at or after a given start date
+@metrics.query
+def read_first_timestamp(conn, start_date=None, site=DEFAULT_SITE):
+    """
+    Returns the site's earliest internet_status timestamp in epoch ms, or None if
+    there are no rows.
+    """
+    row = conn.execute(
+        "SELECT MIN(timestamp) FROM internet_status WHERE site = ? AND timestamp >= ?",
+        (site, to_epoch_ms(start_date) if start_date is not None else 0)
+    ).fetchone()
+    return row[0]
+
+# Function to read power cycle events from a given start date onwards
+@metrics.query
+def read_power_cycle_events(conn, start_date=None, site=DEFAULT_SITE):
+    """
+    Reads the site's power_cycle_events rows at or after start_date, oldest first.
+    """
+    query, params = _range_query(POWER_CYCLE_QUERY, start_date, site=site)
+    df = pd.read_sql_query(query, conn, params=params)
+    df['timestamp'] = from_epoch_ms(df['timestamp'])
+    return df
+
+# Function to read rollup buckets from a given start date onwards
+@metrics.query
+def read_rollups(conn, granularity, start_date=None, site=DEFAULT_SITE):
+    """
+    Reads the site's '5min', 'hourly' or 'daily' rollup buckets covering start_date
+    onwards, oldest first.
+    """
+    table, bucket_format = ROLLUPS[granularity]
+    query = f"SELECT bucket AS timestamp, {ROLLUP_COLUMNS.replace('bucket, ', '')} FROM {table}\n"
+    query += "WHERE site = ?\n"
+    params = (site,)
+    if start_date is not None:
+        query += "AND bucket >= ?\n"
+        params += (to_epoch_ms(bucket_start(start_date, bucket_format)),)
+    df = pd.read_sql_query(query + "ORDER BY bucket", conn, params=params)
+    df['timestamp'] = from_epoch_ms(df['timestamp'])
+    return df
+
+# Function to find where the rollup history starts
+@metrics.query
+def read_first_rollup_bucket(conn, site=DEFAULT_SITE):
+    """
+    Returns the site's earliest hourly bucket as a datetime, or None if there are none.
+    """
+    row = conn.execute(f"SELECT MIN(bucket) FROM {ROLLUPS['hourly'][0]} WHERE site = ?", (site,)).fetchone()
+    if row[0] is None:
+        return None
+    return from_epoch_ms(pd.Series([row[0]])).iloc[0].to_pydatetime()
+
+# Function to count fully up, partially up and down samples since a start date
+@metrics.query
+def read_status_counts(conn, start_date=None, site=DEFAULT_SITE):
+    """
+    Returns the site's (full_up, partial_up, down) sample counts. Whole hours are read
+    from the hourly rollup and only the partial hour at the start of the range from
+    raw rows.
+    """
+    table = ROLLUPS['hourly'][0]
+    rollup_query = f"SELECT SUM(full_up), SUM(partial_up), SUM(down) FROM {table} WHERE site = ?"
+    if start_date is None:
+        totals = conn.execute(rollup_query, (site,)).fetchone()
+        return tuple(int(value or 0) for value in totals)
+
+    first_hour = start_date.replace(minute=0, second=0, microsecond=0)
+    if first_hour < start_date:
+        first_hour += datetime.timedelta(hours=1)
+    head = conn.execute(
+        """
+        SELECT SUM(success_percentage = 100),
+               SUM(success_percentage > 0 AND success_percentage < 100),
+               SUM(success_percentage = 0)
+        FROM internet_status
+        WHERE site = ? AND timestamp >= ? AND timestamp < ?
+        """,
+        (site, to_epoch_ms(start_date), to_epoch_ms(first_hour))
+    ).fetchone()
+    tail = conn.execute(rollup_query + " AND bucket >= ?", (site, to_epoch_ms(first_hour))).fetchone()
+    return tuple(int(h or 0) + int(t or 0) for h, t in zip(head, tail))
+
+# A site's incidents still open or that ended after a given time. Written as an OR on
+# ended_at so SQLite answers it from the (site, ended_at) index, whatever the range.
+INCIDENT_QUERY = """
+SELECT incidents.id,
+       started_at,
+       ended_at,
+       samples,
+       down_samples,
+       success_min,
+       max_latency_ms,
+       packet_loss_max,
+       power_cycle_events.timestamp AS power_cycle_at
+FROM incidents
+LEFT JOIN power_cycle_events ON power_cycle_events.id = incidents.power_cycle_id
+WHERE incidents.site = :site AND (ended_at > :start OR ended_at IS NULL)
+ORDER BY started_at DESC
+LIMIT :limit
+"""
+
+INCIDENT_TOTALS_QUERY = """
+SELECT COUNT(*),
+       SUM(down_samples > 0),
+       SUM(min(COALESCE(ended_at, :now), :now) - max(started_at, :start)),
+       SUM(CASE WHEN down_samples > 0 THEN min(COALESCE(ended_at, :now), :now) - max(started_at, :start) END),
+       SUM(ended_at - started_at),
+       COUNT(ended_at)
+FROM incidents
+WHERE site = :site AND (ended_at > :start OR ended_at IS NULL)
+"""
+
+# Function to read the incidents overlapping a date range
+@metrics.query
+def read_incidents(conn, start_date=None, limit=100, site=DEFAULT_SITE):
+    """
+    Reads up to limit of the site's incidents that were open at or after start_date,
+    newest first. Ongoing incidents have no end and their duration runs to now.
+    """
+    params = {
+        'start': to_epoch_ms(start_date) if start_date is not None else 0,
+        'limit': limit,
+        'site': site,
+    }
+    df = pd.read_sql_query(INCIDENT_QUERY, conn, params=params)
+    now = to_epoch_ms(datetime.datetime.now())
+    df['duration'] = pd.to_timedelta(df['ended_at'].fillna(now) - df['started_at'], unit='ms')
+    df['kind'] = np.where(df['down_samples'] > 0, 'Outage', 'Degraded')
+    df['started_at'] = from_epoch_ms(df['started_at'])
+    df['ended_at'] = from_epoch_ms(df['ended_at'])
+    df['power_cycle_at'] = from_epoch_ms(df['power_cycle_at'])
+    return df
+
+# Function to summarise reliability over a date range from the incident index
+@metrics.query
+def read_incident_summary(conn, start_date=None, now=None, site=DEFAULT_SITE):
+    """
+    Returns the site's incident count, outage count, availability (share of the range
+    not in any incident) and outage availability (share not in an outage) as
+    percentages, MTTR (mean duration of ended incidents) and MTBF (time not in an
+    incident per incident) as timedeltas. Incidents are clipped to the range; for
+    'all_time' the range starts at the site's first rollup bucket. Returns None if
+    there is no data. Reads only incidents, never samples, so the cost does not grow with
+    the range.
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    if start_date is None:
+        start_date = read_first_rollup_bucket(conn, site)
+        if start_date is None:
+            return None
+    start, end = to_epoch_ms(start_date), to_epoch_ms(now)
+    if end <= start:
+        return None
+
+    count, outages, downtime, outage_time, repair_time, ended = conn.execute(
+        INCIDENT_TOTALS_QUERY, {'start': start, 'now': end, 'site': site}
+    ).fetchone()
+    span = end - start
+    downtime = downtime or 0
+    return {
+        'incidents': count,
+        'outages': outages or 0,
+        'availability': 100 * (1 - downtime / span),
+        'outage_availability': 100 * (1 - (outage_time or 0) / span),
+        'mttr': datetime.timedelta(milliseconds=repair_time / ended) if ended else None,
+        'mtbf': datetime.timedelta(milliseconds=(span - downtime) / count) if count else None,
+    }
+
+# Function to list the sites that have sent samples
+@metrics.query
+def read_sites(conn):
+    """
+    Returns the names of the sites with hourly rollups, sorted. The rollups outlive
+    the raw rows, so a site stays listed through its whole history.
+    """
+    table = ROLLUPS['hourly'][0]
+    return [row[0] for row in conn.execute(f"SELECT DISTINCT site FROM {table} ORDER BY site")]
+
+# Function to find the host's time zone
+def local_timezone():
+    """
+    Returns the host's named time zone where it can be found, so DST changes are
+    handled when converting epoch timestamps, or a fixed offset otherwise.
+    """
+    name = os.environ.get('TZ')
+    if not name and os.path.islink('/etc/localtime'):
+        name = os.path.realpath('/etc/localtime').split('zoneinfo/')[-1]
+    if name:
+        try:
+            return zoneinfo.ZoneInfo(name.lstrip(':'))
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass
+    return datetime.datetime.now().astimezone().tzinfo
+
+# Function to convert epoch milliseconds to naive local datetimes for plotting
+def from_epoch_ms(values):
+    timestamps = pd.Series(pd.to_datetime(values, unit='ms', utc=True))
+    return timestamps.dt.tz_convert(local_timezone()).dt.tz_localize(None)
+
+# SQL expression for the start of the bucket a probe time falls into, aligned to local time
+PROBE_BUCKET = "(t + :offset) - (t + :offset) % :width - :offset"
+
+# Function to read per-target latency and loss per time bucket
+@metrics.query
+def read_target_latency(conn, start_date, bucket_width):
+    """
+    Returns one row per bucket and target with the mean round trip time in ms, the
+    percentage of probes lost and the number of probes. Bucketing runs in SQLite.
+    """
+    params = {
+        'start': to_epoch_ms(start_date),
+        'width': int(bucket_width.total_seconds() * 1000),
+        'offset': int(datetime.datetime.now().astimezone().utcoffset().total_seconds() * 1000),
+    }
+    df = pd.read_sql_query(
+        f"""
+        SELECT {PROBE_BUCKET} AS bucket,
+               probe_targets.name AS target,
+               AVG(rtt_us) / 1000.0 AS avg_rtt_ms,
+               100.0 * SUM(rtt_us IS NULL) / COUNT(*) AS loss,
+               COUNT(*) AS probes
+        FROM probe_samples
+        JOIN probe_targets ON probe_targets.id = probe_samples.target_id
+        WHERE t >= :start
+        GROUP BY bucket, target_id
+        ORDER BY bucket
+        """,
+        conn, params=params
+    )
+    df['timestamp'] = from_epoch_ms(df['bucket'])
+    return df
+
+# Function to read a per-bucket histogram of round trip times
+@metrics.query
+def read_latency_histogram(conn, start_date, bucket_width, cap_ms=500):
+    """
+    Returns (bucket, rtt_ms, count) rows counting successful probes in 1 ms bins,
+    capped at cap_ms. Percentiles can be taken from this without reading every probe.
+    """
+    params = {
+        'start': to_epoch_ms(start_date),
+        'width': int(bucket_width.total_seconds() * 1000),
+        'offset': int(datetime.datetime.now().astimezone().utcoffset().total_seconds() * 1000),
+        'cap': cap_ms,
+    }
+    df = pd.read_sql_query(
+        f"""
+        SELECT {PROBE_BUCKET} AS bucket,
+               MIN(rtt_us / 1000, :cap) AS rtt_ms,
+               COUNT(*) AS count
+        FROM probe_samples
+        WHERE t >= :start AND rtt_us IS NOT NULL
+        GROUP BY bucket, rtt_ms
+        ORDER BY bucket, rtt_ms
+        """,
+        conn, params=params
+    )
+    df['timestamp'] = from_epoch_ms(df['bucket'])
+    return df
+
+# Function to find when per-probe history starts
+@metrics.query
+def read_first_probe_time(conn):
+    """
+    Returns the earliest probe sample time as a naive local datetime, or None.
+    """
+    row = conn.execute("SELECT MIN(t) FROM probe_samples").fetchone()
+    if row[0] is None:
+        return None
+    return from_epoch_ms(pd.Series([row[0]])).iloc[0].to_pydatetime()
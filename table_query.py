@@ -0,0 +1,110 @@
+import json
+
+import pandas as pd
+
+# Filter operators produced by the DataTable's filter row, longest match first
+FILTER_OPERATORS = [
+    ['ge ', '>='],
+    ['le ', '<='],
+    ['lt ', '<'],
+    ['gt ', '>'],
+    ['ne ', '!='],
+    ['eq ', '='],
+    ['contains '],
+    ['datestartswith '],
+]
+
+# Function to split one clause of a DataTable filter query
+def split_filter_part(filter_part):
+    """
+    Returns (column, operator, value) for a clause such as '{success} < 100'.
+    """
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 == value_part[-1:] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # Word operators need spaces after them in the filter string,
+                # but we don't want these later
+                return name, operator_type[0].strip(), value
+
+    return [None] * 3
+
+# Function to apply a DataTable filter query to a DataFrame
+def apply_filter(df, filter_query):
+    """
+    Keeps the rows matching every '&&'-joined clause of the filter query.
+    """
+    if not filter_query:
+        return df
+    for filter_part in filter_query.split(' && '):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue
+        column = df[col_name]
+        if pd.api.types.is_datetime64_any_dtype(column) and operator not in ('contains', 'datestartswith'):
+            try:
+                filter_value = pd.Timestamp(filter_value)
+            except (TypeError, ValueError):
+                continue
+        if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            # these operators match pandas series operator method names
+            df = df.loc[getattr(column, operator)(filter_value)]
+        elif operator == 'contains':
+            df = df.loc[column.astype(str).str.contains(str(filter_value), regex=False)]
+        elif operator == 'datestartswith':
+            df = df.loc[column.astype(str).str.startswith(str(filter_value))]
+    return df
+
+# Function to apply DataTable sorting to a DataFrame
+def apply_sort(df, sort_by, default_column=None, default_ascending=True):
+    """
+    Sorts by the DataTable's sort_by list, or by the default column if it is empty.
+    """
+    if sort_by:
+        return df.sort_values(
+            [col['column_id'] for col in sort_by],
+            ascending=[col['direction'] == 'asc' for col in sort_by],
+            inplace=False
+        )
+    if default_column is not None:
+        return df.sort_values(default_column, ascending=default_ascending, inplace=False)
+    return df
+
+# Function to build a hashable key for a filter query and sort order
+def view_key(filter_query, sort_by):
+    return (filter_query or '', json.dumps(sort_by or [], sort_keys=True))
+
+# Function to work out the row order of a filtered and sorted table
+def row_order(df, filter_query, sort_by, default_column=None, default_ascending=True):
+    """
+    Returns the positions in df of the rows matching the filter query, in sort
+    order, so pages can be cut without filtering and sorting again.
+    """
+    positions = df.reset_index(drop=True)
+    positions = apply_sort(apply_filter(positions, filter_query), sort_by, default_column, default_ascending)
+    return positions.index.to_numpy()
+
+# Function to cut one page out of a DataFrame
+def get_page(df, page_current, page_size, order=None):
+    """
+    Returns the records for the requested page and the total number of pages,
+    taking rows in the given order of positions if there is one.
+    """
+    page_current = page_current or 0
+    rows = len(df) if order is None else len(order)
+    page_count = max((rows + page_size - 1) // page_size, 1)
+    page_slice = slice(page_current * page_size, (page_current + 1) * page_size)
+    page = df.iloc[page_slice] if order is None else df.iloc[order[page_slice]]
+    return page.to_dict('records'), page_count
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Your Tapo credentials and IP address (written by setup.sh)
+email = "example@example.com"
+password = "password"
+device_ip = "device_ip_address"
+device_name = "device_name"
+
+# Smart plugs that can be power cycled, by role. Add entries here for more plugs,
+# e.g. 'router': {'ip': '192.168.1.51', 'name': 'Router', 'model': 'p100'}
+DEVICES = {
+    'modem': {'ip': device_ip, 'name': device_name, 'model': 'p100'},
+}
+DEFAULT_DEVICE = 'modem'
+
+# The time to wait between turning off and on the device (in seconds)
+WAIT_TIME = 30
+
+# Attempts at turning the device back on, reconnecting between attempts
+RETRY_ATTEMPTS = 3
+
+# Seconds to wait for any single request to a plug
+REQUEST_TIMEOUT = 10
+
+# Seconds between keep-alive requests that stop idle sessions from expiring
+KEEPALIVE_INTERVAL = 300
+
+class DevicePool:
+    """
+    Keeps one authenticated session per smart plug so a power cycle starts with a
+    single request instead of a login and handshake. Sessions are opened on first
+    use and reopened lazily after any failed request. Methods are coroutines and
+    must all run on the same event loop.
+    """
+
+    def __init__(self, devices=None):
+        self.devices = DEVICES if devices is None else devices
+        self._client = None
+        self._handlers = {}
+        self._locks = {}
+
+    async def get(self, name):
+        """
+        Returns the connected handler for the named device, connecting if needed.
+        """
+        # One connection attempt per device at a time
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            handler = self._handlers.get(name)
+            if handler is None:
+                # Imported here so modules using the pool load where tapo is not installed
+                import tapo
+                config = self.devices[name]
+                if self._client is None:
+                    self._client = tapo.ApiClient(email, password)
+                connect = getattr(self._client, config.get('model', 'p100'))
+                handler = await asyncio.wait_for(connect(config['ip']), REQUEST_TIMEOUT)
+                self._handlers[name] = handler
+                logger.info(f"Connected to {config['name']} ({name}).")
+            return handler
+
+    def drop(self, name):
+        """
+        Forgets the device's session so the next request reconnects.
+        """
+        self._handlers.pop(name, None)
+
+    async def call(self, name, action, attempts=2):
+        """
+        Runs action(handler) against the device, reconnecting and retrying on failure.
+        """
+        for attempt in range(1, attempts + 1):
+            try:
+                handler = await self.get(name)
+                return await asyncio.wait_for(action(handler), REQUEST_TIMEOUT)
+            except Exception as e:
+                self.drop(name)
+                if attempt == attempts:
+                    raise
+                logger.warning(f"Request to {name} failed ({e}), reconnecting (attempt {attempt}/{attempts}).")
+
+    async def power_cycle(self, name=DEFAULT_DEVICE, wait_time=WAIT_TIME, progress=None):
+        """
+        Turns the device off, waits and turns it back on, reporting each step
+        ('off', 'waiting', 'on') to progress. Raises if the device could not be
+        turned back on.
+        """
+        def report(state):
+            if progress is not None:
+                progress(state)
+
+        await self.call(name, lambda handler: handler.off())
+        report('off')
+        logger.info(f"{self.devices[name]['name']} has been turned off.")
+
+        report('waiting')
+        await asyncio.sleep(wait_time)
+
+        await self.call(name, lambda handler: handler.on(), attempts=RETRY_ATTEMPTS)
+        report('on')
+        logger.info(f"{self.devices[name]['name']} has been turned back on.")
+
+    async def device_info(self, name=DEFAULT_DEVICE):
+        return await self.call(name, lambda handler: handler.get_device_info_json())
+
+    async def keep_warm(self, interval=KEEPALIVE_INTERVAL):
+        """
+        Connects to every device and then touches each session every interval
+        seconds, so sessions are ready when a power cycle is needed. Runs forever.
+        """
+        while True:
+            for name in self.devices:
+                try:
+                    await self.call(name, lambda handler: handler.get_device_info(), attempts=1)
+                except Exception as e:
+                    logger.warning(f"Could not reach {name}: {e}")
+            await asyncio.sleep(interval)
+
+class BackgroundPool:
+    """
+    Runs a DevicePool on its own event loop thread for callers without an event
+    loop of their own, such as the dashboard's worker threads.
+    """
+
+    def __init__(self, pool=None, keep_warm=True):
+        self.pool = DevicePool() if pool is None else pool
+        self.keep_warm = keep_warm
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the event loop thread in this process if it is not already running.
+        """
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # A fresh pool after a fork, as sessions belong to the parent's loop
+                self.pool = DevicePool(self.pool.devices)
+            self._pid = os.getpid()
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name='tapo-control', daemon=True).start()
+            if self.keep_warm:
+                asyncio.run_coroutine_threadsafe(self.pool.keep_warm(), self._loop)
+
+    def run(self, coroutine_function, *args, **kwargs):
+        """
+        Runs coroutine_function(pool, *args, **kwargs) on the pool's loop and waits
+        for its result.
+        """
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(coroutine_function(self.pool, *args, **kwargs), self._loop)
+        return future.result()
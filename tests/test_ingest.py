@@ -0,0 +1,58 @@
+import datetime
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import check_internet  # noqa: E402
+import internet_status_dashboard  # noqa: E402
+
+# Function to take a sample as the daemon would, with every probe answered
+def take_sample(daemon, now):
+    results = [(target, 12.5) for target in check_internet.probe_target_names()]
+    daemon.record(check_internet.summarise(results, now), results, now)
+
+def test_ingest_is_stored_while_the_daemon_holds_a_sample(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'internet_status.db')
+    monkeypatch.setattr(internet_status_dashboard, 'INGEST_TOKEN', 'secret')
+    monkeypatch.setattr(internet_status_dashboard, 'get_db_path', lambda: db_path)
+    daemon = check_internet.CollectorDaemon(db_path, check_internet.SAMPLE_INTERVAL)
+    now = datetime.datetime.now()
+    try:
+        # The first sample is written with the first retention pass; the next waits for its batch
+        take_sample(daemon, now - datetime.timedelta(seconds=10))
+        take_sample(daemon, now)
+        assert daemon.pending
+
+        timestamp = int(now.timestamp() * 1000)
+        response = internet_status_dashboard.server.test_client().post(
+            '/api/ingest',
+            headers={'Authorization': 'Bearer secret'},
+            json={
+                'site': 'office',
+                'collector': 'office-pi',
+                'samples': {
+                    'timestamp': [timestamp - 10_000, timestamp],
+                    'status': ['Internet is up', 'Internet is up'],
+                    'success_percentage': [100, 100],
+                    'avg_latency_ms': [12.5, 13.5],
+                    'max_latency_ms': [14, 15],
+                    'min_latency_ms': [11, 12],
+                    'packet_loss': [0, 0],
+                },
+                'power_cycles': {'timestamp': [timestamp - 5_000], 'reason': ['Internet down']},
+            },
+        )
+        assert response.status_code == 200
+        assert response.get_json() == {'samples': 2, 'power_cycles': 1, 'duplicates': 0}
+
+        daemon.commit()
+    finally:
+        daemon.conn.close()
+
+    conn = sqlite3.connect(db_path)
+    counts = dict(conn.execute("SELECT site, COUNT(*) FROM internet_status GROUP BY site"))
+    power_cycles = conn.execute("SELECT site, reason FROM power_cycle_events").fetchall()
+    conn.close()
+    assert counts == {'local': 2, 'office': 2}
+    assert power_cycles == [('office', 'Internet down')]
@@ -0,0 +1,65 @@
+import datetime
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import metrics  # noqa: E402
+import schema  # noqa: E402
+import status_db  # noqa: E402
+
+# Function to build a database with an hour of samples and one outage in it
+def make_database(path, now):
+    conn = sqlite3.connect(path)
+    schema.ensure_schema(conn, path)
+    start = schema.to_epoch_ms(now - datetime.timedelta(hours=1))
+    rows = [
+        (start + minute * 60_000, 0 if 20 <= minute < 25 else 100)
+        for minute in range(60)
+    ]
+    conn.executemany(
+        "INSERT INTO internet_status (timestamp, status, success_percentage, packet_loss) VALUES (?, 'x', ?, 0)",
+        rows
+    )
+    conn.commit()
+    return conn
+
+def test_row_count_of_columns_and_summaries():
+    assert metrics.row_count(pd.DataFrame({'a': [1, 2, 3]})) == 3
+    assert metrics.row_count({'timestamp': np.arange(4), 'success': np.arange(4)}) == 4
+    assert metrics.row_count([(1,), (2,)]) == 2
+    assert metrics.row_count({'incidents': 2, 'availability': 99.5}) is None
+    assert metrics.row_count(7) is None
+
+def test_incident_summary_reads_through_the_decorator(tmp_path):
+    now = datetime.datetime.now()
+    conn = make_database(str(tmp_path / 'status.db'), now)
+    summary = status_db.read_incident_summary(conn, now - datetime.timedelta(hours=2), now)
+    conn.close()
+    assert summary['incidents'] == 1
+    assert summary['availability'] < 100
+    assert metrics.QUERY_SECONDS._series[('read_incident_summary',)][2] >= 1
+    assert ('read_incident_summary',) not in metrics.QUERY_ROWS._series
+
+def test_render_sums_every_workers_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'MULTIPROCESS_DIR', str(tmp_path))
+    counter = metrics.Counter('test_requests_total', "Requests in the test.", ['handler'])
+    histogram = metrics.Histogram('test_request_seconds', "Request time in the test.", ['handler'], (0.1, 1))
+    try:
+        counter.inc(2, handler='/')
+        histogram.observe(0.05, handler='/')
+        # Another worker's last snapshot, as write_snapshot leaves it
+        with open(tmp_path / '1.json', 'w') as f:
+            f.write('{"test_requests_total": [[["/"], 3]], '
+                    '"test_request_seconds": [[["/"], [[0, 1], 0.5, 1]]]}')
+        lines = metrics.render().splitlines()
+    finally:
+        metrics.REGISTRY.remove(counter)
+        metrics.REGISTRY.remove(histogram)
+    assert 'test_requests_total{handler="/"} 5' in lines
+    assert 'test_request_seconds_bucket{handler="/",le="0.1"} 1' in lines
+    assert 'test_request_seconds_bucket{handler="/",le="1"} 2' in lines
+    assert 'test_request_seconds_count{handler="/"} 2' in lines
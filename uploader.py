@@ -0,0 +1,163 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import urllib.error
+import urllib.request
+
+import schema
+
+logger = logging.getLogger(__name__)
+
+# Rows sent per request; kept well under ingest.MAX_BATCH_ROWS
+BATCH_SIZE = 500
+
+# Batches sent per call, so catching up after a long outage is spread over several calls
+MAX_BATCHES = 20
+
+# Seconds to wait for the dashboard to answer an upload
+REQUEST_TIMEOUT = 30
+
+UPLOAD_STATUS_QUERY = """
+SELECT id, timestamp, status, success_percentage, avg_latency_ms, max_latency_ms, min_latency_ms, packet_loss
+FROM internet_status
+WHERE site = ? AND id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+UPLOAD_POWER_CYCLE_QUERY = """
+SELECT id, timestamp, reason
+FROM power_cycle_events
+WHERE site = ? AND id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+class Uploader:
+    """
+    Sends this collector's samples and power cycle events to a central dashboard's
+    /api/ingest endpoint in gzipped batches. The local database is the buffer: the
+    IDs of the last rows the dashboard acknowledged are kept in a state file, so
+    whatever was written while the dashboard was unreachable is replayed, oldest
+    first, once it answers again. The dashboard ignores rows it already holds, so a
+    batch whose response was lost is simply sent again.
+    """
+
+    def __init__(self, db_file, url, site, collector=None, token=None, batch_size=BATCH_SIZE, state_file=None):
+        self.db_file = db_file
+        self.url = url
+        self.site = site
+        self.collector = collector
+        self.token = token
+        self.batch_size = batch_size
+        self.state_file = state_file or os.path.join(os.path.dirname(db_file), 'upload_state.json')
+
+    def load_state(self):
+        """
+        Returns the IDs of the last uploaded rows, starting from zero for a new URL.
+        """
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if state.get('url') != self.url:
+            state = {'url': self.url, 'status_id': 0, 'power_cycle_id': 0}
+        return state
+
+    def save_state(self, state):
+        # Written to a temporary file first so a crash cannot leave it half written
+        temp_file = f"{self.state_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_file, self.state_file)
+
+    def read_batch(self, conn, state):
+        """
+        Returns the next batch of local rows after the uploaded IDs, or None if there
+        are none, with the IDs to record once it is acknowledged.
+        """
+        status_rows = conn.execute(
+            UPLOAD_STATUS_QUERY, (schema.DEFAULT_SITE, state['status_id'], self.batch_size)
+        ).fetchall()
+        power_cycle_rows = conn.execute(
+            UPLOAD_POWER_CYCLE_QUERY, (schema.DEFAULT_SITE, state['power_cycle_id'], self.batch_size)
+        ).fetchall()
+        if not status_rows and not power_cycle_rows:
+            return None, state
+
+        columns = list(zip(*status_rows)) if status_rows else [()] * 8
+        power_cycle_columns = list(zip(*power_cycle_rows)) if power_cycle_rows else [()] * 3
+        batch = {
+            'site': self.site,
+            'collector': self.collector,
+            'samples': {
+                'timestamp': list(columns[1]),
+                'status': list(columns[2]),
+                'success_percentage': list(columns[3]),
+                'avg_latency_ms': list(columns[4]),
+                'max_latency_ms': list(columns[5]),
+                'min_latency_ms': list(columns[6]),
+                'packet_loss': list(columns[7]),
+            },
+            'power_cycles': {
+                'timestamp': list(power_cycle_columns[1]),
+                'reason': list(power_cycle_columns[2]),
+            },
+        }
+        state = dict(
+            state,
+            status_id=status_rows[-1][0] if status_rows else state['status_id'],
+            power_cycle_id=power_cycle_rows[-1][0] if power_cycle_rows else state['power_cycle_id'],
+        )
+        return batch, state
+
+    def send(self, batch):
+        """
+        Posts one batch and returns the dashboard's counts. Raises on any failure.
+        """
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        request = urllib.request.Request(
+            self.url, data=gzip.compress(json.dumps(batch).encode()), headers=headers, method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.load(response)
+
+    def upload_pending(self):
+        """
+        Uploads the rows written since the last acknowledged batch, up to MAX_BATCHES
+        batches. Stops at the first failure and returns the number of rows sent.
+        Blocks, so the collector daemon runs it in an executor.
+        """
+        state = self.load_state()
+        sent = 0
+        try:
+            conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True, timeout=10)
+        except sqlite3.Error as e:
+            logger.error(f"Upload could not open the database: {e}")
+            return sent
+        try:
+            for _ in range(MAX_BATCHES):
+                batch, next_state = self.read_batch(conn, state)
+                if batch is None:
+                    break
+                result = self.send(batch)
+                self.save_state(next_state)
+                state = next_state
+                sent += len(batch['samples']['timestamp']) + len(batch['power_cycles']['timestamp'])
+                logger.info(f"Uploaded {result.get('samples', 0)} samples and "
+                            f"{result.get('power_cycles', 0)} power cycles to {self.url} "
+                            f"({result.get('duplicates', 0)} already held).")
+        except urllib.error.HTTPError as e:
+            logger.error(f"Upload to {self.url} refused ({e.code}): {e.read().decode(errors='replace')}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            logger.warning(f"Upload to {self.url} failed, will retry: {e}")
+        except sqlite3.Error as e:
+            logger.error(f"Upload could not read the database: {e}")
+        finally:
+            conn.close()
+        return sent
@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+
+import metrics
+import result_store
+
+logger = logging.getLogger(__name__)
+
+# Entries kept in this process, most recently used first
+DEFAULT_MAX_ENTRIES = 16
+
+# Seconds an entry is kept in the shared cache. Keys carry the data version, so this
+# only bounds memory; an entry found is always current.
+DEFAULT_TIMEOUT = 3600
+
+# Seconds to wait after the shared cache fails before trying it again
+RETRY_INTERVAL = 30
+
+class VersionedCache:
+    """
+    Caches results under keys that include the version of the data they were built
+    from, so a result is served for exactly as long as its data is unchanged and
+    never needs a timeout to expire. Results are held in an in-process LRU and, where
+    there is one, the shared cache so other workers can reuse them. While the shared
+    cache is unreachable the LRU carries on alone and the shared cache is retried
+    after RETRY_INTERVAL seconds. Hits and misses are counted under the cache's name
+    in the dashboard's metrics.
+    """
+
+    def __init__(self, cache=None, max_entries=DEFAULT_MAX_ENTRIES, timeout=DEFAULT_TIMEOUT, name='default'):
+        self.cache = cache
+        self.name = name
+        self.timeout = timeout
+        self._local = result_store.ResultStore(max_entries)
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the result stored under the key, or None if there is none.
+        """
+        value = self._local.get(key)
+        if value is not None:
+            metrics.CACHE_REQUESTS.inc(cache=self.name, result='hit_local')
+            return value
+        if self._shared_available():
+            try:
+                with metrics.timed(metrics.CACHE_SECONDS, cache=self.name, operation='get'):
+                    value = self.cache.get(key)
+            except Exception as e:
+                self._shared_failed(e)
+        if value is None:
+            metrics.CACHE_REQUESTS.inc(cache=self.name, result='miss')
+            return None
+        metrics.CACHE_REQUESTS.inc(cache=self.name, result='hit_shared')
+        self._local.put(value, key)
+        return value
+
+    def set(self, key, value):
+        self._local.put(value, key)
+        if not self._shared_available():
+            return
+        try:
+            with metrics.timed(metrics.CACHE_SECONDS, cache=self.name, operation='set'):
+                self.cache.set(key, value, timeout=self.timeout)
+        except Exception as e:
+            self._shared_failed(e)
+
+    def get_or_build(self, key, build):
+        """
+        Returns the result stored under the key, calling build() and storing its
+        result if there is none.
+        """
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.set(key, value)
+        return value
+
+    def _shared_available(self):
+        return self.cache is not None and time.monotonic() >= self._retry_at
+
+    def _shared_failed(self, error):
+        with self._lock:
+            if time.monotonic() >= self._retry_at:
+                logger.warning(f"Shared cache unavailable, using the in-process cache for {RETRY_INTERVAL} seconds: {error}")
+            self._retry_at = time.monotonic() + RETRY_INTERVAL
@@ -0,0 +1,6 @@
+"""
+WSGI entry point for serving the dashboard with gunicorn or any other WSGI server.
+
+Run from the project directory:  gunicorn -c gunicorn.conf.py
+"""
+from internet_status_dashboard import server as application  # noqa: F401